@@ -0,0 +1,126 @@
+"""
+Бенчмарк объединения сообщений под «пачечной» нагрузкой.
+
+Каждый из --users пользователей присылает --bursts серий по --burst
+сообщений с интервалом --gap. Генерация имитируется задержкой --llm-time
+при ограниченной пропускной способности провайдера (--llm-capacity
+одновременных запросов, остальные ждут в очереди).
+
+Сравниваются:
+
+* direct — каждый апдейт вызывает генерацию, как раньше;
+* coalesce — апдейты проходят через ChatCoalescingMiddleware.
+
+Печатает число генераций (≈ расходы на LLM) и задержку от прихода
+сообщения до ответа, который его учитывает.
+
+Запуск:
+    python -m benchmarks.coalescing --users 50 --burst 4 --gap 0.2
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import Message  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from middlewares.coalescing import ChatCoalescingMiddleware  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def make_message(chat_id, message_id, text):
+    return Message.model_validate({
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "Оля"},
+        "text": text,
+    })
+
+
+class FakeLLM:
+    """Провайдер с ограниченной пропускной способностью"""
+
+    def __init__(self, capacity, latency):
+        self._semaphore = asyncio.Semaphore(capacity)
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self):
+        async with self._semaphore:
+            self.calls += 1
+            await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+
+
+async def run(mode, args):
+    llm = FakeLLM(args.llm_capacity, args.llm_time)
+    middleware = ChatCoalescingMiddleware(window=args.window)
+    arrived = {}
+    latencies = []
+
+    async def handler(event, data):
+        await llm.generate()
+        batch = data.get("batch")
+        messages = batch.messages if batch is not None else [event]
+        now = time.perf_counter()
+        latencies.extend(now - arrived[message.message_id] for message in messages)
+
+    async def deliver(message):
+        arrived[message.message_id] = time.perf_counter()
+        if mode == "direct":
+            await handler(message, {})
+        else:
+            await middleware(handler, message, {})
+
+    async def user(chat_id):
+        tasks = []
+        for burst in range(args.bursts):
+            await asyncio.sleep(random.uniform(0, args.burst_spread))
+            for i in range(args.burst):
+                message_id = chat_id * 10000 + burst * 100 + i
+                tasks.append(asyncio.create_task(deliver(make_message(chat_id, message_id, f"сообщение {i}"))))
+                await asyncio.sleep(args.gap)
+        await asyncio.gather(*tasks)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(1000 + u) for u in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{mode:<8} | сообщений: {len(latencies)} | генераций: {llm.calls} | "
+        f"p50={percentile(latencies, 50):.2f}s p99={percentile(latencies, 99):.2f}s | "
+        f"всего {elapsed:.1f}s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--bursts", type=int, default=3, help="серий сообщений на пользователя")
+    parser.add_argument("--burst", type=int, default=4, help="сообщений в серии")
+    parser.add_argument("--gap", type=float, default=0.2, help="интервал между сообщениями серии, с")
+    parser.add_argument("--burst-spread", type=float, default=5.0, help="пауза перед серией, до N секунд")
+    parser.add_argument("--llm-time", type=float, default=1.5, help="время генерации, с")
+    parser.add_argument("--llm-capacity", type=int, default=10, help="одновременных запросов к провайдеру")
+    parser.add_argument("--window", type=float, default=1.0, help="окно объединения, с")
+    args = parser.parse_args()
+
+    logger.remove()
+    random.seed(1)
+    await run("direct", args)
+    random.seed(1)
+    await run("coalesce", args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
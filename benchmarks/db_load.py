@@ -0,0 +1,160 @@
+"""
+Нагрузочный бенчмарк слоя базы данных.
+
+Прогоняет несколько тысяч одновременных «апдейтов» (сохранение сообщения,
+загрузка истории, имитация запроса к AI, сохранение ответа) против локального
+SQLite-файла и сравнивает задержку обработчика (от момента прихода апдейта до завершения) на старом
+синхронном пути и на асинхронном ContextManager, а также задержку event loop
+(насколько запросы к базе мешают остальным чатам).
+
+Запуск:
+    python -m benchmarks.db_load --updates 2000 --users 200 --rate 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# База создаётся во временной директории до импорта настроек
+_tmp_dir = tempfile.mkdtemp(prefix="olya_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from database.models import Base, Message, User, close_db, get_db, init_db  # noqa: E402
+from services.context_manager import context_manager  # noqa: E402
+
+
+def percentile(values, pct):
+    """Возвращает перцентиль pct (0-100) для списка значений"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def sleep_until(moment):
+    """Ждёт момента «прихода» апдейта; задержка считается от него"""
+    delay = moment - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+class LoopLagProbe:
+    """Измеряет, насколько event loop опаздывает с пробуждением таймеров"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - expected))
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+
+def report(name, latencies, elapsed, lags):
+    print(
+        f"{name:<6} | updates={len(latencies)} | "
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms | "
+        f"p99={percentile(latencies, 99) * 1000:.1f}ms | "
+        f"mean={statistics.mean(latencies) * 1000:.1f}ms | "
+        f"total={elapsed:.2f}s | "
+        f"loop lag p99={percentile(lags, 99) * 1000:.1f}ms max={max(lags) * 1000:.1f}ms"
+    )
+
+
+async def run_sync_baseline(updates, users, rate, ai_delay):
+    """Старый путь: синхронные запросы SQLAlchemy прямо в async-обработчике"""
+    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def save(db, telegram_id, text, is_bot):
+        user = db.query(User).filter(User.telegram_id == telegram_id).first()
+        if not user:
+            user = User(telegram_id=telegram_id)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        db.add(Message(user_id=user.id, text=text, is_bot=is_bot))
+        db.commit()
+
+    async def handler(telegram_id, arrival):
+        await sleep_until(arrival)
+        with Session() as db:
+            save(db, telegram_id, "привет", False)
+            db.execute(
+                select(Message).join(User, Message.user_id == User.id)
+                .where(User.telegram_id == telegram_id)
+                .order_by(Message.created_at.desc()).limit(10)
+            ).scalars().all()
+        await asyncio.sleep(ai_delay)
+        with Session() as db:
+            save(db, telegram_id, "Оля, ты прекрасна!", True)
+        return time.perf_counter() - arrival
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(
+        handler(1_000_000 + i % users, started + i / rate) for i in range(updates)
+    ))
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+    return latencies, elapsed
+
+
+async def run_async(updates, users, rate, ai_delay):
+    """Новый путь: асинхронный ContextManager поверх aiosqlite"""
+    await init_db()
+
+    async def handler(telegram_id, arrival):
+        await sleep_until(arrival)
+        async with get_db() as db:
+            history = await context_manager.get_dialog_history(telegram_id, db)
+        context_manager.with_pending_message(history, "привет")
+        await asyncio.sleep(ai_delay)
+        await context_manager.save_exchange(telegram_id, "привет", "Оля, ты прекрасна!")
+        return time.perf_counter() - arrival
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(
+        handler(2_000_000 + i % users, started + i / rate) for i in range(updates)
+    ))
+    return latencies, time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000, help="количество апдейтов")
+    parser.add_argument("--users", type=int, default=200, help="количество разных пользователей")
+    parser.add_argument("--rate", type=float, default=50, help="апдейтов в секунду")
+    parser.add_argument("--ai-delay", type=float, default=0.05, help="имитация задержки AI, сек")
+    args = parser.parse_args()
+
+    print(f"SQLite: {settings.DATABASE_URL}")
+    with LoopLagProbe() as probe:
+        latencies, elapsed = await run_sync_baseline(args.updates, args.users, args.rate, args.ai_delay)
+    report("sync", latencies, elapsed, probe.lags)
+    with LoopLagProbe() as probe:
+        latencies, elapsed = await run_async(args.updates, args.users, args.rate, args.ai_delay)
+    report("async", latencies, elapsed, probe.lags)
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Микробенчмарк: сколько SQL-запросов и коммитов стоит один обмен репликами.
+
+Считает запросы (before_cursor_execute) и коммиты на движке при обработке
+сообщения пользователя:
+
+* old — как раньше: save_message(пользователь), история, save_message(бот),
+  с холодными кэшами пользователя и истории;
+* new — как сейчас в handle_message: история из памяти и save_exchange
+  одной транзакцией.
+
+Запуск:
+    python -m benchmarks.db_statements --exchanges 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp_dir = tempfile.mkdtemp(prefix="olya_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from database.models import close_db, engine, get_db, init_db, read_engine  # noqa: E402
+from services.context_manager import context_manager  # noqa: E402
+
+
+class StatementCounter:
+    """Считает запросы на обоих движках и коммиты на движке записи"""
+
+    def __init__(self, write_engine, read_engine):
+        self.statements = 0
+        self.commits = 0
+        for sync_engine in {write_engine, read_engine}:
+            event.listen(sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(write_engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+async def old_exchange(telegram_id):
+    # Прежний путь не знал ни id пользователя, ни истории
+    context_manager._user_ids.clear()
+    context_manager.invalidate()
+    async with get_db() as db:
+        await context_manager.save_message(telegram_id, "привет", is_bot=False, db=db)
+        await context_manager.get_dialog_history(telegram_id, db)
+    context_manager._user_ids.clear()
+    await context_manager.save_message(telegram_id, "Оля, ты прекрасна!", is_bot=True)
+
+
+async def new_exchange(telegram_id):
+    async with get_db() as db:
+        history = await context_manager.get_dialog_history(telegram_id, db)
+    context_manager.with_pending_message(history, "привет")
+    await context_manager.save_exchange(telegram_id, "привет", "Оля, ты прекрасна!")
+
+
+async def measure(name, exchange, counter, exchanges):
+    counter.reset()
+    started = time.perf_counter()
+    for i in range(exchanges):
+        await exchange(1000 + i % 10)
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<4} | запросов на обмен: {counter.statements / exchanges:.2f} | "
+        f"коммитов на обмен: {counter.commits / exchanges:.2f} | "
+        f"время на обмен: {elapsed / exchanges * 1000:.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--exchanges", type=int, default=200, help="количество обменов")
+    args = parser.parse_args()
+
+    logger.remove()
+    await init_db()
+    counter = StatementCounter(engine.sync_engine, read_engine.sync_engine)
+
+    # Прогрев: пользователи уже существуют, как в работающем боте
+    for i in range(10):
+        await context_manager.save_message(1000 + i, "/start")
+
+    await measure("old", old_exchange, counter, args.exchanges)
+    await measure("new", new_exchange, counter, args.exchanges)
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
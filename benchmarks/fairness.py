@@ -0,0 +1,125 @@
+"""
+Бенчмарк ограничения частоты и справедливой очереди генераций.
+
+Несколько «тяжёлых» пользователей шлют сообщения без пауз, остальные —
+редко. Генерация имитируется задержкой при ограниченной пропускной
+способности. Сравниваются:
+
+* fifo — без ThrottlingMiddleware, генерации ждут в порядке прихода;
+* fair — ThrottlingMiddleware: token bucket на пользователя и общий,
+  лишние генерации тяжёлых пользователей уходят в fallback, остальные
+  ждут слот в FairScheduler (SchedulingMiddleware).
+
+Печатает задержку ответа лёгким и тяжёлым пользователям и сколько
+генераций дошло до LLM.
+
+Запуск:
+    python -m benchmarks.fairness --heavy 3 --light 30 --seconds 20
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.types import User  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from middlewares.scheduling import SchedulingMiddleware  # noqa: E402
+from middlewares.throttling import ThrottlingMiddleware  # noqa: E402
+from services.fair_scheduler import FairScheduler  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(mode, args):
+    llm = asyncio.Semaphore(args.llm_capacity)
+    llm_calls = 0
+    fallbacks = 0
+    latencies = {"heavy": [], "light": []}
+
+    throttling = ThrottlingMiddleware(
+        user_rate=args.user_rate,
+        user_burst=args.user_burst,
+        global_rate=args.global_rate,
+        global_burst=args.global_burst,
+        action="fallback",
+    )
+    scheduling = SchedulingMiddleware(FairScheduler(capacity=args.llm_capacity))
+
+    async def handler(event, data):
+        nonlocal llm_calls, fallbacks
+        if data.get("throttled"):
+            fallbacks += 1
+            return
+        async with llm:
+            llm_calls += 1
+            await asyncio.sleep(args.llm_time * random.uniform(0.8, 1.2))
+
+    async def scheduled(event, data):
+        return await scheduling(handler, event, data)
+
+    async def send(kind, user):
+        started = time.perf_counter()
+        if mode == "fifo":
+            await handler(None, {})
+        else:
+            await throttling(scheduled, None, {"event_from_user": user})
+        latencies[kind].append(time.perf_counter() - started)
+
+    async def client(kind, user_id, interval, stop_at):
+        user = User(id=user_id, is_bot=False, first_name="Оля")
+        tasks = []
+        while time.perf_counter() < stop_at:
+            tasks.append(asyncio.create_task(send(kind, user)))
+            await asyncio.sleep(random.expovariate(1 / interval))
+        await asyncio.gather(*tasks)
+
+    stop_at = time.perf_counter() + args.seconds
+    await asyncio.gather(
+        *(client("heavy", 1 + i, args.heavy_interval, stop_at) for i in range(args.heavy)),
+        *(client("light", 1000 + i, args.light_interval, stop_at) for i in range(args.light)),
+    )
+
+    for kind in ("light", "heavy"):
+        values = latencies[kind]
+        print(
+            f"{mode:<4} | {kind:<5} | запросов: {len(values):4} | "
+            f"p50={percentile(values, 50):.2f}s p99={percentile(values, 99):.2f}s"
+        )
+    print(f"{mode:<4} | генераций LLM: {llm_calls}, fallback: {fallbacks}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--heavy", type=int, default=3, help="тяжёлых пользователей")
+    parser.add_argument("--light", type=int, default=30, help="лёгких пользователей")
+    parser.add_argument("--heavy-interval", type=float, default=0.3, help="средний интервал тяжёлых, с")
+    parser.add_argument("--light-interval", type=float, default=12.0, help="средний интервал лёгких, с")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--llm-time", type=float, default=1.5)
+    parser.add_argument("--llm-capacity", type=int, default=5)
+    parser.add_argument("--user-rate", type=float, default=0.2)
+    parser.add_argument("--user-burst", type=int, default=5)
+    parser.add_argument("--global-rate", type=float, default=5.0)
+    parser.add_argument("--global-burst", type=int, default=30)
+    args = parser.parse_args()
+
+    logger.remove()
+    random.seed(1)
+    await run("fifo", args)
+    random.seed(1)
+    await run("fair", args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
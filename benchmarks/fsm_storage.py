@@ -0,0 +1,134 @@
+"""
+Бенчмарк FSM-хранилища: задержка get/set и память процесса.
+
+Симулирует апдейты от N чатов: на каждый апдейт диспетчер вызывает
+get_state (как FSMContextMiddleware перед хендлером), а часть чатов
+переходит в состояние и сохраняет данные (set_state + set_data).
+Сначала каждый чат пишет один раз, затем идут повторные апдейты от
+случайных «активных» чатов.
+
+Сравниваются:
+
+* memory — MemoryStorage из aiogram (как раньше);
+* sqlite — SQLiteStorage: LRU-кэш FSM_CACHE_MAX_ENTRIES поверх таблицы fsm_states.
+
+Печатает среднюю и p99 задержку get_state/set_state (set — это пара
+set_state + set_data), прирост памяти (tracemalloc, отдельным прогоном)
+и сколько записей осталось в кэше и сколько раз кэш промахнулся (запрос в базу).
+
+Запуск:
+    python -m benchmarks.fsm_storage --chats 10000 1000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Отдельная база, чтобы не трогать рабочую (движки создаются при импорте)
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='olya_fsm_')}/fsm.db"
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from loguru import logger  # noqa: E402
+from sqlalchemy import delete  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from database.models import FSMRecord, close_db, get_db, init_db  # noqa: E402
+from services.fsm_storage import SQLiteStorage  # noqa: E402
+
+BOT_ID = 123456
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+async def run(storage, chats, updates, state_share, trace_memory):
+    get_times, set_times = [], []
+
+    async def update(chat_id):
+        key = StorageKey(bot_id=BOT_ID, chat_id=chat_id, user_id=chat_id)
+        started = time.perf_counter()
+        await storage.get_state(key)
+        # В прогоне с tracemalloc замеры не копятся, чтобы не учитывать их в памяти
+        if not trace_memory:
+            get_times.append(time.perf_counter() - started)
+        if chat_id % 1000 < state_share * 1000:
+            started = time.perf_counter()
+            await storage.set_state(key, f"Form:step{chat_id % 3}")
+            await storage.set_data(key, {"step": chat_id % 3, "name": "Оля"})
+            if not trace_memory:
+                set_times.append(time.perf_counter() - started)
+
+    if trace_memory:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for chat_id in range(1, chats + 1):
+        await update(chat_id)
+    # Повторные апдейты: 80% от 10% самых активных чатов
+    active = max(1, chats // 10)
+    for _ in range(updates):
+        await update(random.randint(1, active) if random.random() < 0.8 else random.randint(1, chats))
+    elapsed = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return get_times, set_times, memory, elapsed
+
+
+def report(mode, chats, get_times, set_times, memory, elapsed, stats=None):
+    line = (
+        f"{mode:<6} | {chats:>8} чатов | get {sum(get_times) / len(get_times) * 1e6:6.1f}us "
+        f"(p99 {percentile(get_times, 0.99) * 1e6:6.1f}) | set {sum(set_times) / max(1, len(set_times)) * 1e6:7.1f}us "
+        f"(p99 {percentile(set_times, 0.99) * 1e6:7.1f}) | память {memory / 2 ** 20:7.1f} MiB | {elapsed:.1f}s"
+    )
+    if stats:
+        line += f" | в кэше {stats['entries']}, запросов в базу {stats['misses']}"
+    print(line, flush=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--updates", type=int, default=20000, help="повторных апдейтов после первого прохода")
+    parser.add_argument("--state-share", type=float, default=0.01, help="доля чатов, которые пишут состояние")
+    parser.add_argument("--cache-size", type=int, default=settings.FSM_CACHE_MAX_ENTRIES, help="FSM_CACHE_MAX_ENTRIES")
+    parser.add_argument("--modes", nargs="+", default=["memory", "sqlite"])
+    args = parser.parse_args()
+
+    logger.remove()
+    await init_db()
+    try:
+        for chats in args.chats:
+            for mode in args.modes:
+                # Задержка — без tracemalloc (он замедляет аллокации), память — отдельным прогоном
+                runs = []
+                for trace_memory in (False, True):
+                    random.seed(1)
+                    if mode == "sqlite":
+                        async with get_db() as db:
+                            await db.execute(delete(FSMRecord))
+                            await db.commit()
+                        storage = SQLiteStorage(max_entries=args.cache_size)
+                    else:
+                        storage = MemoryStorage()
+                    runs.append(await run(storage, chats, args.updates, args.state_share, trace_memory))
+                    stats = storage.get_stats() if mode == "sqlite" else None
+                    await storage.close()
+                    del storage
+                get_times, set_times, _, elapsed = runs[0]
+                report(mode, chats, get_times, set_times, runs[1][2], elapsed, stats)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,144 @@
+"""
+Бенчмарк запросов истории на растущей таблице messages.
+
+Наполняет базу до нескольких миллионов сообщений и на каждом размере
+измеряет:
+
+* history — загрузку истории пользователя (get_dialog_history при
+  промахе кэша: WHERE user_id ORDER BY created_at DESC LIMIT n);
+* cleanup — поиск сообщений старше порога (WHERE created_at < ?),
+  как при очистке в services/retention.py.
+
+Сначала с индексами из миграции 1, затем без них (индексы удаляются и
+создаются заново; время пересоздания тоже печатается).
+
+Запуск:
+    python -m benchmarks.history_index --sizes 100000 1000000 3000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+_tmp_dir = tempfile.mkdtemp(prefix="olya_bench_")
+_db_path = f"{_tmp_dir}/bench.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from database.migrations import _add_message_history_indexes  # noqa: E402
+from database.models import Message, close_db, engine, get_db, init_db  # noqa: E402
+from services.context_manager import context_manager  # noqa: E402
+
+START = datetime(2024, 1, 1)
+SEED_CHUNK = 100_000
+
+
+def seed(conn, start_row, end_row, users):
+    """Дописывает сообщения [start_row, end_row) по одному в секунду"""
+    for chunk_start in range(start_row, end_row, SEED_CHUNK):
+        chunk_end = min(end_row, chunk_start + SEED_CHUNK)
+        conn.executemany(
+            "INSERT INTO messages (user_id, text, is_bot, created_at) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    row % users + 1,
+                    "Оля, ты прекрасна!" if row % 2 else "привет",
+                    row % 2,
+                    (START + timedelta(seconds=row)).strftime("%Y-%m-%d %H:%M:%S.%f"),
+                )
+                for row in range(chunk_start, chunk_end)
+            ),
+        )
+        conn.commit()
+
+
+def median_ms(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2] * 1000
+
+
+async def measure(users, rows, queries):
+    history, cleanup = [], []
+    cutoff = START + timedelta(seconds=rows // 100)  # ~1% самых старых
+
+    for _ in range(queries):
+        telegram_id = 1000 + random.randrange(users)
+        context_manager.invalidate()
+        started = time.perf_counter()
+        async with get_db() as db:
+            await context_manager.get_dialog_history(telegram_id, db)
+        history.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        async with get_db() as db:
+            await db.execute(select(func.count(Message.id)).where(Message.created_at < cutoff))
+        cleanup.append(time.perf_counter() - started)
+
+    return median_ms(history), median_ms(cleanup)
+
+
+async def drop_indexes():
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("DROP INDEX ix_messages_user_id_created_at")
+        await conn.exec_driver_sql("DROP INDEX ix_messages_created_at")
+
+
+async def create_indexes():
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(_add_message_history_indexes)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 3_000_000],
+                        help="размеры таблицы messages")
+    parser.add_argument("--users", type=int, default=1000, help="количество пользователей")
+    parser.add_argument("--queries", type=int, default=50, help="запросов каждого вида на размер")
+    args = parser.parse_args()
+
+    logger.remove()
+    await init_db()
+
+    conn = sqlite3.connect(_db_path)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO users (telegram_id, created_at) VALUES (?, ?)",
+        ((1000 + i, START.isoformat(sep=" ")) for i in range(args.users)),
+    )
+    conn.commit()
+
+    rows = 0
+    for size in sorted(args.sizes):
+        started = time.perf_counter()
+        seed(conn, rows, size, args.users)
+        rows = size
+        seeded = time.perf_counter() - started
+
+        with_index = await measure(args.users, rows, args.queries)
+        await drop_indexes()
+        without_index = await measure(args.users, rows, max(1, args.queries // 10))
+        rebuild = await create_indexes()
+
+        print(
+            f"rows={rows:>9,} | history: {with_index[0]:7.2f}ms (без индекса {without_index[0]:8.2f}ms) | "
+            f"cleanup: {with_index[1]:7.2f}ms (без индекса {without_index[1]:8.2f}ms) | "
+            f"наполнение {seeded:.1f}s, индексы {rebuild:.1f}s"
+        )
+
+    conn.close()
+    await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
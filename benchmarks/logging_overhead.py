@@ -0,0 +1,125 @@
+"""
+Бенчмарк накладных расходов логирования на обработку сообщения.
+
+На каждое «сообщение» выполняются те же вызовы логгера, что и в горячем
+пути бота (handle_message → история → генерация → статистика →
+сохранение). Замеряется время, которое эти вызовы занимают в event loop:
+среднее, p99 и самое долгое сообщение.
+
+Режимы:
+
+* before      — как раньше: f-строки, синхронная запись в файл на DEBUG;
+* info        — setup_logging() по умолчанию: фоновая запись, файл на INFO,
+                ленивое форматирование;
+* info-sync   — то же с LOG_ENQUEUE=false;
+* debug       — то же, файл на DEBUG;
+* debug-sync  — DEBUG с LOG_ENQUEUE=false (запись прямо из event loop);
+* debug-1/10  — DEBUG с LOG_DEBUG_SAMPLE_RATE=0.1;
+* debug-json  — DEBUG с LOG_JSON.
+
+Запуск:
+    python -m benchmarks.logging_overhead --messages 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from utils import logger as logging_setup  # noqa: E402
+from utils.logger import FILE_FORMAT, debug_sampled, setup_logging, stop_logging  # noqa: E402
+
+HISTORY = list(range(10))
+TEXT = "Привет! Как у тебя дела сегодня? Расскажи что-нибудь хорошее, пожалуйста"
+COMPLIMENT = "Оля, твоя улыбка делает этот день ярче, а рядом с тобой хочется мечтать!"
+
+
+def handle_eager(user_id):
+    """Вызовы логгера до изменений: f-строки форматируются всегда"""
+    logger.info(f"Получено сообщение от {user_id}: {TEXT[:50]}...")
+    logger.debug(f"Загружено {len(HISTORY)} сообщений из истории пользователя {user_id}")
+    provider_name = "openrouter"
+    logger.debug(f"Пробую генерацию через {provider_name}")
+    logger.debug(f"OpenRouter сгенерировал: {COMPLIMENT[:50]}...")
+    logger.info(f"OpenRouter использование | Токены: {140} (вход: {120}, выход: {20})")
+    logger.info(
+        f"📊 Статистика генерации | Попыток: {1} | Провайдер: openrouter | "
+        f"Длина: {len(COMPLIMENT)} chars | Время: {1.234:.2f}s | Доля побед: {0.97:.0%}"
+    )
+    logger.debug(f"Сохранено сообщений: {2} для user_id={user_id}")
+
+
+def handle_lazy(user_id):
+    """Вызовы логгера после изменений"""
+    logger.info("Получено сообщение от {}: {:.50}...{}", user_id, TEXT, "")
+    debug_sampled("Загружено {} сообщений из истории пользователя {}", len(HISTORY), user_id)
+    debug_sampled("Пробую генерацию через {}", "openrouter")
+    debug_sampled("OpenRouter сгенерировал: {:.50}...", COMPLIMENT)
+    logger.info("OpenRouter использование | Токены: {} (вход: {}, выход: {})", 140, 120, 20)
+    logger.info(
+        "📊 Статистика генерации | Попыток: {} | Провайдер: {} | "
+        "Длина: {} chars | Время: {:.2f}s | Доля побед: {:.0%}",
+        1, "openrouter", len(COMPLIMENT), 1.234, 0.97
+    )
+    debug_sampled("Сохранено сообщений: {} для user_id={}", 2, user_id)
+
+
+def configure(mode, log_dir):
+    settings.LOG_FILE = str(Path(log_dir) / f"{mode.replace('/', '_')}.log")
+    settings.LOG_ENQUEUE = not mode.endswith("-sync")
+    settings.LOG_JSON = mode == "debug-json"
+    settings.LOG_FILE_LEVEL = "INFO" if mode.startswith("info") else "DEBUG"
+    settings.LOG_DEBUG_SAMPLE_RATE = 0.1 if mode == "debug-1/10" else 1.0
+
+    if mode != "before":
+        setup_logging()
+        return handle_lazy
+
+    logger.remove()
+    logger.add(sys.stderr, level="INFO")
+    logger.add(settings.LOG_FILE, format=FILE_FORMAT, level="DEBUG", rotation="00:00", compression="zip")
+    logging_setup._debug_enabled = True
+    return handle_eager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(prefix="olya_logs_")
+    real_stderr = sys.stderr
+    results = []
+    # Консольный вывод уходит в /dev/null, чтобы замерять сам логгер, а не терминал
+    with open(os.devnull, "w") as devnull:
+        sys.stderr = devnull
+        try:
+            for mode in ("before", "info", "info-sync", "debug", "debug-sync", "debug-1/10", "debug-json"):
+                handle = configure(mode, log_dir)
+                durations = []
+                for i in range(args.messages):
+                    started = time.perf_counter()
+                    handle(1000 + i % 100)
+                    durations.append(time.perf_counter() - started)
+                drain_started = time.perf_counter()
+                stop_logging()
+                results.append((mode, durations, time.perf_counter() - drain_started))
+        finally:
+            sys.stderr = real_stderr
+
+    for mode, durations, drain in results:
+        p99 = sorted(durations)[int(len(durations) * 0.99)]
+        print(
+            f"{mode:<10} | в event loop: {sum(durations) / len(durations) * 1e6:6.1f}us на сообщение, "
+            f"p99 {p99 * 1e3:5.2f}ms, максимум {max(durations) * 1e3:5.1f}ms | дозапись очереди: {drain:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
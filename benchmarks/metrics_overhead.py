@@ -0,0 +1,111 @@
+"""
+Бенчмарк накладных расходов метрик.
+
+Замеряет в трёх режимах:
+
+* off      — METRICS_ENABLED=false: middleware и слушатели SQLAlchemy не
+  подключаются, observe()/inc() сразу возвращаются;
+* on       — метрики включены и записываются;
+* baseline — горячий путь без каких-либо вызовов метрик.
+
+Для каждого режима печатает стоимость observe() на вызов, обработки
+апдейта через HandlerMetricsMiddleware и SQL запроса на читающем движке,
+а также время сборки ответа /metrics.
+
+Запуск:
+    python -m benchmarks.metrics_overhead --calls 200000 --queries 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_tmp_dir = tempfile.mkdtemp(prefix="olya_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+
+from database.models import close_db, init_db, read_engine  # noqa: E402
+from middlewares.metrics import HandlerMetricsMiddleware  # noqa: E402
+from services.metrics import instrument_engine, metrics, provider_latency  # noqa: E402
+
+
+async def handler(event, data):
+    return None
+
+
+def bench_observe(calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        provider_latency.observe(0.42, provider="openrouter", model="bench", status="ok")
+    return (time.perf_counter() - started) / calls
+
+
+async def bench_handler(calls, wrapped):
+    middleware = HandlerMetricsMiddleware("compliments")
+    started = time.perf_counter()
+    for _ in range(calls):
+        if wrapped:
+            await middleware(handler, None, {})
+        else:
+            await handler(None, {})
+    return (time.perf_counter() - started) / calls
+
+
+async def bench_queries(queries):
+    async with read_engine.connect() as conn:
+        started = time.perf_counter()
+        for _ in range(queries):
+            await conn.execute(text("SELECT 1"))
+        return (time.perf_counter() - started) / queries
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    logger.remove()
+    await init_db()
+    try:
+        metrics.enabled = False
+        rows = [(
+            "baseline", 0.0,
+            await bench_handler(args.calls, wrapped=False),
+            await bench_queries(args.queries),
+        ), (
+            # Выключено: middleware не регистрируется, слушателей нет
+            "off", bench_observe(args.calls),
+            await bench_handler(args.calls, wrapped=False),
+            await bench_queries(args.queries),
+        )]
+
+        metrics.enabled = True
+        instrument_engine(read_engine, "read")
+        rows.append((
+            "on", bench_observe(args.calls),
+            await bench_handler(args.calls, wrapped=True),
+            await bench_queries(args.queries),
+        ))
+
+        for mode, observe, handle, query in rows:
+            print(
+                f"{mode:<8} | observe: {observe * 1e9:6.0f}ns | "
+                f"апдейт: {handle * 1e9:6.0f}ns | SQL запрос: {query * 1e6:6.1f}us"
+            )
+
+        started = time.perf_counter()
+        body = metrics.render()
+        print(f"/metrics: {len(body.splitlines())} строк за {(time.perf_counter() - started) * 1000:.2f}ms")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
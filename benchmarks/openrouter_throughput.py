@@ -0,0 +1,148 @@
+"""
+Бенчмарк пропускной способности запросов к OpenRouter.
+
+Поднимает локальный aiohttp-сервер, имитирующий эндпоинты /models и
+/chat/completions OpenRouter с фиксированной задержкой ответа, и измеряет
+пропускную способность при 1/10/100 одновременных чатах:
+
+* sync  — прежний путь: синхронный клиент OpenAI через asyncio.to_thread;
+* async — общий AsyncOpenAI с пулом keep-alive соединений.
+
+Запуск:
+    python -m benchmarks.openrouter_throughput --requests 200 --delay 0.2
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Направляем провайдер на локальный сервер до импорта настроек
+_sock = socket.socket()
+_sock.bind(("127.0.0.1", 0))
+PORT = _sock.getsockname()[1]
+_sock.close()
+os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{PORT}/api/v1"
+os.environ["OPENROUTER_API_KEY"] = "bench-key"
+os.environ.setdefault("OPENROUTER_MAX_CONCURRENCY", "100")
+os.environ.setdefault("OPENROUTER_MAX_CONNECTIONS", "100")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+from openai import OpenAI  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from services.context_manager import HistoryMessage  # noqa: E402
+from services.openrouter_client import openrouter_client  # noqa: E402
+from services.openrouter_provider import openrouter_provider  # noqa: E402
+
+HISTORY = [
+    HistoryMessage("Привет!", False, None, datetime.utcnow()),
+    HistoryMessage("Оля, ты сегодня прекрасна!", True, None, datetime.utcnow()),
+]
+
+
+def create_stub_app(delay):
+    """Приложение, отвечающее как OpenRouter chat completions"""
+
+    async def models(request):
+        return web.json_response({
+            "object": "list",
+            "data": [{"id": settings.OPENROUTER_MODEL, "object": "model", "created": 0, "owned_by": "stub"}],
+        })
+
+    async def chat_completions(request):
+        body = await request.json()
+        await asyncio.sleep(delay)
+        return web.json_response({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Оля, твоя улыбка делает этот день ярче!"},
+            }],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 20, "total_tokens": 140},
+        })
+
+    app = web.Application()
+    app.router.add_get("/api/v1/models", models)
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+async def run_chats(generate, requests, concurrency):
+    """Запускает requests генераций, не более concurrency одновременно"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def chat(i):
+        async with semaphore:
+            await generate(f"Сообщение номер {i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(i) for i in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+def make_sync_generate():
+    """Прежний путь: синхронный клиент в потоке default executor"""
+    client = OpenAI(
+        base_url=settings.OPENROUTER_BASE_URL,
+        api_key=settings.OPENROUTER_API_KEY,
+        http_client=httpx.Client(),
+    )
+
+    async def generate(text):
+        messages = openrouter_provider._build_messages(text, HISTORY)
+        await asyncio.to_thread(
+            client.chat.completions.create,
+            model=settings.OPENROUTER_MODEL,
+            messages=messages,
+            max_tokens=150,
+        )
+
+    return generate, client
+
+
+async def generate_async(text):
+    await openrouter_provider.generate_compliment(text, HISTORY)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="запросов на каждый уровень параллельности")
+    parser.add_argument("--delay", type=float, default=0.2, help="задержка ответа заглушки, сек")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    logger.remove()
+    runner = web.AppRunner(create_stub_app(args.delay))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    sync_generate, sync_client = make_sync_generate()
+    try:
+        print(f"Заглушка OpenRouter: {settings.OPENROUTER_BASE_URL}, задержка {args.delay}s")
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency)
+            sync_rps = await run_chats(sync_generate, requests, concurrency)
+            async_rps = await run_chats(generate_async, requests, concurrency)
+            print(
+                f"чатов={concurrency:<4} | sync={sync_rps:8.1f} req/s | "
+                f"async={async_rps:8.1f} req/s"
+            )
+    finally:
+        sync_client.close()
+        await openrouter_client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
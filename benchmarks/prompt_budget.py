@@ -0,0 +1,120 @@
+"""
+Бенчмарк сборки промпта с бюджетом токенов.
+
+Генерирует диалоги, похожие на реальные: в основном короткие реплики,
+иногда длинные сообщения (пересказ дня, вставленный текст) и ответы бота.
+История передаётся так же, как в handle_message — с ещё не сохранённым
+текущим сообщением в конце.
+
+Сравниваются:
+
+* before — прежняя сборка: системный промпт, последние N реплик и
+  сообщение целиком;
+* budget — PromptBuilder с настройками PROMPT_*.
+
+Печатает токены промпта (среднее, p95, максимум) и время сборки.
+
+Запуск:
+    python -m benchmarks.prompt_budget --dialogs 2000 --long-share 0.15
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from services.context_manager import HistoryMessage  # noqa: E402
+from services.openrouter_provider import SYSTEM_PROMPT, TYPE_PROMPTS  # noqa: E402
+from services.prompt_builder import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, count_tokens  # noqa: E402
+
+SHORT = [
+    "Привет! Как дела?",
+    "Сегодня был тяжёлый день на работе",
+    "Спасибо, очень приятно 😊",
+    "Я испекла пирог по бабушкиному рецепту",
+    "Сдала экзамен на отлично!",
+    "Немного грустно сегодня",
+]
+LONG_SENTENCE = (
+    "Сегодня с утра всё пошло не по плану: проспала, опоздала на автобус, "
+    "на работе начальник попросил переделать отчёт, который я делала всю неделю. "
+)
+BOT = "Оля, твоя настойчивость восхищает — даже в сложный день ты находишь силы улыбаться! ✨"
+
+
+def make_history(turns, long_share):
+    history = []
+    for i in range(turns):
+        if i % 2:
+            history.append(HistoryMessage(BOT, True, None, datetime.utcnow()))
+        elif random.random() < long_share:
+            history.append(HistoryMessage(LONG_SENTENCE * random.randint(5, 30), False, None, datetime.utcnow()))
+        else:
+            history.append(HistoryMessage(random.choice(SHORT), False, None, datetime.utcnow()))
+    return history
+
+
+def build_before(message_text, history, compliment_type, max_turns):
+    """Сборка промпта до изменений"""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT + TYPE_PROMPTS.get(compliment_type, "")}]
+    for msg in history[-max_turns:]:
+        messages.append({"role": "assistant" if msg.is_bot else "user", "content": msg.text})
+    messages.append({"role": "user", "content": message_text})
+    return messages
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def report(mode, tokens, elapsed, runs):
+    ordered = sorted(tokens)
+    print(
+        f"{mode:<6} | токенов: среднее {sum(tokens) / len(tokens):6.0f}, "
+        f"p95 {ordered[int(len(ordered) * 0.95)]:5}, максимум {ordered[-1]:5} | "
+        f"сборка {elapsed / runs * 1e6:6.1f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dialogs", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=10, help="реплик в истории (CONTEXT_MEMORY_SIZE)")
+    parser.add_argument("--max-turns", type=int, default=5, help="реплик истории в промпте")
+    parser.add_argument("--long-share", type=float, default=0.15, help="доля длинных сообщений")
+    parser.add_argument("--budget", type=int, default=settings.PROMPT_TOKEN_BUDGET, help="бюджет промпта в токенах")
+    args = parser.parse_args()
+
+    logger.remove()
+    random.seed(1)
+    dialogs = []
+    for _ in range(args.dialogs):
+        history = make_history(args.turns - 1, args.long_share)
+        message = make_history(1, args.long_share)[0].text
+        dialogs.append((message, history + [HistoryMessage(message, False, None, datetime.utcnow())],
+                        random.choice([None, None, "appearance", "character", "achievements"])))
+
+    started = time.perf_counter()
+    before = [prompt_tokens(build_before(m, h, t, args.max_turns)) for m, h, t in dialogs]
+    report("before", before, time.perf_counter() - started, len(dialogs))
+
+    builder = PromptBuilder("bench", SYSTEM_PROMPT, TYPE_PROMPTS, max_turns=args.max_turns, budget=args.budget)
+    started = time.perf_counter()
+    after = [builder.build(m, h, t).tokens for m, h, t in dialogs]
+    report("budget", after, time.perf_counter() - started, len(dialogs))
+
+    stats = builder.get_stats()
+    print(
+        f"сэкономлено токенов: {stats['tokens_saved']} ({stats['tokens_saved'] / sum(before):.0%}) | "
+        f"обрезано сообщений: {stats['truncated_messages']} | реплик в сводках: {stats['summarized_turns']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Бенчмарк отсева почти повторов комплиментов.
+
+Замеряет:
+
+* проверку seen_similar при DEDUP_HISTORY_SIZE отпечатках у пользователя
+  (новый текст и текст из кэша отпечатков);
+* память индекса на пользователя (tracemalloc) при заполненной истории —
+  только отпечатки и очередь, без кэшей simhash (они ограничены);
+* качество: доля пойманных правок шаблонов (1–3 слова вставлены, удалены
+  или заменены) и ложных срабатываний между разными шаблонами;
+* повторы у fallback: сколько из --rounds подряд выданных комплиментов
+  одного типа повторяли уже выданный, до (random.choice) и после
+  (avoid). По умолчанию --rounds равно числу шаблонов типа: больше
+  разных комплиментов fallback дать не может.
+
+Запуск:
+    python -m benchmarks.served_index --users 1000
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from services.served_index import ServedIndex, simhash  # noqa: E402
+from utils.fallback_generator import fallback_generator  # noqa: E402
+
+FILLERS = ("очень", "особенно", "просто", "сегодня", "так", "милая", "яркая", "чудесная")
+TEMPLATES = [text for texts in fallback_generator.compliments.values() for text in texts]
+
+
+def mutate(text, edits):
+    words = text.split()
+    for _ in range(edits):
+        i = random.randrange(len(words))
+        op = random.random()
+        if op < 0.4:
+            words.insert(i, random.choice(FILLERS))
+        elif op < 0.7 and len(words) > 3:
+            del words[i]
+        else:
+            words[i] = random.choice(FILLERS)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=len(fallback_generator.compliments["character"]),
+                        help="комплиментов подряд одному пользователю")
+    args = parser.parse_args()
+
+    logger.remove()
+    random.seed(1)
+    size = settings.DEDUP_HISTORY_SIZE
+
+    # Память: заполненная история у каждого пользователя
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    index = ServedIndex(max_users=args.users)
+    for user_id in range(args.users):
+        index._loaded[user_id] = True
+        index._store(user_id, deque((random.getrandbits(64) for _ in range(size)), maxlen=size))
+    memory = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    print(f"Память: {memory / args.users:.0f} байт на пользователя ({size} отпечатков), "
+          f"{memory / 2 ** 20:.1f} MiB на {args.users} пользователей")
+
+    # Задержка проверки
+    fresh = [f"{random.choice(TEMPLATES)} {i}" for i in range(args.checks)]
+    started = time.perf_counter()
+    for i, text in enumerate(fresh):
+        index.seen_similar(i % args.users, text)
+    cold = (time.perf_counter() - started) / args.checks
+    started = time.perf_counter()
+    for i in range(args.checks):
+        index.seen_similar(i % args.users, TEMPLATES[i % len(TEMPLATES)])
+    warm = (time.perf_counter() - started) / args.checks
+    print(f"seen_similar: {cold * 1e6:.1f}us для нового текста, {warm * 1e6:.1f}us для уже виденного "
+          f"(сравнение с {size} отпечатками)")
+
+    # Качество
+    limit = settings.DEDUP_MAX_DISTANCE
+    for edits in (1, 2, 3):
+        caught = [
+            (simhash(text) ^ simhash(mutate(text, edits))).bit_count() <= limit
+            for text in TEMPLATES for _ in range(50)
+        ]
+        print(f"правок {edits}: поймано {sum(caught) / len(caught):.0%}")
+    distances = [(simhash(a) ^ simhash(b)).bit_count() for a, b in itertools.combinations(TEMPLATES, 2)]
+    false_positives = sum(d <= limit for d in distances)
+    print(f"разные шаблоны: минимальное расстояние {min(distances)} бит, ложных срабатываний "
+          f"{false_positives} из {len(distances)} (порог {limit})")
+
+    # Повторы у fallback: до и после
+    for mode in ("before", "after"):
+        repeats = total = 0
+        for user_id in range(args.users):
+            index = ServedIndex()
+            index._loaded[user_id] = True
+            avoid = index.avoid_for(user_id) if mode == "after" else None
+            served = []
+            for _ in range(args.rounds):
+                text = fallback_generator.generate_compliment("character", avoid=avoid)
+                repeats += text in served
+                total += 1
+                served.append(text)
+                index.remember(user_id, text)
+        print(f"{mode:<6} | повторов среди {args.rounds} комплиментов подряд: {repeats / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Нагрузочный тест профилей SQLite (legacy / balanced / durable).
+
+Для каждого профиля создаёт отдельную базу и одновременно запускает:
+
+* писателей — каждый сохраняет обмен репликами (два сообщения, один commit);
+* читателей — каждый читает последние сообщения пользователя, как
+  get_dialog_history при промахе кэша.
+
+Печатает записи/с, чтения/с и p95 задержки чтения. В legacy читатели и
+писатель делят одно соединение, в WAL-профилях чтение идёт через пул.
+
+Запуск:
+    python -m benchmarks.sqlite_profiles --seconds 5 --writers 4 --readers 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from database.models import (  # noqa: E402
+    SQLITE_PROFILES,
+    Base,
+    Message,
+    User,
+    create_engines,
+    create_sessionmaker,
+)
+
+USERS = 50
+
+
+async def writer(Session, stop_at, counter):
+    i = 0
+    while time.perf_counter() < stop_at:
+        user_id = i % USERS + 1
+        async with Session() as db:
+            await db.execute(insert(Message), [
+                {"user_id": user_id, "text": "привет", "is_bot": False},
+                {"user_id": user_id, "text": "Оля, ты прекрасна!", "is_bot": True},
+            ])
+            await db.commit()
+        counter["writes"] += 1
+        i += 1
+
+
+async def reader(Session, stop_at, counter, latencies):
+    i = 0
+    while time.perf_counter() < stop_at:
+        user_id = i % USERS + 1
+        started = time.perf_counter()
+        async with Session() as db:
+            result = await db.execute(
+                select(Message)
+                .where(Message.user_id == user_id)
+                .order_by(Message.created_at.desc())
+                .limit(10)
+            )
+            result.scalars().all()
+        latencies.append(time.perf_counter() - started)
+        counter["reads"] += 1
+        i += 1
+
+
+async def run_profile(profile, args):
+    path = os.path.join(tempfile.mkdtemp(prefix="olya_sqlite_"), "bench.db")
+    write_engine, read_engine = create_engines(
+        f"sqlite:///{path}", dict(SQLITE_PROFILES[profile]), read_pool_size=args.readers
+    )
+    Session = create_sessionmaker(write_engine, read_engine)
+
+    async with write_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with Session() as db:
+        await db.execute(insert(User), [{"telegram_id": 1000 + i} for i in range(USERS)])
+        await db.commit()
+
+    counter = {"writes": 0, "reads": 0}
+    latencies = []
+    stop_at = time.perf_counter() + args.seconds
+    await asyncio.gather(
+        *(writer(Session, stop_at, counter) for _ in range(args.writers)),
+        *(reader(Session, stop_at, counter, latencies) for _ in range(args.readers)),
+    )
+
+    await write_engine.dispose()
+    if read_engine is not write_engine:
+        await read_engine.dispose()
+
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) > 1 else 0.0
+    print(
+        f"{profile:<8} | записей/с: {counter['writes'] / args.seconds:8.1f} | "
+        f"чтений/с: {counter['reads'] / args.seconds:8.1f} | p95 чтения: {p95:.2f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0, help="длительность прогона профиля")
+    parser.add_argument("--writers", type=int, default=4, help="одновременных писателей")
+    parser.add_argument("--readers", type=int, default=8, help="одновременных читателей")
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES), help="профили для сравнения")
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        await run_profile(profile, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
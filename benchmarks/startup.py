@@ -0,0 +1,180 @@
+"""
+Бенчмарк времени запуска: от старта процесса до обработки первого апдейта.
+
+Родительский процесс поднимает заглушку OpenRouter (с задержкой на /models,
+имитирующей загрузку каталога) и несколько раз запускает дочерний процесс,
+который импортирует бота, собирает диспетчер как bot.main() и подаёт в него
+первое текстовое сообщение. Запросы к Telegram обслуживает локальная сессия
+без сети.
+
+Сравниваются холодный старт (кэша каталога моделей нет) и повторный старт
+с кэшем на диске.
+
+Запуск:
+    python -m benchmarks.startup --runs 5 --catalog-delay 1.0
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import socket  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+from pathlib import Path  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+async def child():
+    """Дочерний процесс: импорт бота и обработка первого апдейта"""
+    sys.path.insert(0, str(ROOT))
+
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import SendMessage
+    from aiogram.types import Message, Update
+
+    import bot as bot_module
+    from database.models import close_db, init_db
+    from services.ai_generator import ai_generator
+    from services.openrouter_client import openrouter_client
+
+    imported = time.perf_counter()
+
+    class LocalSession(BaseSession):
+        """Отвечает на запросы Bot API локально, без сети"""
+
+        async def make_request(self, bot, method, timeout=None):
+            if isinstance(method, SendMessage):
+                return Message.model_validate({
+                    "message_id": 2,
+                    "date": int(time.time()),
+                    "chat": {"id": method.chat_id, "type": "private"},
+                    "text": method.text,
+                }, context={"bot": bot})
+            return True
+
+        async def stream_content(self, *args, **kwargs):
+            yield b""
+
+        async def close(self):
+            pass
+
+    await init_db()
+    bot = Bot(token="42:BENCH", session=LocalSession())
+    dp = bot_module.create_dispatcher()
+    warm_up = asyncio.create_task(ai_generator.warm_up())
+
+    update = Update.model_validate({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "date": int(time.time()),
+            "chat": {"id": 100, "type": "private"},
+            "from": {"id": 100, "is_bot": False, "first_name": "Оля"},
+            "text": "Привет! Сделай комплимент",
+        },
+    }, context={"bot": bot})
+    await dp.feed_update(bot, update)
+    handled = time.perf_counter()
+
+    warm_up.cancel()
+    await openrouter_client.close()
+    await close_db()
+    print(json.dumps({"import": imported - STARTED, "first_update": handled - STARTED}))
+
+
+def create_stub_app(catalog_delay):
+    from aiohttp import web
+
+    async def models(request):
+        await asyncio.sleep(catalog_delay)
+        return web.json_response({"object": "list", "data": [
+            {"id": "openai/gpt-3.5-turbo", "object": "model", "created": 0, "owned_by": "stub"},
+        ]})
+
+    async def chat_completions(request):
+        body = await request.json()
+        return web.json_response({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "Оля, ты прекрасна!"}}],
+        })
+
+    app = web.Application()
+    app.router.add_get("/api/v1/models", models)
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+async def run_child(env, workdir):
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, str(Path(__file__).resolve()), "--child",
+        env=env, cwd=workdir,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    stdout, _ = await process.communicate()
+    return json.loads(stdout.decode().strip().splitlines()[-1])
+
+
+async def parent(args):
+    from aiohttp import web
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    runner = web.AppRunner(create_stub_app(args.catalog_delay))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    workdir = tempfile.mkdtemp(prefix="olya_startup_")
+    cache_path = Path(workdir) / "openrouter_models.json"
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN="42:BENCH",
+        OPENROUTER_API_KEY="bench-key",
+        OPENROUTER_BASE_URL=f"http://127.0.0.1:{port}/api/v1",
+        OPENROUTER_MODELS_CACHE=str(cache_path),
+        DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+    )
+
+    try:
+        for label, keep_cache in (("холодный", False), ("с кэшем", True)):
+            imports, first_updates = [], []
+            for _ in range(args.runs):
+                if not keep_cache:
+                    cache_path.unlink(missing_ok=True)
+                result = await run_child(env, workdir)
+                imports.append(result["import"])
+                first_updates.append(result["first_update"])
+            print(
+                f"{label:<9} | импорт={statistics.median(imports) * 1000:.0f}ms | "
+                f"первый апдейт={statistics.median(first_updates) * 1000:.0f}ms "
+                f"(медиана из {args.runs})"
+            )
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="запусков на каждый сценарий")
+    parser.add_argument("--catalog-delay", type=float, default=1.0, help="задержка ответа /models, сек")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child())
+    else:
+        asyncio.run(parent(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Бенчмарк потоковой доставки комплимента.
+
+Поднимает локальный aiohttp-сервер, имитирующий OpenRouter: ответ
+приходит потоком SSE — первый токен через --first-token, остальные с
+интервалом --token-delay. Вызовы Bot API имитируются объектом сообщения
+с задержкой --api-latency на каждый вызов.
+
+Через handle_message прогоняются сообщения в двух режимах:
+
+* full   — ждём весь ответ, отправляем новое сообщение, удаляем заглушку;
+* stream — AI_STREAMING_ENABLED: заглушка редактируется по мере генерации.
+
+Печатает время до первого текста комплимента, до окончательного ответа
+и число вызовов Bot API на ответ.
+
+Запуск:
+    python -m benchmarks.streaming --messages 20 --first-token 0.6 --token-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_sock = socket.socket()
+_sock.bind(("127.0.0.1", 0))
+PORT = _sock.getsockname()[1]
+_sock.close()
+_tmp_dir = tempfile.mkdtemp(prefix="olya_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir}/bench.db"
+os.environ["OPENROUTER_BASE_URL"] = f"http://127.0.0.1:{PORT}/api/v1"
+os.environ["OPENROUTER_API_KEY"] = "bench-key"
+os.environ["OPENROUTER_MODELS_CACHE"] = f"{_tmp_dir}/models.json"
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["MESSAGE_WRITER_ENABLED"] = "false"
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import web  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from database.models import close_db, init_db  # noqa: E402
+from handlers.compliments import handle_message  # noqa: E402
+from services.openrouter_client import openrouter_client  # noqa: E402
+
+TOKENS = "Оля , твоя улыбка делает этот день ярче , а рядом с тобой хочется мечтать !".split()
+
+
+def create_stub_app(first_token, token_delay):
+    """Приложение, отвечающее как OpenRouter chat completions (в том числе stream)"""
+
+    async def models(request):
+        return web.json_response({
+            "object": "list",
+            "data": [{"id": settings.OPENROUTER_MODEL, "object": "model", "created": 0, "owned_by": "stub"}],
+        })
+
+    def chunk(body, content, finish_reason=None):
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish_reason}],
+        }
+
+    async def chat_completions(request):
+        body = await request.json()
+        await asyncio.sleep(first_token)
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * (len(TOKENS) - 1))
+            return web.json_response({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(TOKENS)}}],
+                "usage": {"prompt_tokens": 120, "completion_tokens": len(TOKENS), "total_tokens": 140},
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, token in enumerate(TOKENS):
+            if i:
+                await asyncio.sleep(token_delay)
+            data = json.dumps(chunk(body, token if i == 0 else " " + token), ensure_ascii=False)
+            await response.write(f"data: {data}\n\n".encode())
+        await response.write(f"data: {json.dumps(chunk(body, None, 'stop'))}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_get("/api/v1/models", models)
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeMessage:
+    """Сообщение с методами Bot API, которые вызывает handle_message"""
+
+    def __init__(self, probe, text="", user_id=1):
+        self.probe = probe
+        self.text = text
+        self.from_user = FakeUser(user_id)
+
+    async def _call(self, text=None):
+        self.probe.calls += 1
+        await asyncio.sleep(self.probe.api_latency)
+        if text and self.probe.first_text is None and not text.startswith("Думаю"):
+            self.probe.first_text = time.perf_counter()
+
+    async def answer(self, text, **kwargs):
+        await self._call(text)
+        return FakeMessage(self.probe, text, self.from_user.id)
+
+    async def edit_text(self, text, **kwargs):
+        await self._call(text)
+        self.text = text
+
+    async def delete(self):
+        await self._call()
+
+
+class Probe:
+    def __init__(self, api_latency):
+        self.api_latency = api_latency
+        self.calls = 0
+        self.first_text = None
+
+
+async def run(mode, args):
+    settings.AI_STREAMING_ENABLED = mode == "stream"
+    first, total, calls = [], [], []
+    for i in range(args.messages):
+        probe = Probe(args.api_latency)
+        started = time.perf_counter()
+        await handle_message(FakeMessage(probe, f"Привет! Сообщение {i}", user_id=1000 + i))
+        total.append(time.perf_counter() - started)
+        first.append(probe.first_text - started)
+        calls.append(probe.calls)
+
+    print(
+        f"{mode:<6} | первый текст: {statistics.median(first) * 1000:6.0f}ms | "
+        f"весь ответ: {statistics.median(total) * 1000:6.0f}ms | "
+        f"вызовов Bot API: {statistics.mean(calls):.1f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--first-token", type=float, default=0.6, help="задержка первого токена, с")
+    parser.add_argument("--token-delay", type=float, default=0.1, help="интервал между токенами, с")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="задержка вызова Bot API, с")
+    args = parser.parse_args()
+
+    logger.remove()
+    await init_db()
+    runner = web.AppRunner(create_stub_app(args.first_token, args.token_delay))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    try:
+        await run("full", args)
+        await run("stream", args)
+    finally:
+        await openrouter_client.close()
+        await runner.cleanup()
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+Бенчмарк определения типа комплимента.
+
+Генерирует синтетический корпус русских сообщений: обычные слова,
+изредка слова-признаки типов в разных формах (включая ложные
+срабатывания подстрокой вроде «заработала») и эмодзи. Корпус идёт
+одним потоком диалогов, окно контекста — последние TYPE_CLASSIFIER_WINDOW
+сообщений.
+
+Сравниваются:
+
+* before        — прежний _detect_type_from_context: подстроки по одному
+                  слову в последнем сообщении, первое совпадение выигрывает;
+* before-window — те же подстроки, но с подсчётом баллов по всему окну
+                  (во что обошёлся бы тот же подход для окна);
+* compiled      — TypeClassifier на последнем сообщении без кэша;
+* window        — TypeClassifier.classify по окну (как в боте, с кэшем);
+* model         — TypeModel.classify по окну (с --model: обученная модель
+                  services/type_model.py, по одному окну и пачками --batch).
+
+Печатает время на сообщение, долю верно определённых типов последнего
+сообщения (для режимов без окна) и для скольких сообщений окно меняет тип.
+
+Запуск:
+    python -m benchmarks.type_classifier --messages 200000
+    python -m benchmarks.type_classifier --model data/type_model
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from services.type_model import TypeModel  # noqa: E402
+from utils.type_classifier import KEYWORDS, TypeClassifier  # noqa: E402
+
+FILLER = (
+    "сегодня", "вчера", "я", "ты", "мы", "очень", "немного", "просто", "когда", "потом",
+    "дома", "утром", "вечером", "подруга", "мама", "кофе", "погода", "дождь", "солнце",
+    "устала", "гуляла", "думаю", "хочется", "кажется", "наконец", "снова", "вместе",
+    "купила", "приготовила", "читала", "смотрела", "фильм", "кот", "собака", "город",
+)
+SIGNALS = {
+    "appearance": ("красивое", "стильная", "улыбка", "глаза", "волосы", "платье", "причёску", "макияж", "фото"),
+    "character": ("добрая", "умная", "весело", "поддержала", "помогла", "заботится", "терпение", "юмор"),
+    "achievements": ("работе", "успех", "достижение", "проект", "цель", "результат", "экзамен", "сдала", "премию"),
+}
+# Ложные срабатывания прежних подстрок
+DECOYS = ("заработала", "бесцельно", "неумная", "прицельно", "отработала")
+EMOJI = ("😊", "✨", "💖", "🙂", "")
+
+OLD_APPEARANCE = ["красив", "стиль", "внешн", "улыб", "глаз", "волос", "одежд"]
+OLD_CHARACTER = ["умн", "добр", "весел", "поддерж", "помощ", "забот"]
+OLD_ACHIEVEMENT = ["работа", "успех", "достиж", "проект", "цель", "результат"]
+
+
+def detect_before(context):
+    """Прежний _detect_type_from_context"""
+    if not context:
+        return "general"
+    last_message = context[-1].lower()
+    for word in OLD_APPEARANCE:
+        if word in last_message:
+            return "appearance"
+    for word in OLD_CHARACTER:
+        if word in last_message:
+            return "character"
+    for word in OLD_ACHIEVEMENT:
+        if word in last_message:
+            return "achievements"
+    return "general"
+
+
+def detect_before_window(context, decay):
+    """Прежние подстроки, но с баллами по всему окну"""
+    scores = {"appearance": 0.0, "character": 0.0, "achievements": 0.0}
+    weight = 1.0
+    for text in reversed(context):
+        text = text.lower()
+        for compliment_type, stems in KEYWORDS.items():
+            scores[compliment_type] += weight * sum(text.count(stem) for stem in stems)
+        weight *= decay
+    best = max(scores, key=scores.__getitem__)
+    return best if scores[best] > 0 else "general"
+
+
+def make_message():
+    """Сообщение и его настоящий тип (тип вставленного слова-признака или general)"""
+    words = [random.choice(FILLER) for _ in range(random.randint(3, 40))]
+    # Не больше одного типа на сообщение, чтобы тип был однозначным
+    truth = random.choice(("general", "general", "general") + tuple(SIGNALS))
+    if truth != "general":
+        for _ in range(random.randint(1, 2)):
+            words.insert(random.randrange(len(words) + 1), random.choice(SIGNALS[truth]))
+    if random.random() < 0.1:
+        words.insert(random.randrange(len(words) + 1), random.choice(DECOYS))
+    words[0] = words[0].capitalize()
+    text = " ".join(words) + random.choice((".", "!", "?", "...")) + " " + random.choice(EMOJI)
+    return text, truth
+
+
+def measure(name, classify, windows, truth=None):
+    started = time.perf_counter()
+    results = [classify(window) for window in windows]
+    elapsed = time.perf_counter() - started
+    line = f"{name:<14} | {elapsed / len(windows) * 1e6:6.2f}us на сообщение"
+    if truth is not None:
+        correct = sum(a == b for a, b in zip(results, truth))
+        line += f" | верный тип последнего сообщения: {correct / len(windows):.1%}"
+    print(line)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--window", type=int, default=settings.TYPE_CLASSIFIER_WINDOW)
+    parser.add_argument("--model", help="каталог обученной модели типов")
+    parser.add_argument("--batch", type=int, default=256, help="окон в пачке для модели")
+    args = parser.parse_args()
+
+    random.seed(1)
+    corpus, truth = zip(*(make_message() for _ in range(args.messages)))
+    windows = [corpus[max(0, i - args.window + 1):i + 1] for i in range(len(corpus))]
+    average = sum(len(text) for text in corpus) / len(corpus)
+    print(f"Корпус: {len(corpus)} сообщений, в среднем {average:.0f} символов, окно {args.window}")
+
+    classifier = TypeClassifier(window=args.window)
+    before = measure("before", detect_before, windows, truth)
+    measure("before-window", lambda w: detect_before_window(w, classifier.decay), windows)
+    # Каждый раз новая строка, чтобы кэш не срабатывал
+    measure("compiled", lambda w: classifier.classify(w) or "general", [(text + " ",) for text in corpus], truth)
+    classifier.count_matches.cache_clear()
+    window = measure("window", lambda w: classifier.classify(w) or "general", windows)
+    changed = sum(a != b for a, b in zip(before, window))
+    print(f"окно изменило тип для {changed / len(windows):.1%} сообщений")
+    info = classifier.count_matches.cache_info()
+    print(f"кэш совпадений: попаданий {info.hits}, промахов {info.misses}")
+
+    if args.model:
+        logger.remove()
+        model = TypeModel(path=args.model)
+        if not model.available:
+            print(f"модель {args.model} не загружена")
+            return
+        # Модель медленнее правил, поэтому меряем на части корпуса
+        sample = min(len(windows), 20000)
+        measure("model", lambda w: model.classify(w) or "general", [(text,) for text in corpus[:sample]], truth[:sample])
+        batches = [[(text,) for text in corpus[i:i + args.batch]] for i in range(0, sample, args.batch)]
+        started = time.perf_counter()
+        results = [t or "general" for batch in batches for t in model.classify_batch(batch)]
+        elapsed = time.perf_counter() - started
+        correct = sum(a == b for a, b in zip(results, truth[:sample]))
+        print(f"{'model-batch':<14} | {elapsed / sample * 1e6:6.2f}us на сообщение | "
+              f"верный тип последнего сообщения: {correct / sample:.1%}")
+        stats = model.get_stats()
+        print(f"модель уверена: {stats['predictions']}, откат на ключевые слова: {stats['fallbacks']}")
+
+
+if __name__ == "__main__":
+    main()
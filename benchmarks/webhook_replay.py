@@ -0,0 +1,113 @@
+"""
+Отправка записанных апдейтов Telegram в локальный вебхук.
+
+Читает апдейты из файла (JSON-массив или JSON Lines) либо генерирует
+текстовые сообщения от нескольких пользователей и отправляет их POST-ом
+с заголовком секрета, как это делает Telegram. Печатает коды ответов,
+задержку подтверждения, /health и метрики вебхука после прогона
+(метрики — если бот запущен с METRICS_ENABLED=true).
+
+Бот запускается локально так:
+    BOT_MODE=webhook WEBHOOK_URL= METRICS_ENABLED=true python bot.py
+
+Запуск:
+    python -m benchmarks.webhook_replay --updates updates.jsonl
+    python -m benchmarks.webhook_replay --count 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aiohttp  # noqa: E402
+
+from config.settings import settings  # noqa: E402
+from services.webhook_server import SECRET_HEADER, get_webhook_secret  # noqa: E402
+
+
+def load_updates(path):
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def synthetic_updates(count, users):
+    now = int(time.time())
+    updates = []
+    for i in range(count):
+        user_id = 1000 + i % users
+        chat = {"id": user_id, "type": "private", "first_name": "Оля"}
+        updates.append({
+            "update_id": 100000 + i,
+            "message": {
+                "message_id": i + 1,
+                "date": now,
+                "chat": chat,
+                "from": {"id": user_id, "is_bot": False, "first_name": "Оля"},
+                "text": f"Привет! Как у меня дела? #{i}",
+            },
+        })
+    return updates
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.WEBHOOK_PORT}", help="адрес сервера")
+    parser.add_argument("--updates", help="файл с апдейтами (JSON или JSON Lines)")
+    parser.add_argument("--count", type=int, default=100, help="сколько апдейтов сгенерировать")
+    parser.add_argument("--users", type=int, default=10, help="пользователей в сгенерированных апдейтах")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных запросов")
+    parser.add_argument("--secret", default=None, help="секрет вебхука (по умолчанию из настроек)")
+    parser.add_argument("--metrics-url", default=f"http://{settings.METRICS_HOST}:{settings.METRICS_PORT}",
+                        help="адрес сервера метрик")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) if args.updates else synthetic_updates(args.count, args.users)
+    secret = args.secret if args.secret is not None else get_webhook_secret()
+    headers = {SECRET_HEADER: secret}
+
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(args.url + settings.WEBHOOK_PATH, json=update, headers=headers) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        elapsed = time.perf_counter() - started
+
+        async with session.get(args.url + "/health") as resp:
+            health = resp.status
+        try:
+            async with session.get(args.metrics_url + "/metrics") as resp:
+                webhook_metrics = [line for line in (await resp.text()).splitlines() if line.startswith("webhook_")]
+        except aiohttp.ClientError:
+            webhook_metrics = []
+
+    latencies.sort()
+    print(
+        f"апдейтов: {len(updates)} | ответы: {dict(statuses)} | {len(updates) / elapsed:.0f} req/s | "
+        f"подтверждение p50={statistics.median(latencies) * 1000:.1f}ms "
+        f"p99={latencies[int(0.99 * (len(latencies) - 1))] * 1000:.1f}ms"
+    )
+    print(f"health: {health}")
+    for line in webhook_metrics:
+        print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
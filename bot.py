@@ -1,60 +1,210 @@
 import asyncio
 import signal
 import sys
+from typing import Optional
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from loguru import logger
 
 from config.settings import settings
-from database.models import init_db
+from database.models import close_db, engine, init_db, read_engine
 from handlers import commands, compliments, errors
-from utils.logger import logger as app_logger
+from middlewares.coalescing import coalescing_middleware
+from middlewares.metrics import HandlerMetricsMiddleware
+from middlewares.scheduling import scheduling_middleware
+from middlewares.throttling import throttling_middleware
+from services.ai_generator import ai_generator
+from services.compliment_pool import compliment_pool
+from services.context_manager import context_manager
+from services.fsm_storage import SQLiteStorage
+from services.metrics import MetricsServer, instrument_engine, metrics
+from services.openrouter_client import openrouter_client
+from services.response_cache import response_cache
+from services.served_index import served_index
+from services.type_model import type_model
+from services.retention import retention_scheduler
+from services.webhook_server import WebhookServer
+from utils.logger import setup_logging, stop_logging
+
+
+def create_dispatcher() -> Dispatcher:
+    """Создает диспетчер и регистрирует роутеры"""
+    # Состояния FSM переживают рестарт и не копятся в памяти для каждого чата
+    storage = SQLiteStorage() if settings.FSM_STORAGE == "sqlite" else MemoryStorage()
+    dp = Dispatcher(storage=storage)
+    
+    # Регистрация роутеров
+    dp.include_router(commands.router)
+    dp.include_router(compliments.router)
+    dp.include_router(errors.router)
+    
+    # Время обработчиков (первым, чтобы учитывать ожидание в остальных middleware)
+    if settings.METRICS_ENABLED:
+        for name, router in (("commands", commands.router), ("compliments", compliments.router)):
+            router.message.middleware(HandlerMetricsMiddleware(name))
+            router.callback_query.middleware(HandlerMetricsMiddleware(name))
+    
+    # Объединение сообщений, пришедших подряд, затем лимиты и справедливая очередь генераций
+    compliments.router.message.middleware(coalescing_middleware)
+    if settings.RATE_LIMIT_ENABLED:
+        compliments.router.message.middleware(throttling_middleware)
+    # Очередь ограничивает одновременные генерации и при выключенных лимитах
+    compliments.router.message.middleware(scheduling_middleware)
+    
+    return dp
+
+
+async def notify_admin(bot: Bot):
+    """Сообщает админу о запуске бота"""
+    try:
+        await bot.send_message(
+            settings.BOT_ADMIN_ID,
+            "🤖 Бот с комплиментами для Оли запущен и готов к работе!"
+        )
+    except Exception as e:
+        logger.warning(f"Не удалось отправить сообщение админу: {e}")
+
+
+def register_metrics(dp: Dispatcher, webhook_server: Optional[WebhookServer] = None):
+    """Подключает замер SQL запросов и публикует статистику компонентов"""
+    instrument_engine(engine, "write")
+    if read_engine is not engine:
+        instrument_engine(read_engine, "read")
+    
+    metrics.register_stats("response_cache", response_cache.get_stats,
+                           counters=("hits", "similar_hits", "misses"))
+    metrics.register_stats("coalescing", coalescing_middleware.get_stats,
+                           counters=("messages", "generations", "coalesced", "superseded"))
+    metrics.register_stats("retention", retention_scheduler.get_stats,
+                           counters=("runs", "batches", "deleted_expired", "deleted_over_cap", "vacuumed_pages"))
+    if settings.RATE_LIMIT_ENABLED:
+        metrics.register_stats("throttling", throttling_middleware.get_stats,
+                               counters=("allowed", "throttled_user", "throttled_global"))
+    metrics.register_stats("scheduler", scheduling_middleware.get_stats, counters=("granted", "queued"))
+    metrics.register_stats("type_model", type_model.get_stats, counters=("predictions", "fallbacks"))
+    if settings.DEDUP_ENABLED:
+        metrics.register_stats("served_index", served_index.get_stats, counters=("checks", "repeats", "loads"))
+    if isinstance(dp.storage, SQLiteStorage):
+        metrics.register_stats("fsm_storage", dp.storage.get_stats,
+                               counters=("hits", "misses", "writes", "evictions", "expired"))
+    if webhook_server is not None:
+        metrics.register_stats("webhook", webhook_server.get_stats,
+                               counters=("received", "processed", "failed", "rejected"))
+    
+    writer = context_manager.writer
+    metrics.collector("message_writer_depth", "Сообщения, ожидающие записи в базу",
+                      lambda: [({}, writer.depth)])
+    metrics.collector("message_writer_flushed_total", "Сообщения, записанные очередью записи",
+                      lambda: [({}, writer.flushed_messages)], kind="counter")
+    metrics.collector("message_writer_failed_total", "Сообщения, которые очередь записи не смогла записать",
+                      lambda: [({}, writer.failed_messages)], kind="counter")
+    metrics.collector("message_writer_failed_batches_total", "Пачки, которые очередь записи не смогла записать",
+                      lambda: [({}, writer.failed_batches)], kind="counter")
+    metrics.collector("compliment_pool_size", "Готовые комплименты в пуле по типам",
+                      lambda: [({"type": name}, size) for name, size in compliment_pool.sizes().items()])
+    metrics.collector("provider_health", "Оценка здоровья AI провайдера",
+                      lambda: [({"provider": name}, breaker.health_score)
+                               for name, breaker in ai_generator.breakers.items()])
 
 
 async def main():
     """Основная функция запуска бота"""
     
+    # Логи пишутся в фоновом потоке (utils/logger.py)
+    setup_logging()
+    
     # Инициализация базы данных
-    init_db()
+    await init_db()
     logger.info("База данных инициализирована")
     
+    # Отложенная запись сообщений (заодно дописывает сообщения из журнала)
+    if settings.MESSAGE_WRITER_ENABLED:
+        await context_manager.writer.start()
+    
     # Инициализация бота
     bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-    
-    # Регистрация роутеров
-    dp.include_router(commands.router)
-    dp.include_router(compliments.router)
-    dp.include_router(errors.router)
+    dp = create_dispatcher()
     
     # Логирование запуска
     logger.info("Бот запущен и готов к работе!")
     
+    # Сетевые операции запуска выполняются в фоне, чтобы не откладывать поллинг
+    background_tasks = [asyncio.create_task(ai_generator.warm_up())]
     if settings.BOT_ADMIN_ID:
-        try:
-            await bot.send_message(
-                settings.BOT_ADMIN_ID,
-                "🤖 Бот с комплиментами для Оли запущен и готов к работе!"
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось отправить сообщение админу: {e}")
-    
-    # Запуск поллинга
-    await dp.start_polling(bot)
+        background_tasks.append(asyncio.create_task(notify_admin(bot)))
+    
+    # Фоновая проверка упавших AI провайдеров
+    ai_generator.start_health_probes()
+    
+    # Фоновое пополнение пула комплиментов для кнопок выбора типа
+    if settings.COMPLIMENT_POOL_ENABLED:
+        compliment_pool.start()
+    
+    # Фоновая очистка старых сообщений небольшими пачками
+    if settings.RETENTION_ENABLED:
+        retention_scheduler.start()
+    
+    webhook_server = None
+    if settings.BOT_MODE == "webhook":
+        webhook_server = WebhookServer(bot, dp)
+    
+    metrics_server = None
+    if settings.METRICS_ENABLED:
+        register_metrics(dp, webhook_server)
+        metrics_server = MetricsServer()
+        await metrics_server.start()
+    
+    # Сигналы останавливают приём апдейтов, после чего очереди корректно дописываются
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, shutdown_handler, sig, dp, webhook_server, stop_requested)
+    
+    try:
+        if webhook_server is not None:
+            await webhook_server.start()
+            await webhook_server.wait_closed()
+        else:
+            # Вебхук, оставшийся от запуска в режиме webhook, блокирует getUpdates
+            await bot.delete_webhook()
+            # Сигнал мог прийти до старта поллинга
+            if not stop_requested.is_set():
+                await dp.start_polling(bot, handle_signals=False)
+    finally:
+        if webhook_server is not None:
+            await webhook_server.stop()
+            await bot.session.close()
+        for task in background_tasks:
+            task.cancel()
+        await compliment_pool.stop()
+        await retention_scheduler.stop()
+        await context_manager.writer.stop()
+        await ai_generator.stop_health_probes()
+        await openrouter_client.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await close_db()
+        # Дописываем логи, оставшиеся в очереди фонового потока
+        stop_logging()
 
 
-def shutdown_handler(sig, frame):
+def shutdown_handler(sig: signal.Signals,
+                     dp: Dispatcher,
+                     webhook_server: Optional[WebhookServer] = None,
+                     stop_requested: Optional[asyncio.Event] = None):
     """Обработчик сигналов завершения"""
-    logger.info(f"Получен сигнал {sig}, завершаю работу...")
-    sys.exit(0)
+    logger.info(f"Получен сигнал {sig.name}, завершаю работу...")
+    if stop_requested is not None:
+        stop_requested.set()
+    if webhook_server is not None:
+        webhook_server.request_stop()
+    elif dp._running_lock.locked():
+        # stop_polling бросает RuntimeError, если поллинг не запущен: до старта
+        # поллинга main() сам не запустит его, увидев stop_requested
+        asyncio.ensure_future(dp.stop_polling())
 
 
 if __name__ == "__main__":
-    # Регистрация обработчиков сигналов
-    signal.signal(signal.SIGINT, shutdown_handler)
-    signal.signal(signal.SIGTERM, shutdown_handler)
-    
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
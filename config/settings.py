@@ -12,6 +12,20 @@ class Settings(BaseSettings):
     # OpenRouter (ваш ключ)
     OPENROUTER_API_KEY: Optional[str] = os.getenv("OPENROUTER_API_KEY")
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL", "openai/gpt-3.5-turbo")
+    OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    
+    # Пул соединений и таймауты для OpenRouter
+    OPENROUTER_MAX_CONCURRENCY: int = int(os.getenv("OPENROUTER_MAX_CONCURRENCY", "20"))
+    OPENROUTER_MAX_CONNECTIONS: int = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "20"))
+    OPENROUTER_MAX_KEEPALIVE: int = int(os.getenv("OPENROUTER_MAX_KEEPALIVE", "10"))
+    OPENROUTER_KEEPALIVE_EXPIRY: float = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+    OPENROUTER_TIMEOUT: float = float(os.getenv("OPENROUTER_TIMEOUT", "30"))
+    OPENROUTER_CONNECT_TIMEOUT: float = float(os.getenv("OPENROUTER_CONNECT_TIMEOUT", "5"))
+    OPENROUTER_MAX_RETRIES: int = int(os.getenv("OPENROUTER_MAX_RETRIES", "2"))
+    
+    # Кэш каталога моделей OpenRouter на диске (чтобы не запрашивать его при каждом рестарте)
+    OPENROUTER_MODELS_CACHE: str = os.getenv("OPENROUTER_MODELS_CACHE", "./data/openrouter_models.json")
+    OPENROUTER_MODELS_CACHE_TTL: int = int(os.getenv("OPENROUTER_MODELS_CACHE_TTL", "86400"))
     
     # Database (особый путь для Render)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./olya_bot.db")
@@ -20,9 +34,66 @@ class Settings(BaseSettings):
     if "RENDER" in os.environ:
         DATABASE_URL = "sqlite:///./data/olya_bot.db"
     
+    # Профиль SQLite: legacy, balanced (WAL) или durable; отдельные PRAGMA можно переопределить
+    SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "balanced")
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "")
+    SQLITE_MMAP_SIZE: str = os.getenv("SQLITE_MMAP_SIZE", "")
+    SQLITE_CACHE_SIZE: str = os.getenv("SQLITE_CACHE_SIZE", "")
+    SQLITE_BUSY_TIMEOUT: str = os.getenv("SQLITE_BUSY_TIMEOUT", "")
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "")
+    SQLITE_READ_POOL_SIZE: int = int(os.getenv("SQLITE_READ_POOL_SIZE", "4"))
+    
+    # Режим получения апдейтов: polling или webhook
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    # Публичный адрес сервиса (на Render подставляется автоматически); пусто — вебхук не регистрируется
+    WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", os.getenv("RENDER_EXTERNAL_URL", ""))
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    # Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (пусто — выводится из токена бота)
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", os.getenv("PORT", "8080")))
+    # Сколько апдейтов обрабатывать одновременно и сколько держать в очереди
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "16"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    
+    # Логи: уровень консоли и файла, пустой LOG_FILE — без файла
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FILE: str = os.getenv("LOG_FILE", "logs/bot.log")
+    # DEBUG в файле почти вдвое удорожает логи на каждое сообщение
+    LOG_FILE_LEVEL: str = os.getenv("LOG_FILE_LEVEL", "INFO").upper()
+    # Сжатие файлов при ротации: zip, gz, bz2, xz, lzma, tar, tar.gz, tar.bz2, tar.xz или пусто
+    LOG_COMPRESSION: str = os.getenv("LOG_COMPRESSION", "zip")
+    # JSON-записи вместо текста (для сборщиков логов)
+    LOG_JSON: bool = os.getenv("LOG_JSON", "false").lower() == "true"
+    # Запись логов (и ротация со сжатием) в фоновом потоке. Выключена: на одном CPU
+    # поток делит GIL с event loop и хвост задержек хуже синхронной записи;
+    # имеет смысл при медленном диске или больших DEBUG-файлах
+    LOG_ENQUEUE: bool = os.getenv("LOG_ENQUEUE", "false").lower() == "true"
+    # Доля DEBUG-логов на каждое сообщение, которые пишутся (1 — все)
+    LOG_DEBUG_SAMPLE_RATE: float = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+    
+    # Хранилище состояний FSM: sqlite (кэш в памяти поверх таблицы fsm_states) или memory
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "sqlite")
+    FSM_CACHE_MAX_ENTRIES: int = int(os.getenv("FSM_CACHE_MAX_ENTRIES", "10000"))
+    # Через сколько секунд без обращений состояние вытесняется из памяти
+    FSM_CACHE_TTL: float = float(os.getenv("FSM_CACHE_TTL", "3600"))
+    
     # Bot settings
     BOT_ADMIN_ID: Optional[int] = os.getenv("BOT_ADMIN_ID")
     CONTEXT_MEMORY_SIZE: int = int(os.getenv("CONTEXT_MEMORY_SIZE", "10"))
+    # Сколько пользователей держать в кэше истории в памяти
+    CONTEXT_CACHE_MAX_USERS: int = int(os.getenv("CONTEXT_CACHE_MAX_USERS", "1000"))
+    # Определение типа комплимента по ключевым словам: сколько последних сообщений
+    # учитывать и во сколько раз каждое следующее с конца весит меньше
+    TYPE_CLASSIFIER_WINDOW: int = int(os.getenv("TYPE_CLASSIFIER_WINDOW", "5"))
+    TYPE_CLASSIFIER_DECAY: float = float(os.getenv("TYPE_CLASSIFIER_DECAY", "0.5"))
+    # Обученная модель типа комплимента (python -m services.type_model); без неё — ключевые слова
+    TYPE_MODEL_PATH: str = os.getenv("TYPE_MODEL_PATH", "data/type_model")
+    # Ниже этой вероятности тип определяют ключевые слова
+    TYPE_MODEL_MIN_CONFIDENCE: float = float(os.getenv("TYPE_MODEL_MIN_CONFIDENCE", "0.6"))
+    # Комплиментов на странице /history
+    HISTORY_PAGE_SIZE: int = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
     
     # Приоритет провайдеров для Render
     AI_PROVIDER_PRIORITY: List[str] = os.getenv(
@@ -30,6 +101,109 @@ class Settings(BaseSettings):
         "openrouter,fallback"
     ).split(",")
     
+    # Режим опроса провайдеров: sequential (по очереди) или race (гонка с хеджированием)
+    AI_GENERATION_MODE: str = os.getenv("AI_GENERATION_MODE", "sequential")
+    # Через сколько секунд без ответа запускать следующий провайдер параллельно
+    AI_HEDGE_DELAY: float = float(os.getenv("AI_HEDGE_DELAY", "3"))
+    # Жёсткий бюджет на генерацию, после которого отдаём локальный комплимент
+    AI_LATENCY_BUDGET: float = float(os.getenv("AI_LATENCY_BUDGET", "15"))
+    
+    # Бюджет промпта в токенах: длинные сообщения обрезаются, старые реплики сжимаются в сводку
+    PROMPT_TOKEN_BUDGET: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "1000"))
+    PROMPT_MAX_MESSAGE_TOKENS: int = int(os.getenv("PROMPT_MAX_MESSAGE_TOKENS", "300"))
+    PROMPT_MAX_TURN_TOKENS: int = int(os.getenv("PROMPT_MAX_TURN_TOKENS", "150"))
+    PROMPT_SUMMARY_TOKENS: int = int(os.getenv("PROMPT_SUMMARY_TOKENS", "80"))
+    
+    # Потоковая генерация: заглушка «Думаю...» постепенно редактируется в комплимент
+    AI_STREAMING_ENABLED: bool = os.getenv("AI_STREAMING_ENABLED", "false").lower() == "true"
+    # Минимальный интервал между правками сообщения (лимиты Telegram на редактирование)
+    STREAM_EDIT_INTERVAL: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+    
+    # Отложенная пакетная запись сообщений в базу данных
+    MESSAGE_WRITER_ENABLED: bool = os.getenv("MESSAGE_WRITER_ENABLED", "true").lower() == "true"
+    MESSAGE_QUEUE_MAX_SIZE: int = int(os.getenv("MESSAGE_QUEUE_MAX_SIZE", "1000"))
+    MESSAGE_BATCH_SIZE: int = int(os.getenv("MESSAGE_BATCH_SIZE", "50"))
+    MESSAGE_FLUSH_INTERVAL: float = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "1"))
+    # Журнал для восстановления незаписанных сообщений после падения (пусто — выключен)
+    MESSAGE_JOURNAL_PATH: str = os.getenv("MESSAGE_JOURNAL_PATH", "")
+    
+    # Сообщения одного чата, пришедшие в пределах окна, объединяются в одну генерацию
+    COALESCE_WINDOW: float = float(os.getenv("COALESCE_WINDOW", "1.0"))
+    # Сколько генераций по сообщениям может идти одновременно во всём боте
+    # (действует и при выключенном RATE_LIMIT_ENABLED)
+    GENERATION_MAX_CONCURRENCY: int = int(os.getenv("GENERATION_MAX_CONCURRENCY", "10"))
+    
+    # Ограничение частоты генераций: token bucket на пользователя и на весь бот
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_USER_RATE: float = float(os.getenv("RATE_LIMIT_USER_RATE", "0.2"))  # генераций в секунду
+    RATE_LIMIT_USER_BURST: int = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+    RATE_LIMIT_GLOBAL_RATE: float = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", "5"))
+    RATE_LIMIT_GLOBAL_BURST: int = int(os.getenv("RATE_LIMIT_GLOBAL_BURST", "30"))
+    # Сколько бакетов пользователей хранить; давно неактивные вытесняются (LRU)
+    RATE_LIMIT_MAX_USERS: int = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))
+    # Что делать при превышении: fallback (локальный комплимент), reject (предупреждение) или drop
+    RATE_LIMIT_ACTION: str = os.getenv("RATE_LIMIT_ACTION", "fallback")
+    
+    # Кэш сгенерированных комплиментов
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_MAX_VARIANTS: int = int(os.getenv("RESPONSE_CACHE_MAX_VARIANTS", "3"))
+    RESPONSE_CACHE_HISTORY_TURNS: int = int(os.getenv("RESPONSE_CACHE_HISTORY_TURNS", "1"))
+    # Порог сходства формулировок (0 — только точные совпадения)
+    RESPONSE_CACHE_SIMILARITY: float = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.75"))
+    
+    # Пул заранее сгенерированных комплиментов для кнопок выбора типа
+    COMPLIMENT_POOL_ENABLED: bool = os.getenv("COMPLIMENT_POOL_ENABLED", "true").lower() == "true"
+    COMPLIMENT_POOL_LOW_WATER: int = int(os.getenv("COMPLIMENT_POOL_LOW_WATER", "3"))
+    COMPLIMENT_POOL_HIGH_WATER: int = int(os.getenv("COMPLIMENT_POOL_HIGH_WATER", "10"))
+    # Минимальный интервал между фоновыми генерациями, сек
+    COMPLIMENT_POOL_MIN_INTERVAL: float = float(os.getenv("COMPLIMENT_POOL_MIN_INTERVAL", "5"))
+    COMPLIMENT_POOL_CHECK_INTERVAL: float = float(os.getenv("COMPLIMENT_POOL_CHECK_INTERVAL", "60"))
+    
+    # Отсев почти повторов: отпечатки последних комплиментов каждого пользователя
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_HISTORY_SIZE: int = int(os.getenv("DEDUP_HISTORY_SIZE", "50"))
+    DEDUP_MAX_USERS: int = int(os.getenv("DEDUP_MAX_USERS", "1000"))
+    # Максимум различающихся бит SimHash (из 64), при котором комплимент считается повтором
+    DEDUP_MAX_DISTANCE: int = int(os.getenv("DEDUP_MAX_DISTANCE", "14"))
+    # Сколько раз перегенерировать AI-комплимент, оказавшийся повтором
+    DEDUP_MAX_RETRIES: int = int(os.getenv("DEDUP_MAX_RETRIES", "1"))
+    
+    # Фоновая очистка старых сообщений
+    RETENTION_ENABLED: bool = os.getenv("RETENTION_ENABLED", "true").lower() == "true"
+    RETENTION_DAYS: int = int(os.getenv("RETENTION_DAYS", "30"))
+    # Сколько последних сообщений хранить на пользователя (0 — без ограничения,
+    # по умолчанию: старые сообщения и так удаляются по RETENTION_DAYS)
+    RETENTION_MAX_MESSAGES_PER_USER: int = int(os.getenv("RETENTION_MAX_MESSAGES_PER_USER", "0"))
+    RETENTION_INTERVAL: float = float(os.getenv("RETENTION_INTERVAL", "3600"))
+    # Удаление пачками с паузами, чтобы не держать блокировку записи
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_BATCH_PAUSE: float = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+    # Сколько страниц освобождать за один шаг incremental_vacuum (0 — не освобождать)
+    RETENTION_VACUUM_PAGES: int = int(os.getenv("RETENTION_VACUUM_PAGES", "1000"))
+    # Однократный VACUUM для перевода старой базы в auto_vacuum=INCREMENTAL: держит
+    # блокировку записи всё время и требует ~2x размера базы на диске. Выключен;
+    # лучше выполнить вручную: python -m services.retention --convert-vacuum
+    RETENTION_VACUUM_CONVERT: bool = os.getenv("RETENTION_VACUUM_CONVERT", "false").lower() == "true"
+    
+    # Автоматический выключатель для AI провайдеров
+    AI_BREAKER_WINDOW_SIZE: int = int(os.getenv("AI_BREAKER_WINDOW_SIZE", "20"))
+    AI_BREAKER_WINDOW_SECONDS: float = float(os.getenv("AI_BREAKER_WINDOW_SECONDS", "300"))
+    AI_BREAKER_ERROR_THRESHOLD: float = float(os.getenv("AI_BREAKER_ERROR_THRESHOLD", "0.5"))
+    AI_BREAKER_MIN_REQUESTS: int = int(os.getenv("AI_BREAKER_MIN_REQUESTS", "5"))
+    AI_BREAKER_COOLDOWN: float = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))
+    AI_BREAKER_PROBE_INTERVAL: float = float(os.getenv("AI_BREAKER_PROBE_INTERVAL", "10"))
+    # Задержка, при которой оценка здоровья провайдера падает вдвое
+    AI_BREAKER_LATENCY_TARGET: float = float(os.getenv("AI_BREAKER_LATENCY_TARGET", "3"))
+
+    # Метрики в формате Prometheus на локальном HTTP эндпоинте /metrics
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
+    # Как часто замерять задержку event loop, сек
+    METRICS_LOOP_LAG_INTERVAL: float = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+
     class Config:
         env_file = ".env"
 
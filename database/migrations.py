@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from loguru import logger
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select, text
+from sqlalchemy.engine import Connection
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255)),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+def _add_message_history_indexes(conn: Connection):
+    # История и /history: WHERE user_id = ? ORDER BY created_at DESC LIMIT n
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_user_id_created_at "
+        "ON messages (user_id, created_at)"
+    ))
+    # Очистка старых сообщений: WHERE created_at < ?
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_created_at ON messages (created_at)"
+    ))
+    conn.execute(text("ANALYZE messages"))
+
+
+def _add_compliment_history_index(conn: Connection):
+    # /history: WHERE user_id = ? AND is_bot = 1 AND (created_at, id) < (?, ?)
+    # ORDER BY created_at DESC, id DESC; id — это rowid, он уже есть в индексе
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_messages_user_id_bot_created_at "
+        "ON messages (user_id, created_at) WHERE is_bot = 1"
+    ))
+    conn.execute(text("ANALYZE messages"))
+
+
+def _add_message_type_chosen(conn: Connection):
+    # Новые базы получают колонку из create_all
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(messages)"))}
+    if "type_chosen" not in columns:
+        conn.execute(text("ALTER TABLE messages ADD COLUMN type_chosen BOOLEAN"))
+
+
+# Новые миграции добавляются в конец списка со следующим номером версии
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Индексы messages (user_id, created_at) и (created_at)", _add_message_history_indexes),
+    Migration(2, "Частичный индекс комплиментов messages (user_id, created_at)", _add_compliment_history_index),
+    Migration(3, "Колонка messages.type_chosen (тип выбран кнопкой)", _add_message_type_chosen),
+]
+
+
+def run_migrations(conn: Connection) -> int:
+    """
+    Применяет миграции, которые ещё не отмечены в schema_migrations
+
+    Каждая миграция выполняется в транзакции вызывающего кода вместе
+    с записью о её версии.
+
+    Args:
+        conn: синхронное соединение (из AsyncConnection.run_sync)
+
+    Returns:
+        Количество применённых миграций
+    """
+    _metadata.create_all(conn)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    count = 0
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+
+        logger.info(f"Применяю миграцию {migration.version}: {migration.description}")
+        migration.upgrade(conn)
+        conn.execute(insert(schema_migrations).values(
+            version=migration.version,
+            description=migration.description,
+            applied_at=datetime.utcnow(),
+        ))
+        count += 1
+
+    return count
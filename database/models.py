@@ -1,14 +1,142 @@
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, event
+from sqlalchemy import text as sql_text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
-from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import relationship, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from contextlib import asynccontextmanager
+from loguru import logger
+from typing import Any, AsyncIterator, Dict, Tuple
 
 from config.settings import settings
+from database.migrations import run_migrations
+
+# Профили настроек SQLite, применяемые к каждому новому соединению
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Настройки драйвера по умолчанию: rollback journal, synchronous=FULL
+    "legacy": {},
+    # WAL: читатели не блокируют писателя, fsync только на чекпоинтах
+    "balanced": {
+        "auto_vacuum": "INCREMENTAL",  # действует для новых баз и после VACUUM
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,  # ~16 МБ
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    # WAL с fsync на каждый commit
+    "durable": {
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "busy_timeout": 10000,
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def get_async_database_url(url: str) -> str:
+    """Переводит синхронный URL базы данных на асинхронный драйвер"""
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return url
+
+
+def get_sqlite_pragmas(profile: str = settings.SQLITE_PROFILE) -> Dict[str, Any]:
+    """Возвращает PRAGMA профиля с учётом переопределений из настроек"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль SQLite: {profile}")
+    
+    pragmas = dict(SQLITE_PROFILES[profile])
+    overrides = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+    }
+    pragmas.update({name: value for name, value in overrides.items() if value not in ("", None)})
+    return pragmas
+
+
+def _apply_pragmas(engine: AsyncEngine, pragmas: Dict[str, Any]):
+    """Выполняет PRAGMA при открытии каждого соединения"""
+    
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_engines(url: str,
+                   pragmas: Dict[str, Any],
+                   read_pool_size: int = settings.SQLITE_READ_POOL_SIZE) -> Tuple[AsyncEngine, AsyncEngine]:
+    """
+    Создает движки для записи и для чтения
+    
+    SQLite допускает одного писателя, поэтому все записи идут через одно
+    соединение, а чтение — через отдельный пул (в WAL читатели не ждут
+    писателя). Для других СУБД возвращается один и тот же движок.
+    
+    Returns:
+        (движок записи, движок чтения)
+    """
+    async_url = get_async_database_url(url)
+    if not async_url.startswith("sqlite+aiosqlite:///"):
+        engine = create_async_engine(async_url)
+        return engine, engine
+    
+    write_engine = create_async_engine(
+        async_url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0
+    )
+    _apply_pragmas(write_engine, pragmas)
+    
+    if pragmas.get("journal_mode", "").upper() != "WAL":
+        # Без WAL отдельные читатели только мешали бы писателю
+        return write_engine, write_engine
+    
+    read_engine = create_async_engine(
+        async_url, poolclass=AsyncAdaptedQueuePool, pool_size=read_pool_size, max_overflow=0
+    )
+    _apply_pragmas(read_engine, {**pragmas, "query_only": 1})
+    return write_engine, read_engine
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая чтение в пул читателей, а запись — писателю
+    
+    После первой записи сессия остаётся на писателе, чтобы видеть
+    собственные незакоммиченные изменения.
+    """
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.info.get("writing") or self._flushing or isinstance(clause, UpdateBase):
+            self.info["writing"] = True
+            return self.info["write_engine"].sync_engine
+        return self.info["read_engine"].sync_engine
+
+
+def create_sessionmaker(write_engine: AsyncEngine, read_engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        sync_session_class=RoutingSession,
+        info={"write_engine": write_engine, "read_engine": read_engine},
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
 
 Base = declarative_base()
-engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine, read_engine = create_engines(settings.DATABASE_URL, get_sqlite_pragmas())
+SessionLocal = create_sessionmaker(engine, read_engine)
 
 class User(Base):
     __tablename__ = "users"
@@ -30,17 +158,54 @@ class Message(Base):
     text = Column(Text)
     is_bot = Column(Boolean, default=False)
     compliment_type = Column(String(50), nullable=True)  # appearance, character, achievements
+    # Тип выбран пользователем кнопкой, а не определён классификатором (метка для обучения)
+    type_chosen = Column(Boolean, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="messages")
+    
+    # Те же индексы создают миграции 1 и 2 для существующих баз (database/migrations.py)
+    __table_args__ = (
+        Index("ix_messages_user_id_created_at", "user_id", "created_at"),
+        Index("ix_messages_created_at", "created_at"),
+        # /history: только комплименты бота, постранично по (created_at, id)
+        Index("ix_messages_user_id_bot_created_at", "user_id", "created_at",
+              sqlite_where=sql_text("is_bot = 1")),
+    )
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+class PooledCompliment(Base):
+    __tablename__ = "compliment_pool"
+    
+    id = Column(Integer, primary_key=True)
+    compliment_type = Column(String(50), index=True)
+    text = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class FSMRecord(Base):
+    __tablename__ = "fsm_states"
+    
+    # Ключ вида bot_id:chat_id:user_id (services/fsm_storage.py), без отдельного rowid
+    key = Column(String(255), primary_key=True)
+    state = Column(String(255), nullable=True)
+    data = Column(Text, nullable=True)  # JSON без пробелов; пусто — нет данных
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = {"sqlite_with_rowid": False}
 
-@contextmanager
-def get_db():
-    db = SessionLocal()
-    try:
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        applied = await conn.run_sync(run_migrations)
+    if applied:
+        logger.info(f"Применено миграций схемы: {applied}")
+
+@asynccontextmanager
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def close_db():
+    """Закрывает соединения с базой данных"""
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
@@ -1,14 +1,17 @@
+from typing import Optional, Tuple
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.filters import CommandStart, Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy.orm import Session
 from loguru import logger
 
 from database.models import get_db
-from services.context_manager import context_manager
-from keyboards.inline import get_main_menu_keyboard, get_compliment_type_keyboard
+from services.context_manager import HistoryCursor, context_manager
+from keyboards.inline import (
+    HistoryPageCallback, get_main_menu_keyboard, get_compliment_type_keyboard, get_history_keyboard
+)
 
 router = Router()
 
@@ -35,8 +38,8 @@ async def cmd_start(message: Message):
     )
     
     # Сохраняем факт запуска бота
-    with get_db() as db:
-        context_manager.save_message(
+    async with get_db() as db:
+        await context_manager.save_message(
             telegram_user_id=message.from_user.id,
             message_text="/start",
             is_bot=False,
@@ -65,65 +68,94 @@ async def cmd_help(message: Message):
     
     await message.answer(help_text, parse_mode="Markdown")
 
+_TYPE_EMOJI = {
+    "appearance": "💄",
+    "character": "🌟",
+    "achievements": "🏆",
+    "random": "🎲"
+}
+
+async def render_history_page(telegram_user_id: int,
+                              older_than: Optional[HistoryCursor] = None,
+                              newer_than: Optional[HistoryCursor] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """
+    Формирует страницу истории комплиментов
+    
+    Args:
+        telegram_user_id: ID пользователя в Telegram
+        older_than: курсор — показать комплименты старше него
+        newer_than: курсор — показать комплименты новее него
+    
+    Returns:
+        Текст сообщения и кнопки листания
+    """
+    # Первая страница должна включать комплименты, которые ещё ждут записи
+    if older_than is None and newer_than is None:
+        await context_manager.writer.drain()
+    
+    async with get_db() as db:
+        page = await context_manager.get_compliments_page(
+            telegram_user_id, db, older_than=older_than, newer_than=newer_than
+        )
+    
+    if not page.compliments:
+        return "Ещё не было сгенерировано ни одного комплимента!", None
+    
+    # Формируем сообщение с историей
+    history_text = "📖 *История твоих комплиментов для Оли:*\n\n"
+    
+    for comp in page.compliments:
+        date_str = comp.created_at.strftime("%d.%m %H:%M")
+        type_emoji = _TYPE_EMOJI.get(comp.compliment_type, "✨")
+        
+        # Обрезаем длинный текст
+        comp_text = comp.text
+        if len(comp_text) > 100:
+            comp_text = comp_text[:97] + "..."
+        
+        history_text += f"{type_emoji} *{date_str}*:\n`{comp_text}`\n\n"
+    
+    # Клавиатуре нужны только числа для callback data
+    older = (page.older.timestamp_us, page.older.id) if page.older is not None else None
+    newer = (page.newer.timestamp_us, page.newer.id) if page.newer is not None else None
+    return history_text, get_history_keyboard(older, newer)
+
 @router.message(Command("history"))
 async def cmd_history(message: Message):
     """Показывает историю комплиментов"""
-    with get_db() as db:
-        # Получаем историю сообщений
-        history = context_manager.get_dialog_history(message.from_user.id, db)
-        
-        if not history:
-            await message.answer("История диалога пуста. Начни общение с ботом!")
-            return
-        
-        # Фильтруем только комплименты от бота
-        compliments = [msg for msg in history if msg["is_bot"]]
-        
-        if not compliments:
-            await message.answer("Ещё не было сгенерировано ни одного комплимента!")
-            return
-        
-        # Формируем сообщение с историей
-        history_text = "📖 *История твоих комплиментов для Оли:*\n\n"
-        
-        for i, comp in enumerate(reversed(compliments[-10:]), 1):
-            date_str = comp["created_at"].strftime("%d.%m %H:%M")
-            comp_type = comp.get("compliment_type", "случайный")
-            type_emoji = {
-                "appearance": "💄",
-                "character": "🌟",
-                "achievements": "🏆",
-                "random": "🎲"
-            }.get(comp_type, "✨")
-            
-            # Обрезаем длинный текст
-            comp_text = comp["text"]
-            if len(comp_text) > 100:
-                comp_text = comp_text[:97] + "..."
-            
-            history_text += f"{i}. {type_emoji} *{date_str}*:\n`{comp_text}`\n\n"
-        
-        await message.answer(history_text, parse_mode="Markdown")
+    text, keyboard = await render_history_page(message.from_user.id)
+    await message.answer(text, parse_mode="Markdown", reply_markup=keyboard)
+
+@router.callback_query(HistoryPageCallback.filter())
+async def process_history_page(callback: CallbackQuery, callback_data: HistoryPageCallback):
+    """Листает историю комплиментов, редактируя то же сообщение"""
+    cursor = HistoryCursor.from_timestamp_us(callback_data.ts, callback_data.id)
+    if callback_data.direction == "newer":
+        text, keyboard = await render_history_page(callback.from_user.id, newer_than=cursor)
+    else:
+        text, keyboard = await render_history_page(callback.from_user.id, older_than=cursor)
+    
+    try:
+        await callback.message.edit_text(text, parse_mode="Markdown", reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Двойное нажатие: страница не изменилась
+        logger.debug("Страница истории не обновлена: {}", e)
+    await callback.answer()
+
+async def clear_user_history(telegram_user_id: int) -> str:
+    """Удаляет историю диалога пользователя и возвращает текст ответа"""
+    async with get_db() as db:
+        deleted_count = await context_manager.clear_history(telegram_user_id, db)
+    
+    if deleted_count is not None:
+        logger.info(f"Пользователь {telegram_user_id} очистил историю ({deleted_count} сообщений)")
+        return f"✅ История диалога очищена! Удалено {deleted_count} сообщений."
+    return "У тебя ещё нет истории диалога!"
 
 @router.message(Command("clear"))
 async def cmd_clear(message: Message):
     """Очищает историю диалога"""
-    with get_db() as db:
-        # Находим пользователя
-        from database.models import User, Message
-        user = db.query(User).filter(User.telegram_id == message.from_user.id).first()
-        
-        if user:
-            # Удаляем все сообщения пользователя
-            deleted_count = db.query(Message)\
-                .filter(Message.user_id == user.id)\
-                .delete()
-            db.commit()
-            
-            logger.info(f"Пользователь {message.from_user.id} очистил историю ({deleted_count} сообщений)")
-            await message.answer(f"✅ История диалога очищена! Удалено {deleted_count} сообщений.")
-        else:
-            await message.answer("У тебя ещё нет истории диалога!")
+    await message.answer(await clear_user_history(message.from_user.id))
 
 @router.callback_query(F.data == "generate_compliment")
 async def process_generate_compliment(callback: CallbackQuery, state: FSMContext):
@@ -137,11 +169,14 @@ async def process_generate_compliment(callback: CallbackQuery, state: FSMContext
 @router.callback_query(F.data == "show_history")
 async def process_show_history(callback: CallbackQuery):
     """Обработчик кнопки показа истории"""
-    await cmd_history(callback.message)
+    # from_user у callback.message — это бот, поэтому берём пользователя из callback
+    text, keyboard = await render_history_page(callback.from_user.id)
+    await callback.message.answer(text, parse_mode="Markdown", reply_markup=keyboard)
     await callback.answer()
 
 @router.callback_query(F.data == "clear_history")
 async def process_clear_history(callback: CallbackQuery):
     """Обработчик кнопки очистки истории"""
-    await cmd_clear(callback.message)
+    # Как и в show_history: from_user у callback.message — это бот
+    await callback.message.answer(await clear_user_history(callback.from_user.id))
     await callback.answer()
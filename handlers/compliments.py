@@ -1,54 +1,181 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import Message, CallbackQuery
 from loguru import logger
 
 from database.models import get_db
 from services.context_manager import context_manager
 from services.ai_generator import ai_generator
+from services.compliment_pool import compliment_pool
+from services.served_index import served_index
+from services.type_model import type_model
+from config.settings import settings
 from keyboards.inline import get_main_menu_keyboard
+from middlewares.coalescing import MessageBatch
+from utils.fallback_generator import fallback_generator
 
 router = Router()
 
+@router.callback_query(F.data.startswith("compliment_"))
+async def process_compliment_type(callback: CallbackQuery):
+    """Обработчик кнопок выбора типа комплимента"""
+    compliment_type = callback.data.removeprefix("compliment_")
+    
+    if settings.COMPLIMENT_POOL_ENABLED:
+        # Контекста нет, поэтому отвечаем из заранее сгенерированного пула
+        avoid = served_index.avoid_for(callback.from_user.id)
+        if avoid is not None:
+            await served_index.ensure_loaded(callback.from_user.id)
+        compliment = await compliment_pool.take(compliment_type, avoid)
+    else:
+        compliment = await ai_generator.generate_compliment(
+            message_text="Сделай комплимент Оле",
+            history=[],
+            compliment_type=None if compliment_type == "random" else compliment_type,
+            user_id=callback.from_user.id
+        )
+    
+    await callback.message.answer(compliment, reply_markup=get_main_menu_keyboard())
+    await callback.answer()
+    
+    await context_manager.save_message(
+        telegram_user_id=callback.from_user.id,
+        message_text=compliment,
+        is_bot=True,
+        compliment_type=compliment_type,
+        type_chosen=True
+    )
+
+async def stream_into_message(placeholder: Message,
+                              stream: AsyncIterator[str],
+                              batch: Optional[MessageBatch] = None) -> str:
+    """
+    Постепенно редактирует заглушку текстом из потока генерации
+    
+    Промежуточные правки выполняются не чаще STREAM_EDIT_INTERVAL, их ошибки
+    (в том числе flood control) только пропускают правку. Последняя правка
+    добавляет клавиатуру; если она не удалась, комплимент отправляется
+    новым сообщением.
+    
+    Args:
+        placeholder: сообщение «Думаю над комплиментом...»
+        stream: накопленный текст; последнее значение — окончательный
+        batch: пачка сообщений, которую после первой правки нельзя отменять
+        
+    Returns:
+        Окончательный текст комплимента
+    """
+    text = shown = ""
+    next_edit = 0.0
+    async for text in stream:
+        now = time.monotonic()
+        if now < next_edit or text == shown:
+            continue
+        
+        # Пользователь уже видит ответ — новые сообщения его не отменяют
+        if batch is not None:
+            batch.committed = True
+        try:
+            await placeholder.edit_text(text + " ▌")
+            shown = text
+            next_edit = now + settings.STREAM_EDIT_INTERVAL
+        except TelegramRetryAfter as e:
+            next_edit = now + e.retry_after
+        except TelegramAPIError as e:
+            logger.debug("Промежуточная правка не удалась: {}", e)
+            next_edit = now + settings.STREAM_EDIT_INTERVAL
+    
+    if batch is not None:
+        batch.committed = True
+    try:
+        await placeholder.edit_text(text, reply_markup=get_main_menu_keyboard())
+    except TelegramAPIError as e:
+        logger.warning(f"Не удалось дописать комплимент в заглушку: {e}")
+        await placeholder.answer(text, reply_markup=get_main_menu_keyboard())
+        await placeholder.delete()
+    return text
+
 @router.message()
-async def handle_message(message: Message):
+async def handle_message(message: Message, batch: Optional[MessageBatch] = None, throttled: bool = False):
     """Обработчик всех текстовых сообщений"""
-    logger.info(f"Получено сообщение от {message.from_user.id}: {message.text[:50]}...")
+    # Сообщения, пришедшие подряд, объединяются в одну генерацию (middlewares/coalescing.py)
+    texts = batch.texts if batch is not None else [message.text or ""]
+    message_text = "\n".join(texts)
+    logger.info(
+        "Получено сообщение от {}: {:.50}...{}",
+        message.from_user.id, message_text,
+        f" (объединено сообщений: {len(texts)})" if len(texts) > 1 else ""
+    )
     
     # Показываем индикатор набора
     typing_message = await message.answer("Думаю над комплиментом... ✨")
     
+    saved = False
+    superseded = False
+    delivered = False
     try:
-        with get_db() as db:
-            # Сохраняем сообщение пользователя
-            context_manager.save_message(
-                telegram_user_id=message.from_user.id,
-                message_text=message.text,
-                is_bot=False,
-                db=db
-            )
-            
+        async with get_db() as db:
             # Получаем историю диалога
-            history = context_manager.get_dialog_history(message.from_user.id, db)
-            
+            history = await context_manager.get_dialog_history(message.from_user.id, db)
+        
+        # Сообщение пользователя сохраняется вместе с ответом одной транзакцией,
+        # а в историю для генерации попадает сразу
+        history = context_manager.with_pending_message(history, message_text)
+        # Тип по последним сообщениям пользователя (модель или ключевые слова); None — на выбор модели
+        compliment_type = type_model.classify([msg.text for msg in history if not msg.is_bot])
+        
+        if throttled:
+            # Лимит генераций исчерпан (middlewares/throttling.py) — отвечаем без AI
+            avoid = served_index.avoid_for(message.from_user.id)
+            if avoid is not None:
+                await served_index.ensure_loaded(message.from_user.id)
+            compliment = fallback_generator.generate_compliment(compliment_type, context=texts, avoid=avoid)
+        elif settings.AI_STREAMING_ENABLED:
+            # Заглушка сама превращается в комплимент по мере генерации
+            compliment = await stream_into_message(
+                typing_message,
+                ai_generator.stream_compliment(
+                    message_text=message_text,
+                    history=history,
+                    compliment_type=compliment_type,
+                    user_id=message.from_user.id
+                ),
+                batch
+            )
+            delivered = True
+        else:
             # Генерируем комплимент через универсальный генератор
             compliment = await ai_generator.generate_compliment(
-                message_text=message.text,
+                message_text=message_text,
                 history=history,
-                compliment_type=None  # Автоматический выбор
+                compliment_type=compliment_type,
+                user_id=message.from_user.id
             )
+        
+        if not delivered:
+            # Новые сообщения больше не отменяют эту генерацию, а ждут ответа
+            if batch is not None:
+                batch.committed = True
             
             # Отправляем комплимент
             await message.answer(compliment, reply_markup=get_main_menu_keyboard())
-            
-            # Сохраняем ответ бота
-            context_manager.save_message(
-                telegram_user_id=message.from_user.id,
-                message_text=compliment,
-                is_bot=True,
-                compliment_type=None,
-                db=db
-            )
-            
+        
+        # Сохраняем сообщение пользователя и ответ бота
+        await context_manager.save_exchange(
+            telegram_user_id=message.from_user.id,
+            user_text=message_text,
+            bot_text=compliment,
+            compliment_type=compliment_type
+        )
+        saved = True
+    
+    except asyncio.CancelledError:
+        # Сообщения перешли в новую пачку и будут сохранены вместе с ней
+        superseded = True
+        raise
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения: {e}")
         await message.answer(
@@ -56,5 +183,12 @@ async def handle_message(message: Message):
             reply_markup=get_main_menu_keyboard()
         )
     finally:
-        # Удаляем индикатор набора
-        await typing_message.delete()
+        if not saved and not superseded:
+            await context_manager.save_message(
+                telegram_user_id=message.from_user.id,
+                message_text=message_text,
+                is_bot=False
+            )
+        # Удаляем индикатор набора, если он не стал ответом
+        if not delivered:
+            await typing_message.delete()
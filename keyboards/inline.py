@@ -1,6 +1,19 @@
+from typing import Optional, Tuple
+from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+# Позиция страницы истории: (created_at в микросекундах, id сообщения)
+PageKey = Tuple[int, int]
+
+
+class HistoryPageCallback(CallbackData, prefix="hist"):
+    """Листание /history: направление и курсор (created_at в мкс, id сообщения)"""
+    direction: str  # older | newer
+    ts: int
+    id: int
+
+
 def get_compliment_type_keyboard() -> InlineKeyboardMarkup:
     """
     Создает инлайн-клавиатуру для выбора типа комплимента
@@ -58,3 +71,33 @@ def get_main_menu_keyboard() -> InlineKeyboardMarkup:
     
     builder.adjust(1, 2)
     return builder.as_markup()
+
+def get_history_keyboard(older: Optional[PageKey],
+                         newer: Optional[PageKey]) -> Optional[InlineKeyboardMarkup]:
+    """
+    Создает кнопки листания истории комплиментов
+    
+    Args:
+        older: (мкс, id) страницы старше текущей
+        newer: (мкс, id) страницы новее текущей
+    
+    Returns:
+        InlineKeyboardMarkup объект или None, если листать некуда
+    """
+    if older is None and newer is None:
+        return None
+    
+    builder = InlineKeyboardBuilder()
+    
+    if newer is not None:
+        builder.add(InlineKeyboardButton(
+            text="⬅️ Новее",
+            callback_data=HistoryPageCallback(direction="newer", ts=newer[0], id=newer[1]).pack()
+        ))
+    if older is not None:
+        builder.add(InlineKeyboardButton(
+            text="Старше ➡️",
+            callback_data=HistoryPageCallback(direction="older", ts=older[0], id=older[1]).pack()
+        ))
+    
+    return builder.as_markup()
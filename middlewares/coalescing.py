@@ -0,0 +1,121 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from loguru import logger
+
+from config.settings import settings
+
+
+class MessageBatch:
+    """Сообщения чата, на которые отвечает одна генерация"""
+
+    __slots__ = ("messages", "version", "committed", "task")
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.version = 0
+        # Генерация закончилась и ответ уже отправляется — отменять нельзя
+        self.committed = False
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def texts(self) -> List[str]:
+        return [message.text for message in self.messages]
+
+
+class ChatCoalescingMiddleware(BaseMiddleware):
+    """
+    Объединяет сообщения одного чата в одну генерацию
+
+    Сообщение ждёт window секунд: если за это время в чат пришло ещё одно,
+    обработка достаётся последнему, а обработчик получает все сообщения
+    пачки в аргументе batch. Незавершённая генерация по тому же чату
+    отменяется, и её сообщения переходят в новую пачку; если ответ уже
+    отправляется, новая пачка ждёт его.
+    """
+
+    def __init__(self, window: float = settings.COALESCE_WINDOW):
+        self.window = window
+        self._collecting: Dict[int, MessageBatch] = {}
+        self._active: Dict[int, MessageBatch] = {}
+
+        # Метрики
+        self.messages = 0
+        self.generations = 0
+        self.coalesced = 0
+        self.superseded = 0
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        if not isinstance(event, Message) or not event.text:
+            return await handler(event, data)
+
+        chat_id = event.chat.id
+        self.messages += 1
+
+        batch = self._collecting.get(chat_id)
+        if batch is None:
+            batch = self._collecting[chat_id] = MessageBatch()
+        batch.messages.append(event)
+        batch.version += 1
+        version = batch.version
+
+        if self.window > 0:
+            await asyncio.sleep(self.window)
+        if batch.version != version:
+            # Пачку обработает более позднее сообщение
+            self.coalesced += 1
+            return None
+        del self._collecting[chat_id]
+
+        previous = self._active.get(chat_id)
+        if previous is not None and not previous.committed:
+            previous.task.cancel()
+            batch.messages[:0] = previous.messages
+            self.superseded += 1
+            logger.debug("Генерация для чата {} заменена новой пачкой из {} сообщений", chat_id, len(batch.messages))
+
+        batch.task = asyncio.create_task(self._run(handler, batch, previous, data))
+        self._active[chat_id] = batch
+        try:
+            # wait() не пробрасывает отмену задачи пачки в вызывающий код
+            await asyncio.wait([batch.task])
+        except asyncio.CancelledError:
+            batch.task.cancel()
+            raise
+        finally:
+            if self._active.get(chat_id) is batch:
+                del self._active[chat_id]
+
+        if batch.task.cancelled():
+            return None
+        return batch.task.result()
+
+    async def _run(self,
+                   handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                   batch: MessageBatch,
+                   previous: Optional[MessageBatch],
+                   data: Dict[str, Any]) -> Any:
+        # Ответы в одном чате отправляются по очереди
+        if previous is not None:
+            await asyncio.wait([previous.task])
+
+        self.generations += 1
+        return await handler(batch.messages[-1], {**data, "batch": batch})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика объединения: сообщения, генерации, отменённые пачки"""
+        return {
+            'messages': self.messages,
+            'generations': self.generations,
+            'coalesced': self.coalesced,
+            'superseded': self.superseded,
+            'active': len(self._active),
+        }
+
+
+# Глобальный экземпляр
+coalescing_middleware = ChatCoalescingMiddleware()
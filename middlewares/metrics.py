@@ -0,0 +1,36 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.metrics import handler_latency
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Замеряет время обработчиков роутера
+
+    Регистрируется первым, поэтому в замер входят и остальные middleware
+    роутера (ожидание окна объединения, очередь генераций).
+    """
+
+    def __init__(self, router_name: str):
+        self.router_name = router_name
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            handler_latency.observe(
+                time.perf_counter() - started,
+                router=self.router_name,
+                event=type(event).__name__,
+                status=status,
+            )
@@ -0,0 +1,39 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from services.fair_scheduler import FairScheduler, generation_scheduler
+
+
+class SchedulingMiddleware(BaseMiddleware):
+    """
+    Слот генерации в справедливой очереди FairScheduler
+
+    Ограничивает число одновременных генераций во всём боте
+    (GENERATION_MAX_CONCURRENCY) независимо от того, включены ли лимиты
+    частоты. Регистрируется после ThrottlingMiddleware: ограниченные
+    запросы (throttled=True) отвечают локальным комплиментом и слот не
+    занимают.
+    """
+
+    def __init__(self, scheduler: FairScheduler = generation_scheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None or data.get("throttled"):
+            return await handler(event, data)
+
+        async with self.scheduler.slot(user.id):
+            return await handler(event, data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика очереди генераций"""
+        return self.scheduler.get_stats()
+
+
+# Глобальный экземпляр
+scheduling_middleware = SchedulingMiddleware()
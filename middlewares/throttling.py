@@ -0,0 +1,132 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from loguru import logger
+
+from config.settings import settings
+
+THROTTLE_ACTIONS = ("fallback", "reject", "drop")
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        # now мог быть взят до создания бакета
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        self._refill(now if now is not None else time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение генераций по пользователю и по всему боту
+
+    Каждая генерация тратит токен из бакета пользователя и из общего
+    бакета. Если токенов нет, в зависимости от action обработчик получает
+    throttled=True и отвечает локальным комплиментом (fallback), либо
+    пользователь получает предупреждение (reject), либо сообщение
+    игнорируется (drop). Слот генерации выдаёт SchedulingMiddleware,
+    который работает и без лимитов.
+    """
+
+    def __init__(self,
+                 user_rate: float = settings.RATE_LIMIT_USER_RATE,
+                 user_burst: int = settings.RATE_LIMIT_USER_BURST,
+                 global_rate: float = settings.RATE_LIMIT_GLOBAL_RATE,
+                 global_burst: int = settings.RATE_LIMIT_GLOBAL_BURST,
+                 action: str = settings.RATE_LIMIT_ACTION,
+                 max_users: int = settings.RATE_LIMIT_MAX_USERS):
+        if action not in THROTTLE_ACTIONS:
+            raise ValueError(f"Неизвестное действие при превышении лимита: {action}")
+
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.action = action
+        self.max_users = max_users
+
+        self._global = TokenBucket(global_rate, global_burst)
+        self._users: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # Пользователи, которым уже отправлено предупреждение (reject)
+        self._warned = set()
+
+        # Метрики
+        self.allowed = 0
+        self.throttled_user = 0
+        self.throttled_global = 0
+
+    def _user_bucket(self, user_id: int) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            while len(self._users) > self.max_users:
+                evicted, _ = self._users.popitem(last=False)
+                self._warned.discard(evicted)
+        else:
+            self._users.move_to_end(user_id)
+        return bucket
+
+    async def __call__(self,
+                       handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject,
+                       data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        bucket = self._user_bucket(user.id)
+        allowed = bucket.try_acquire(now)
+        if allowed and not self._global.try_acquire(now):
+            bucket.refund()
+            allowed = False
+            self.throttled_global += 1
+        elif not allowed:
+            self.throttled_user += 1
+
+        if allowed:
+            self.allowed += 1
+            self._warned.discard(user.id)
+            return await handler(event, data)
+
+        logger.info("Лимит генераций для {} исчерпан, действие: {}", user.id, self.action)
+        if self.action == "fallback":
+            return await handler(event, {**data, "throttled": True})
+        if self.action == "reject" and user.id not in self._warned and isinstance(event, Message):
+            self._warned.add(user.id)
+            await event.answer("Слишком много сообщений подряд 🙈 Дай мне минутку и напиши снова!")
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика ограничений: пропущенные и ограниченные генерации"""
+        return {
+            'allowed': self.allowed,
+            'throttled_user': self.throttled_user,
+            'throttled_global': self.throttled_global,
+            'tracked_users': len(self._users),
+            'global_tokens': round(self._global.tokens, 2),
+        }
+
+
+# Глобальный экземпляр
+throttling_middleware = ThrottlingMiddleware()
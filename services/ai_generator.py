@@ -1,9 +1,17 @@
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import time
+from collections import Counter
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Set, Tuple
 from loguru import logger
 
 from config.settings import settings
+from services.circuit_breaker import CircuitBreaker
+from services.context_manager import HistoryMessage
+from services.metrics import provider_errors, provider_latency
+from services.response_cache import response_cache
+from services.served_index import served_index
 from utils.fallback_generator import fallback_generator
+from utils.logger import debug_sampled
 
 # Импорты провайдеров (с обработкой ошибок импорта)
 try:
@@ -33,7 +41,22 @@ class AIGenerator:
     
     def __init__(self):
         self.providers: List[Tuple[str, Any]] = []
+        self.mode = settings.AI_GENERATION_MODE
+        self.hedge_delay = settings.AI_HEDGE_DELAY
+        self.latency_budget = settings.AI_LATENCY_BUDGET
+        self.requests_total = 0
+        self.wins: Counter = Counter()
+        # Фоновые генерации (пополнение пула) не входят в requests_total и wins
+        self.background_requests = 0
+        self._probe_task: Optional[asyncio.Task] = None
+        # Задачи, которые отменил сам генератор (проигравшие гонку, исчерпанный
+        # бюджет): для выключателя это таймаут. Внешняя отмена (например,
+        # новое сообщение пользователя в coalescing) провайдера не штрафует.
+        self._timed_out: Set[asyncio.Task] = set()
         self._init_providers()
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(name) for name, _ in self.providers if name != 'fallback'
+        }
         logger.info(f"Инициализированы провайдеры: {[p[0] for p in self.providers]}")
     
     def _init_providers(self):
@@ -81,58 +104,330 @@ class AIGenerator:
     
     async def generate_compliment(self,
                                  message_text: str,
-                                 history: List[Dict[str, Any]],
-                                 compliment_type: Optional[str] = None) -> str:
+                                 history: List[HistoryMessage],
+                                 compliment_type: Optional[str] = None,
+                                 user_id: Optional[int] = None) -> str:
         """
-        Генерирует комплимент, пробуя провайдеров по очереди
+        Генерирует комплимент, пробуя провайдеров по очереди или в гонке
         
         Args:
             message_text: текущее сообщение пользователя
             history: история диалога
             compliment_type: тип комплимента
+            user_id: ID пользователя в Telegram (чтобы кэш не повторял ему ответ)
             
         Returns:
             Сгенерированный комплимент
         """
+        avoid = served_index.avoid_for(user_id)
+        if avoid is not None:
+            await served_index.ensure_loaded(user_id)
+        
+        if settings.RESPONSE_CACHE_ENABLED:
+            cached = response_cache.get(user_id, message_text, history, compliment_type, avoid)
+            if cached is not None:
+                return cached
+        
+        stats, provider_name, compliment = await self._generate(message_text, history, compliment_type)
+        if avoid is not None and avoid(compliment):
+            compliment, provider_name, stats = await self._regenerate(
+                message_text, history, compliment_type, avoid, compliment, provider_name, stats
+            )
+        
+        # Шаблонные ответы fallback не кэшируем — они и так мгновенные
+        if settings.RESPONSE_CACHE_ENABLED and provider_name != 'fallback':
+            response_cache.put(user_id, message_text, history, compliment_type, compliment, stats["latency"])
+        
+        return compliment
+    
+    async def _regenerate(self,
+                          message_text: str,
+                          history: List[HistoryMessage],
+                          compliment_type: Optional[str],
+                          avoid: Callable[[str], bool],
+                          compliment: str,
+                          provider_name: str,
+                          stats: Dict) -> Tuple[str, str, Dict]:
+        """
+        Заменяет комплимент, который пользователь уже получал
+        
+        AI-комплимент генерируется заново не больше DEDUP_MAX_RETRIES раз,
+        у fallback берётся другой шаблон. Если замены не нашлось, остаётся
+        исходный комплимент.
+        """
+        for _ in range(settings.DEDUP_MAX_RETRIES if provider_name != 'fallback' else 0):
+            stats, provider_name, compliment = await self._generate(message_text, history, compliment_type)
+            if not avoid(compliment):
+                return compliment, provider_name, stats
+        
+        alternative = fallback_generator.generate_compliment(
+            compliment_type=compliment_type,
+            context=[msg.text for msg in history[-5:]],
+            avoid=avoid
+        )
+        if not avoid(alternative):
+            return alternative, 'fallback', stats
+        return compliment, provider_name, stats
+    
+    async def generate_ai_compliment(self,
+                                     message_text: str,
+                                     history: List[HistoryMessage],
+                                     compliment_type: Optional[str] = None,
+                                     background: bool = False) -> Optional[str]:
+        """
+        Генерирует комплимент только через AI провайдеры (без кэша)
+        
+        Args:
+            background: фоновая генерация — не учитывается в доле побед провайдеров
+        
+        Returns:
+            Комплимент или None, если ответил только fallback
+        """
+        _, provider_name, compliment = await self._generate(message_text, history, compliment_type, background)
+        return None if provider_name == 'fallback' else compliment
+    
+    async def stream_compliment(self,
+                                message_text: str,
+                                history: List[HistoryMessage],
+                                compliment_type: Optional[str] = None,
+                                user_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Генерирует комплимент потоком через первый здоровый AI провайдер
+        
+        Если поток не дал первого фрагмента за latency_budget или оборвался,
+        комплимент генерируется обычным путём (остальные провайдеры и fallback).
+        
+        Args:
+            message_text: текущее сообщение пользователя
+            history: история диалога
+            compliment_type: тип комплимента
+            user_id: ID пользователя в Telegram
+            
+        Yields:
+            Накопленный текст комплимента; последнее значение — окончательный текст
+        """
+        # Поток уже виден пользователю, поэтому почти повторы отсеиваются только в кэше
+        avoid = served_index.avoid_for(user_id)
+        if avoid is not None:
+            await served_index.ensure_loaded(user_id)
+        if settings.RESPONSE_CACHE_ENABLED:
+            cached = response_cache.get(user_id, message_text, history, compliment_type, avoid)
+            if cached is not None:
+                yield cached
+                return
+        
+        streaming = [
+            (name, provider) for name, provider in self._ordered_providers()
+            if name != 'fallback' and hasattr(provider, 'stream_compliment')
+        ]
+        provider_name, provider = next(
+            ((name, provider) for name, provider in streaming if self._allow(name)), (None, None)
+        )
+        if provider is None:
+            yield await self.generate_compliment(message_text, history, compliment_type, user_id)
+            return
+        
+        breaker = self.breakers.get(provider_name)
+        model = getattr(provider, 'model', provider_name)
+        started = time.perf_counter()
+        stream = provider.stream_compliment(message_text, history, compliment_type)
+        compliment = None
+        try:
+            try:
+                # Ждём первый фрагмент не дольше бюджета, дальше — таймауты клиента
+                compliment = await asyncio.wait_for(stream.__anext__(), timeout=self.latency_budget)
+                yield compliment
+                async for compliment in stream:
+                    yield compliment
+            finally:
+                await stream.aclose()
+        except (asyncio.CancelledError, GeneratorExit):
+            if breaker:
+                breaker.release()
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            provider_latency.observe(elapsed, provider=provider_name, model=model, status="error")
+            provider_errors.inc(provider=provider_name, model=model)
+            if breaker:
+                breaker.record_failure(elapsed)
+            logger.warning(f"❌ Поток {provider_name} не сработал: {str(e)[:100] or type(e).__name__}")
+            yield await self.generate_compliment(message_text, history, compliment_type, user_id)
+            return
+        
+        latency = time.perf_counter() - started
+        provider_latency.observe(latency, provider=provider_name, model=model, status="ok")
+        if breaker:
+            breaker.record_success(latency)
+        self.requests_total += 1
+        self.wins[provider_name] += 1
+        self._log_statistics({"attempts": 1, "latency": latency}, provider_name, compliment)
+        
+        if settings.RESPONSE_CACHE_ENABLED:
+            response_cache.put(user_id, message_text, history, compliment_type, compliment, latency)
+    
+    async def _generate(self,
+                        message_text: str,
+                        history: List[HistoryMessage],
+                        compliment_type: Optional[str],
+                        background: bool = False) -> Tuple[Dict, str, str]:
+        """Опрашивает провайдеров в выбранном режиме с учётом бюджета времени"""
+        if background:
+            self.background_requests += 1
+        else:
+            self.requests_total += 1
+        started = time.perf_counter()
+        
+        if self.mode == 'race':
+            generate = self._generate_race(message_text, history, compliment_type)
+        else:
+            generate = self._generate_sequential(message_text, history, compliment_type)
+        
+        task = asyncio.ensure_future(generate)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.latency_budget)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        
+        if done:
+            stats, provider_name, compliment = task.result()
+        else:
+            self._cancel_timed_out(task)
+            await asyncio.wait({task})
+            logger.warning(f"⏱ Бюджет {self.latency_budget}s исчерпан, отдаю локальный комплимент")
+            stats = {"attempts": 0, "success": True, "budget_exceeded": True}
+            provider_name = 'fallback'
+            compliment = self._generate_fallback(history, compliment_type)
+        
+        stats["latency"] = time.perf_counter() - started
+        if not background:
+            self.wins[provider_name] += 1
+        self._log_statistics(stats, provider_name, compliment)
+        return stats, provider_name, compliment
+    
+    async def _call_provider(self,
+                             provider_name: str,
+                             provider: Any,
+                             message_text: str,
+                             history: List[HistoryMessage],
+                             compliment_type: Optional[str]) -> str:
+        """
+        Вызывает провайдер и проверяет, что он вернул непустой комплимент
+        
+        Результат записывается в выключатель провайдера. Вызов, отменённый
+        самим генератором (проиграл гонку или исчерпал бюджет) после того,
+        как дольше hedge_delay ждал ответа, считается таймаутом. При внешней
+        отмене место в выключателе просто освобождается.
+        """
+        debug_sampled("Пробую генерацию через {}", provider_name)
+        breaker = self.breakers.get(provider_name)
+        model = getattr(provider, 'model', provider_name)
+        started = time.perf_counter()
+        
+        try:
+            if provider_name == 'fallback':
+                # Fallback генератор синхронный
+                compliment = self._generate_fallback(history, compliment_type, provider)
+            else:
+                # AI провайдеры асинхронные
+                compliment = await provider.generate_compliment(
+                    message_text=message_text,
+                    history=history,
+                    compliment_type=compliment_type
+                )
+            
+            if not compliment or not compliment.strip():
+                raise ValueError(f"Провайдер {provider_name} вернул пустой ответ")
+        except asyncio.CancelledError:
+            elapsed = time.perf_counter() - started
+            provider_latency.observe(elapsed, provider=provider_name, model=model, status="cancelled")
+            if breaker:
+                if asyncio.current_task() in self._timed_out and elapsed >= self.hedge_delay:
+                    breaker.record_failure(elapsed)
+                else:
+                    breaker.release()
+            raise
+        except Exception:
+            elapsed = time.perf_counter() - started
+            provider_latency.observe(elapsed, provider=provider_name, model=model, status="error")
+            provider_errors.inc(provider=provider_name, model=model)
+            if breaker:
+                breaker.record_failure(elapsed)
+            raise
+        
+        elapsed = time.perf_counter() - started
+        provider_latency.observe(elapsed, provider=provider_name, model=model, status="ok")
+        if breaker:
+            breaker.record_success(elapsed)
+        return compliment
+    
+    def _ordered_providers(self) -> List[Tuple[str, Any]]:
+        """
+        AI провайдеры по убыванию оценки здоровья, fallback последним
+        
+        При равной оценке сохраняется порядок из AI_PROVIDER_PRIORITY.
+        """
+        ranked = sorted(
+            (-self.breakers[name].health_score, index, name, provider)
+            for index, (name, provider) in enumerate(self.providers)
+            if name != 'fallback'
+        )
+        ordered = [(name, provider) for _, _, name, provider in ranked]
+        ordered.extend((name, provider) for name, provider in self.providers if name == 'fallback')
+        return ordered
+    
+    def _allow(self, provider_name: str) -> bool:
+        """Проверяет выключатель провайдера (fallback разрешён всегда)"""
+        breaker = self.breakers.get(provider_name)
+        if breaker is None or breaker.allow_request():
+            return True
+        logger.debug("Пропускаю {}: выключатель {}", provider_name, breaker.state)
+        return False
+    
+    def _generate_fallback(self,
+                           history: List[HistoryMessage],
+                           compliment_type: Optional[str],
+                           provider: Any = fallback_generator) -> str:
+        """Локальная генерация без сетевых запросов"""
+        return provider.generate_compliment(
+            compliment_type=compliment_type,
+            context=[msg.text for msg in history[-5:]]
+        )
+    
+    async def _generate_sequential(self,
+                                   message_text: str,
+                                   history: List[HistoryMessage],
+                                   compliment_type: Optional[str]) -> Tuple[Dict, str, str]:
+        """Пробует провайдеров строго по очереди"""
         
         # Статистика использования
         stats = {"attempts": 0, "success": False}
         
-        for provider_name, provider in self.providers:
+        providers = self._ordered_providers()
+        
+        for provider_name, provider in providers:
+            if not self._allow(provider_name):
+                continue
+            
             stats["attempts"] += 1
             
             try:
-                logger.debug(f"Пробую генерацию через {provider_name}")
+                compliment = await self._call_provider(
+                    provider_name, provider, message_text, history, compliment_type
+                )
                 
-                if provider_name == 'fallback':
-                    # Fallback генератор синхронный
-                    compliment = provider.generate_compliment(
-                        compliment_type=compliment_type,
-                        context=[msg["text"] for msg in history[-5:]]
-                    )
-                else:
-                    # AI провайдеры асинхронные
-                    compliment = await provider.generate_compliment(
-                        message_text=message_text,
-                        history=history,
-                        compliment_type=compliment_type
-                    )
-                
-                logger.info(f"✅ Успешная генерация через {provider_name}")
+                logger.info("✅ Успешная генерация через {}", provider_name)
                 stats["success"] = True
                 stats["provider"] = provider_name
-                
-                # Сохраняем статистику
-                self._log_statistics(stats, provider_name, compliment)
-                
-                return compliment
+                return stats, provider_name, compliment
                 
             except Exception as e:
                 logger.warning(f"❌ Провайдер {provider_name} не сработал: {str(e)[:100]}")
                 
                 # Если это не последний провайдер, пробуем следующий
-                if provider_name != self.providers[-1][0]:
-                    logger.info(f"Пробую следующий провайдер...")
+                if provider_name != providers[-1][0]:
+                    logger.info("Пробую следующий провайдер...")
                     continue
                 else:
                     # Если это последний провайдер (fallback), то он не должен падать
@@ -142,17 +437,157 @@ class AIGenerator:
         
         # Если дошли сюда, что-то пошло не так
         logger.error("Все провайдеры провалились")
-        return "Оля, ты сегодня прекрасна! 💖"
+        return stats, 'fallback', "Оля, ты сегодня прекрасна! 💖"
+    
+    async def _generate_race(self,
+                             message_text: str,
+                             history: List[HistoryMessage],
+                             compliment_type: Optional[str]) -> Tuple[Dict, str, str]:
+        """
+        Хеджированная гонка AI провайдеров
+        
+        Следующий провайдер стартует, если предыдущий упал или не ответил
+        за hedge_delay секунд. Побеждает первый валидный ответ, остальные
+        запросы отменяются. Fallback используется, только если все AI провайдеры упали.
+        """
+        stats = {"attempts": 0, "success": False}
+        queue = [(name, provider) for name, provider in self._ordered_providers() if name != 'fallback']
+        running: Dict[asyncio.Task, str] = {}
+        finished = False
+        
+        try:
+            while queue or running:
+                while queue and not self._allow(queue[0][0]):
+                    queue.pop(0)
+                
+                if queue:
+                    provider_name, provider = queue.pop(0)
+                    stats["attempts"] += 1
+                    task = asyncio.create_task(self._call_provider(
+                        provider_name, provider, message_text, history, compliment_type
+                    ))
+                    running[task] = provider_name
+                
+                if not running:
+                    break
+                
+                # Ждём первый завершившийся запрос; пока есть кого запускать — не дольше hedge_delay
+                timeout = self.hedge_delay if queue else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    provider_name = running.pop(task)
+                    if task.exception() is None:
+                        logger.info("🏁 Гонку выиграл {}", provider_name)
+                        stats["success"] = True
+                        stats["provider"] = provider_name
+                        finished = True
+                        return stats, provider_name, task.result()
+                    logger.warning(f"❌ Провайдер {provider_name} не сработал: {str(task.exception())[:100]}")
+                
+                if not done and queue:
+                    logger.info("Нет ответа за {}s, запускаю следующий провайдер параллельно", self.hedge_delay)
+        finally:
+            # Отменяем проигравших (и всех, если нас самих отменили); таймаутом
+            # это считается, только если отменяем по своей воле
+            timed_out = finished or asyncio.current_task() in self._timed_out
+            for task in running:
+                if timed_out:
+                    self._cancel_timed_out(task)
+                else:
+                    task.cancel()
+        
+        logger.warning("Все AI провайдеры провалились, использую fallback")
+        stats["attempts"] += 1
+        return stats, 'fallback', self._generate_fallback(history, compliment_type)
+    
+    def _cancel_timed_out(self, task: asyncio.Task):
+        """Отменяет задачу так, что провайдер получит таймаут в выключатель"""
+        self._timed_out.add(task)
+        task.add_done_callback(self._timed_out.discard)
+        task.cancel()
     
     def _log_statistics(self, stats: Dict, provider_name: str, compliment: str):
         """Логирует статистику использования"""
         logger.info(
-            f"📊 Статистика генерации | "
-            f"Попыток: {stats['attempts']} | "
-            f"Провайдер: {provider_name} | "
-            f"Длина: {len(compliment)} chars"
+            "📊 Статистика генерации | "
+            "Попыток: {} | "
+            "Провайдер: {} | "
+            "Длина: {} chars | "
+            "Время: {:.2f}s | "
+            "Доля побед: {:.0%}",
+            stats['attempts'], provider_name, len(compliment),
+            stats.get('latency', 0), self.get_win_rate(provider_name)
         )
     
+    def get_win_rate(self, provider_name: str) -> float:
+        """Доля запросов, на которые ответил данный провайдер"""
+        if not self.requests_total:
+            return 0.0
+        return self.wins[provider_name] / self.requests_total
+    
+    async def warm_up(self):
+        """
+        Прогревает провайдеры в фоне, не задерживая запуск поллинга
+        
+        Провайдеры инициализируются лениво, поэтому прогрев необязателен:
+        если сообщение придёт раньше, провайдер догрузится при первом запросе.
+        """
+        started = time.perf_counter()
+        warm_ups = [
+            (name, provider.warm_up()) for name, provider in self.providers
+            if hasattr(provider, 'warm_up')
+        ]
+        results = await asyncio.gather(*(coro for _, coro in warm_ups), return_exceptions=True)
+        
+        for (name, _), result in zip(warm_ups, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Прогрев {name} не удался: {result}")
+        
+        logger.info(f"Провайдеры прогреты за {time.perf_counter() - started:.2f}s")
+    
+    def start_health_probes(self) -> asyncio.Task:
+        """Запускает фоновую проверку провайдеров с разомкнутым выключателем"""
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop())
+        return self._probe_task
+    
+    async def stop_health_probes(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+    
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(settings.AI_BREAKER_PROBE_INTERVAL)
+            for name, provider in self.providers:
+                breaker = self.breakers.get(name)
+                if breaker and breaker.ready_for_probe():
+                    await self._probe(name, provider, breaker)
+    
+    async def _probe(self, name: str, provider: Any, breaker: CircuitBreaker):
+        """
+        Проверяет провайдер без участия пользователей
+        
+        Успешная проверка переводит выключатель в half_open: следующий
+        реальный запрос решит, замкнуть его или снова разомкнуть.
+        """
+        if not hasattr(provider, 'health_check'):
+            breaker.half_open()
+            return
+        
+        try:
+            await provider.health_check()
+            logger.info(f"Фоновая проверка {name} прошла успешно")
+            breaker.half_open()
+        except Exception as e:
+            logger.warning(f"Фоновая проверка {name} не прошла: {str(e)[:100]}")
+            breaker.trip()
+    
     def get_available_providers(self) -> List[str]:
         """Возвращает список доступных провайдеров"""
         return [name for name, _ in self.providers]
@@ -176,6 +611,11 @@ class AIGenerator:
                     'status': 'available',
                     'description': f'{name.capitalize()} API провайдер'
                 }
+            
+            if name in self.breakers:
+                info[name].update(self.breakers[name].get_info())
+            info[name]['wins'] = self.wins[name]
+            info[name]['win_rate'] = self.get_win_rate(name)
         
         return info
 
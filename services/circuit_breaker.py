@@ -0,0 +1,141 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+from config.settings import settings
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для AI провайдера
+    
+    Состояния:
+        closed    — запросы идут как обычно;
+        open      — провайдер пропускается до истечения cooldown;
+        half_open — разрешён один пробный запрос, по его итогу closed или open.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self,
+                 name: str,
+                 window_size: int = settings.AI_BREAKER_WINDOW_SIZE,
+                 window_seconds: float = settings.AI_BREAKER_WINDOW_SECONDS,
+                 error_threshold: float = settings.AI_BREAKER_ERROR_THRESHOLD,
+                 min_requests: int = settings.AI_BREAKER_MIN_REQUESTS,
+                 cooldown: float = settings.AI_BREAKER_COOLDOWN):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.error_threshold = error_threshold
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        # (время, успех, задержка) последних вызовов
+        self._window: Deque[Tuple[float, bool, float]] = deque(maxlen=window_size)
+    
+    def _samples(self):
+        """Возвращает вызовы, попадающие в скользящее окно по времени"""
+        cutoff = time.monotonic() - self.window_seconds
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+        return self._window
+    
+    @property
+    def error_rate(self) -> float:
+        samples = self._samples()
+        if not samples:
+            return 0.0
+        return sum(1 for _, ok, _ in samples if not ok) / len(samples)
+    
+    @property
+    def p95_latency(self) -> Optional[float]:
+        latencies = sorted(latency for _, _, latency in self._samples())
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    
+    @property
+    def health_score(self) -> float:
+        """Оценка здоровья от 0 до 1: учитывает долю ошибок и p95 задержки"""
+        if self.state == self.OPEN:
+            return 0.0
+        p95 = self.p95_latency
+        if p95 is None:
+            return 1.0
+        return (1.0 - self.error_rate) / (1.0 + p95 / settings.AI_BREAKER_LATENCY_TARGET)
+    
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос этому провайдеру прямо сейчас"""
+        if self.state == self.CLOSED:
+            return True
+        
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self._transition(self.HALF_OPEN)
+        
+        # half_open: пропускаем только один пробный запрос
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+    
+    def ready_for_probe(self) -> bool:
+        """Истёк ли cooldown открытого выключателя"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown
+    
+    def record_success(self, latency: float):
+        self.probe_in_flight = False
+        if self.state != self.CLOSED:
+            # Старые ошибки не должны сразу же снова разомкнуть выключатель
+            self._window.clear()
+            self._transition(self.CLOSED)
+        self._window.append((time.monotonic(), True, latency))
+    
+    def record_failure(self, latency: float):
+        self._window.append((time.monotonic(), False, latency))
+        self.probe_in_flight = False
+        
+        if self.state == self.HALF_OPEN:
+            self.trip()
+        elif (self.state == self.CLOSED and
+              len(self._samples()) >= self.min_requests and
+              self.error_rate >= self.error_threshold):
+            self.trip()
+    
+    def release(self):
+        """Освобождает пробный слот без записи результата (например, при отмене)"""
+        self.probe_in_flight = False
+    
+    def half_open(self):
+        """Переводит в half_open после успешной фоновой проверки"""
+        if self.state == self.OPEN:
+            self._transition(self.HALF_OPEN)
+    
+    def trip(self):
+        """Размыкает выключатель и запускает отсчёт cooldown"""
+        self.opened_at = time.monotonic()
+        self._transition(self.OPEN)
+    
+    def _transition(self, state: str):
+        logger.info(
+            f"🔌 Провайдер {self.name}: {self.state} → {state} | "
+            f"ошибок: {self.error_rate:.0%}"
+        )
+        self.state = state
+    
+    def get_info(self) -> Dict[str, Any]:
+        """Текущее состояние выключателя для get_provider_info()"""
+        return {
+            'state': self.state,
+            'error_rate': round(self.error_rate, 3),
+            'p95_latency': self.p95_latency,
+            'health_score': round(self.health_score, 3),
+            'samples': len(self._samples()),
+        }
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+from sqlalchemy import select, delete
+from loguru import logger
+
+from config.settings import settings
+from database.models import PooledCompliment, get_db
+from services.ai_generator import ai_generator
+from utils.fallback_generator import fallback_generator
+
+POOL_TYPES = ("appearance", "character", "achievements")
+
+POOL_PROMPTS = {
+    "appearance": "Сделай комплимент о внешности Оли",
+    "character": "Сделай комплимент о характере Оли",
+    "achievements": "Сделай комплимент о достижениях Оли",
+}
+
+
+class ComplimentPool:
+    """
+    Пул заранее сгенерированных комплиментов по типам
+    
+    Кнопки выбора типа не несут контекста, поэтому ответ на них берётся
+    из пула за O(1). Фоновая задача пополняет пул через AI провайдеры
+    до high-water, как только он опускается ниже low-water. Пул хранится
+    в базе данных и переживает рестарты.
+    """
+    
+    def __init__(self,
+                 low_water: int = settings.COMPLIMENT_POOL_LOW_WATER,
+                 high_water: int = settings.COMPLIMENT_POOL_HIGH_WATER,
+                 min_interval: float = settings.COMPLIMENT_POOL_MIN_INTERVAL):
+        self.low_water = low_water
+        self.high_water = high_water
+        self.min_interval = min_interval
+        
+        # (id строки в БД, текст) для каждого типа
+        self._pools: Dict[str, Deque[Tuple[int, str]]] = {t: deque() for t in POOL_TYPES}
+        self._refill_needed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_generation = 0.0
+        self.served = 0
+        self.drained = 0
+    
+    async def load(self):
+        """Загружает сохранённый пул из базы данных"""
+        async with get_db() as db:
+            result = await db.execute(
+                select(PooledCompliment.id, PooledCompliment.compliment_type, PooledCompliment.text)
+                .order_by(PooledCompliment.id)
+            )
+            for row_id, compliment_type, text in result.all():
+                if compliment_type in self._pools:
+                    self._pools[compliment_type].append((row_id, text))
+        
+        logger.info(f"Пул комплиментов загружен: {self.sizes()}")
+    
+    async def take(self, compliment_type: str, avoid: Optional[Callable[[str], bool]] = None) -> str:
+        """
+        Выдаёт комплимент нужного типа
+        
+        Args:
+            compliment_type: appearance, character, achievements или random
+            avoid: возвращает True для комплимента, который пользователь уже
+                получал; такие остаются в пуле для других пользователей
+            
+        Returns:
+            Комплимент из пула или шаблон fallback, если пул пуст
+        """
+        if compliment_type not in self._pools:
+            non_empty = [t for t in POOL_TYPES if self._pools[t]]
+            compliment_type = random.choice(non_empty) if non_empty else None
+        
+        pool = self._pools.get(compliment_type)
+        if not pool:
+            self.drained += 1
+            self._refill_needed.set()
+            logger.info("Пул комплиментов {} пуст, использую fallback", compliment_type)
+            return fallback_generator.generate_compliment(compliment_type=compliment_type, avoid=avoid)
+        
+        # Первый из нескольких ближайших, который пользователь ещё не видел
+        index = 0
+        if avoid is not None:
+            index = next((i for i in range(min(len(pool), 3)) if not avoid(pool[i][1])), 0)
+        row_id, text = pool[index]
+        del pool[index]
+        self.served += 1
+        if len(pool) < self.low_water:
+            self._refill_needed.set()
+        
+        try:
+            async with get_db() as db:
+                await db.execute(delete(PooledCompliment).where(PooledCompliment.id == row_id))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при удалении комплимента из пула: {e}")
+        
+        return text
+    
+    def sizes(self) -> Dict[str, int]:
+        return {t: len(pool) for t, pool in self._pools.items()}
+    
+    def start(self) -> asyncio.Task:
+        """Запускает фоновую загрузку и пополнение пула"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        await self.load()
+        while True:
+            try:
+                await self._refill()
+            except Exception as e:
+                logger.error(f"Ошибка при пополнении пула комплиментов: {e}")
+            
+            self._refill_needed.clear()
+            try:
+                await asyncio.wait_for(
+                    self._refill_needed.wait(), timeout=settings.COMPLIMENT_POOL_CHECK_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _refill(self):
+        """Пополняет типы, опустившиеся ниже low-water, до high-water"""
+        for compliment_type in POOL_TYPES:
+            pool = self._pools[compliment_type]
+            if len(pool) >= self.low_water:
+                continue
+            
+            while len(pool) < self.high_water:
+                # Ограничиваем частоту фоновых запросов к AI
+                wait = self._last_generation + self.min_interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_generation = time.monotonic()
+                
+                text = await ai_generator.generate_ai_compliment(
+                    message_text=POOL_PROMPTS[compliment_type],
+                    history=[],
+                    compliment_type=compliment_type,
+                    background=True
+                )
+                if text is None:
+                    logger.warning("AI провайдеры недоступны, пополнение пула отложено")
+                    return
+                
+                async with get_db() as db:
+                    row = PooledCompliment(compliment_type=compliment_type, text=text)
+                    db.add(row)
+                    await db.commit()
+                    pool.append((row.id, text))
+            
+            logger.info(f"Пул комплиментов {compliment_type} пополнен до {len(pool)}")
+
+
+# Глобальный экземпляр
+compliment_pool = ComplimentPool()
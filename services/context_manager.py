@@ -1,57 +1,205 @@
-from typing import List, Dict, Any
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, select, delete, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
+from config.settings import settings
 from database.models import Message, User, get_db
+from services.message_writer import MessageWriter, PendingMessage
+from services.served_index import served_index
+from utils.logger import debug_sampled
+
+
+class HistoryMessage:
+    """Сообщение из истории диалога (только для чтения)"""
+    
+    __slots__ = ("text", "is_bot", "compliment_type", "created_at")
+    
+    def __init__(self,
+                 text: str,
+                 is_bot: bool,
+                 compliment_type: Optional[str],
+                 created_at: datetime):
+        self.text = text
+        self.is_bot = is_bot
+        self.compliment_type = compliment_type
+        self.created_at = created_at
+    
+    @classmethod
+    def from_model(cls, msg: Message) -> "HistoryMessage":
+        return cls(msg.text, msg.is_bot, msg.compliment_type, msg.created_at)
+    
+    @classmethod
+    def from_pending(cls, item: PendingMessage) -> "HistoryMessage":
+        return cls(item.text, item.is_bot, item.compliment_type, item.created_at)
+
+
+# Строка для записи: текст, от бота, тип комплимента, тип выбран кнопкой
+MessageRow = Tuple[str, bool, Optional[str], bool]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class HistoryCursor(NamedTuple):
+    """Позиция в истории комплиментов: ключ (created_at, id) сообщения"""
+    created_at: datetime
+    id: int
+    
+    @property
+    def timestamp_us(self) -> int:
+        """created_at в микросекундах с эпохи (точно, без float) — для callback data"""
+        return (self.created_at - _EPOCH) // timedelta(microseconds=1)
+    
+    @classmethod
+    def from_timestamp_us(cls, timestamp_us: int, message_id: int) -> "HistoryCursor":
+        return cls(_EPOCH + timedelta(microseconds=timestamp_us), message_id)
+
+
+class ComplimentPage(NamedTuple):
+    """Страница истории комплиментов (от новых к старым)"""
+    compliments: List[HistoryMessage]
+    # Курсоры соседних страниц; None — страницы нет
+    older: Optional[HistoryCursor]
+    newer: Optional[HistoryCursor]
+
 
 class ContextManager:
     """Управление контекстом диалога"""
     
     def __init__(self):
-        self.max_history_size = 10
+        self.max_history_size = settings.CONTEXT_MEMORY_SIZE
+        self.max_cached_users = settings.CONTEXT_CACHE_MAX_USERS
+        # telegram_id -> последние сообщения; порядок ключей — LRU
+        self._history_cache: "OrderedDict[int, Deque[HistoryMessage]]" = OrderedDict()
+        # telegram_id -> users.id
+        self._user_ids: "OrderedDict[int, int]" = OrderedDict()
+        # Счётчик записей: гидратация из БД не кладёт в кэш устаревший снимок
+        self._write_seq = 0
+        # Отложенная пакетная запись (запускается из bot.main)
+        self.writer = MessageWriter(self._flush_pending)
     
-    def get_dialog_history(self, user_id: int, db: Session) -> List[Dict[str, Any]]:
+    async def get_dialog_history(self, telegram_user_id: int, db: AsyncSession) -> List[HistoryMessage]:
         """
         Получает историю диалога для пользователя
         
+        История хранится в памяти (write-through) и подгружается из базы
+        данных только при промахе.
+        
         Args:
-            user_id: ID пользователя в базе данных
+            telegram_user_id: ID пользователя в Telegram
             db: сессия базы данных
         
         Returns:
-            Список сообщений в формате словарей
+            Список сообщений от старых к новым
         """
+        cached = self._history_cache.get(telegram_user_id)
+        if cached is not None:
+            self._history_cache.move_to_end(telegram_user_id)
+            return list(cached)
+        
         try:
-            messages = db.query(Message)\
-                .filter(Message.user_id == user_id)\
-                .order_by(Message.created_at.desc())\
-                .limit(self.max_history_size)\
-                .all()
+            write_seq = (self._write_seq, self.writer.flushes)
+            result = await db.execute(
+                select(Message)
+                .join(User, Message.user_id == User.id)
+                .where(User.telegram_id == telegram_user_id)
+                .order_by(Message.created_at.desc())
+                .limit(self.max_history_size)
+            )
+            messages = result.scalars().all()
             
             # Преобразуем в нужный формат (от старых к новым)
-            history = []
-            for msg in reversed(messages):
-                history.append({
-                    "text": msg.text,
-                    "is_bot": msg.is_bot,
-                    "compliment_type": msg.compliment_type,
-                    "created_at": msg.created_at
-                })
+            history = [HistoryMessage.from_model(msg) for msg in reversed(messages)]
             
-            logger.debug(f"Загружено {len(history)} сообщений из истории пользователя {user_id}")
+            # Добавляем сообщения, которые ещё ждут записи в очереди
+            pending = self.writer.pending_for(telegram_user_id)
+            if pending:
+                history.extend(HistoryMessage.from_pending(item) for item in pending)
+                history = history[-self.max_history_size:]
+            
+            if write_seq == (self._write_seq, self.writer.flushes):
+                self._cache_history(telegram_user_id, history)
+            
+            debug_sampled("Загружено {} сообщений из истории пользователя {}", len(history), telegram_user_id)
             return history
             
         except Exception as e:
             logger.error(f"Ошибка при получении истории диалога: {e}")
             return []
     
-    def save_message(self, 
-                    telegram_user_id: int,
-                    message_text: str,
-                    is_bot: bool = False,
-                    compliment_type: Optional[str] = None,
-                    db: Session = None) -> None:
+    async def get_compliments_page(self,
+                                   telegram_user_id: int,
+                                   db: AsyncSession,
+                                   limit: int = settings.HISTORY_PAGE_SIZE,
+                                   older_than: Optional[HistoryCursor] = None,
+                                   newer_than: Optional[HistoryCursor] = None) -> ComplimentPage:
+        """
+        Получает страницу комплиментов бота (keyset-пагинация по (created_at, id))
+        
+        Запрос читает только комплименты по частичному индексу
+        ix_messages_user_id_bot_created_at и не зависит от номера страницы.
+        
+        Args:
+            telegram_user_id: ID пользователя в Telegram
+            db: сессия базы данных
+            limit: комплиментов на странице
+            older_than: курсор — страница комплиментов старше него
+            newer_than: курсор — страница комплиментов новее него
+        
+        Returns:
+            Комплименты от новых к старым и курсоры соседних страниц
+        """
+        columns = (Message.id, Message.text, Message.compliment_type, Message.created_at)
+        query = (
+            select(*columns)
+            .join(User, Message.user_id == User.id)
+            .where(User.telegram_id == telegram_user_id, Message.is_bot == True)  # noqa: E712
+        )
+        if newer_than is not None:
+            # Ближайшие более новые: по возрастанию, затем разворачиваем
+            query = query.where(Message.created_at >= newer_than.created_at, or_(
+                Message.created_at > newer_than.created_at,
+                and_(Message.created_at == newer_than.created_at, Message.id > newer_than.id),
+            )).order_by(Message.created_at.asc(), Message.id.asc())
+        else:
+            if older_than is not None:
+                query = query.where(Message.created_at <= older_than.created_at, or_(
+                    Message.created_at < older_than.created_at,
+                    and_(Message.created_at == older_than.created_at, Message.id < older_than.id),
+                ))
+            query = query.order_by(Message.created_at.desc(), Message.id.desc())
+        
+        # Лишняя строка показывает, есть ли страница дальше
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newer_than is not None:
+            rows.reverse()
+        
+        compliments = [HistoryMessage(row.text, True, row.compliment_type, row.created_at) for row in rows]
+        if not rows:
+            return ComplimentPage(compliments, None, None)
+        first = HistoryCursor(rows[0].created_at, rows[0].id)
+        last = HistoryCursor(rows[-1].created_at, rows[-1].id)
+        if newer_than is not None:
+            return ComplimentPage(compliments, last, first if has_more else None)
+        return ComplimentPage(compliments, last if has_more else None, first if older_than is not None else None)
+    
+    def with_pending_message(self, history: List[HistoryMessage], message_text: str) -> List[HistoryMessage]:
+        """Добавляет к истории ещё не сохранённое сообщение пользователя"""
+        pending = HistoryMessage(message_text, False, None, datetime.utcnow())
+        return (history + [pending])[-self.max_history_size:]
+    
+    async def save_message(self, 
+                          telegram_user_id: int,
+                          message_text: str,
+                          is_bot: bool = False,
+                          compliment_type: Optional[str] = None,
+                          db: Optional[AsyncSession] = None,
+                          type_chosen: bool = False) -> None:
         """
         Сохраняет сообщение в базу данных
         
@@ -61,70 +209,208 @@ class ContextManager:
             is_bot: флаг, является ли отправитель ботом
             compliment_type: тип комплимента (если есть)
             db: сессия базы данных (если None, создаст новую)
+            type_chosen: тип выбран пользователем кнопкой (метка для обучения)
+        """
+        await self._save_messages(telegram_user_id, [(message_text, is_bot, compliment_type, type_chosen)], db)
+    
+    async def save_exchange(self,
+                           telegram_user_id: int,
+                           user_text: str,
+                           bot_text: str,
+                           compliment_type: Optional[str] = None,
+                           db: Optional[AsyncSession] = None) -> None:
+        """
+        Сохраняет сообщение пользователя и ответ бота одной транзакцией
+        
+        Args:
+            telegram_user_id: ID пользователя в Telegram
+            user_text: сообщение пользователя
+            bot_text: ответ бота
+            compliment_type: тип комплимента в ответе
+            db: сессия базы данных (если None, создаст новую)
         """
+        await self._save_messages(
+            telegram_user_id,
+            [(user_text, False, None, False), (bot_text, True, compliment_type, False)],
+            db
+        )
+    
+    async def _save_messages(self,
+                             telegram_user_id: int,
+                             rows: List[MessageRow],
+                             db: Optional[AsyncSession]) -> None:
+        if settings.DEDUP_ENABLED:
+            for message_text, is_bot, *_ in rows:
+                if is_bot:
+                    served_index.remember(telegram_user_id, message_text)
         try:
-            if db is None:
-                with get_db() as db_session:
-                    self._save_message_internal(
-                        telegram_user_id, message_text, is_bot, compliment_type, db_session
-                    )
+            if self.writer.running:
+                await self._enqueue_messages(telegram_user_id, rows)
+            elif db is None:
+                async with get_db() as db_session:
+                    await self._save_messages_internal(telegram_user_id, rows, db_session)
             else:
-                self._save_message_internal(
-                    telegram_user_id, message_text, is_bot, compliment_type, db
-                )
+                await self._save_messages_internal(telegram_user_id, rows, db)
                 
         except Exception as e:
             logger.error(f"Ошибка при сохранении сообщения: {e}")
+            if db is not None:
+                await db.rollback()
     
-    def _save_message_internal(self,
-                              telegram_user_id: int,
-                              message_text: str,
-                              is_bot: bool,
-                              compliment_type: Optional[str],
-                              db: Session) -> None:
-        """Внутренний метод сохранения сообщения"""
-        # Находим или создаем пользователя
-        user = db.query(User).filter(User.telegram_id == telegram_user_id).first()
-        if not user:
-            user = User(telegram_id=telegram_user_id)
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        
-        # Сохраняем сообщение
-        message = Message(
-            user_id=user.id,
-            text=message_text,
-            is_bot=is_bot,
-            compliment_type=compliment_type
-        )
-        db.add(message)
-        db.commit()
+    async def _save_messages_internal(self,
+                                      telegram_user_id: int,
+                                      rows: List[MessageRow],
+                                      db: AsyncSession) -> None:
+        """Внутренний метод сохранения сообщений (один commit на все строки)"""
+        resolved: Dict[int, int] = {}
+        user_id = await self._get_user_id(telegram_user_id, db, resolved)
+        
+        messages = [
+            Message(
+                user_id=user_id,
+                text=message_text,
+                is_bot=is_bot,
+                compliment_type=compliment_type,
+                type_chosen=type_chosen
+            )
+            for message_text, is_bot, compliment_type, type_chosen in rows
+        ]
+        db.add_all(messages)
+        await db.commit()
+        self._cache_user_ids(resolved)
+        
+        self._write_seq += 1
+        cached = self._history_cache.get(telegram_user_id)
+        if cached is not None:
+            cached.extend(HistoryMessage.from_model(message) for message in messages)
+        
+        debug_sampled("Сохранено сообщений: {} для user_id={}", len(messages), telegram_user_id)
+    
+    async def _enqueue_messages(self,
+                                telegram_user_id: int,
+                                rows: List[MessageRow]) -> None:
+        """Ставит сообщения в очередь записи; история в памяти обновляется сразу"""
+        items = [
+            await self.writer.enqueue(telegram_user_id, message_text, is_bot, compliment_type, type_chosen)
+            for message_text, is_bot, compliment_type, type_chosen in rows
+        ]
         
-        logger.debug(f"Сохранено сообщение от {'бота' if is_bot else 'пользователя'} для user_id={telegram_user_id}")
+        cached = self._history_cache.get(telegram_user_id)
+        if cached is not None:
+            cached.extend(HistoryMessage.from_pending(item) for item in items)
     
-    def cleanup_old_messages(self, db: Session, days_to_keep: int = 30):
+    async def _flush_pending(self, items: List[PendingMessage]) -> None:
+        """Записывает пачку сообщений из очереди одним INSERT и одним commit"""
+        resolved: Dict[int, int] = {}
+        async with get_db() as db:
+            values = []
+            for item in items:
+                values.append({
+                    "user_id": await self._get_user_id(item.telegram_user_id, db, resolved),
+                    "text": item.text,
+                    "is_bot": item.is_bot,
+                    "compliment_type": item.compliment_type,
+                    "type_chosen": item.type_chosen,
+                    "created_at": item.created_at,
+                })
+            await db.execute(insert(Message), values)
+            await db.commit()
+        self._cache_user_ids(resolved)
+        
+        logger.debug("Записана пачка из {} сообщений", len(items))
+    
+    async def _get_user_id(self,
+                           telegram_user_id: int,
+                           db: AsyncSession,
+                           resolved: Dict[int, int]) -> int:
         """
-        Очищает старые сообщения из базы данных
+        Возвращает users.id по telegram_id, создавая пользователя при необходимости
+        
+        Соответствие кэшируется, поэтому для известных пользователей запросов нет.
+        Новый пользователь вставляется через INSERT ... ON CONFLICT DO NOTHING
+        в той же транзакции, что и его сообщение.
         
         Args:
+            telegram_user_id: ID пользователя в Telegram
             db: сессия базы данных
-            days_to_keep: сколько дней хранить сообщения
+            resolved: найденные в этой транзакции id; в кэш они попадают
+                только после commit (_cache_user_ids) — при откате SQLite
+                отдаст тот же rowid следующему новому пользователю
         """
-        try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-            
-            # Удаляем старые сообщения
-            deleted_count = db.query(Message)\
-                .filter(Message.created_at < cutoff_date)\
-                .delete()
-            
-            db.commit()
-            logger.info(f"Удалено {deleted_count} старых сообщений (старше {days_to_keep} дней)")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при очистке старых сообщений: {e}")
-            db.rollback()
+        user_id = self._user_ids.get(telegram_user_id)
+        if user_id is not None:
+            self._user_ids.move_to_end(telegram_user_id)
+            return user_id
+        user_id = resolved.get(telegram_user_id)
+        if user_id is not None:
+            return user_id
+        
+        query = select(User.id).where(User.telegram_id == telegram_user_id)
+        user_id = (await db.execute(query)).scalar()
+        if user_id is None:
+            await db.execute(
+                sqlite_insert(User)
+                .values(telegram_id=telegram_user_id, created_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            )
+            user_id = (await db.execute(query)).scalar_one()
+        
+        resolved[telegram_user_id] = user_id
+        return user_id
+    
+    def _cache_user_ids(self, resolved: Dict[int, int]):
+        """Кэширует id пользователей из успешно закоммиченной транзакции"""
+        for telegram_user_id, user_id in resolved.items():
+            self._user_ids[telegram_user_id] = user_id
+            self._user_ids.move_to_end(telegram_user_id)
+        while len(self._user_ids) > self.max_cached_users:
+            self._user_ids.popitem(last=False)
+    
+    def _cache_history(self, telegram_user_id: int, history: List[HistoryMessage]):
+        """Кладёт историю в кэш, вытесняя давно неактивных пользователей"""
+        self._history_cache[telegram_user_id] = deque(history, maxlen=self.max_history_size)
+        self._history_cache.move_to_end(telegram_user_id)
+        while len(self._history_cache) > self.max_cached_users:
+            self._history_cache.popitem(last=False)
+    
+    def invalidate(self, telegram_user_id: Optional[int] = None):
+        """
+        Сбрасывает кэш истории
+        
+        Args:
+            telegram_user_id: пользователь; None — сбросить для всех
+        """
+        self._write_seq += 1
+        if telegram_user_id is None:
+            self._history_cache.clear()
+        else:
+            self._history_cache.pop(telegram_user_id, None)
+    
+    async def clear_history(self, telegram_user_id: int, db: AsyncSession) -> Optional[int]:
+        """
+        Удаляет все сообщения пользователя
+        
+        Args:
+            telegram_user_id: ID пользователя в Telegram
+            db: сессия базы данных
+        
+        Returns:
+            Количество удалённых сообщений или None, если пользователь не найден
+        """
+        # Сообщения из очереди иначе запишутся уже после удаления
+        await self.writer.drain()
+        
+        user_id = self._user_ids.get(telegram_user_id)
+        if user_id is None:
+            result = await db.execute(select(User.id).where(User.telegram_id == telegram_user_id))
+            user_id = result.scalar()
+        if user_id is None:
+            return None
+        
+        result = await db.execute(delete(Message).where(Message.user_id == user_id))
+        await db.commit()
+        self.invalidate(telegram_user_id)
+        return result.rowcount
 
 # Глобальный экземпляр менеджера контекста
 context_manager = ContextManager()
@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from config.settings import settings
+
+
+class FairScheduler:
+    """
+    Взвешенная справедливая очередь на слоты генерации
+
+    Одновременно выполняется не больше capacity генераций. Ожидающие
+    запросы обслуживаются по виртуальному времени окончания (WFQ): каждая
+    генерация сдвигает метку пользователя на 1/weight, поэтому тот, кто
+    недавно генерировал много, встаёт в очередь позади редких
+    пользователей. Метка простаивающего пользователя догоняет общее
+    виртуальное время, так что прошлые запросы не копятся бесконечно.
+    """
+
+    def __init__(self, capacity: int = settings.GENERATION_MAX_CONCURRENCY):
+        self.capacity = capacity
+        self.active = 0
+        self._vtime = 0.0
+        self._finish: Dict[int, float] = {}
+        self._queue: List[Tuple[float, int, asyncio.Future]] = []
+        self._seq = 0
+
+        # Метрики
+        self.granted = 0
+        self.queued = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, weight: float = 1.0) -> AsyncIterator[None]:
+        """Занимает слот генерации на время блока"""
+        await self.acquire(user_id, weight)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, user_id: int, weight: float = 1.0):
+        tag = max(self._vtime, self._finish.get(user_id, 0.0)) + 1.0 / weight
+        self._finish[user_id] = tag
+        self._prune()
+
+        if self.active < self.capacity and not self._queue:
+            self._grant(tag)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._queue, (tag, self._seq, future))
+        self.queued += 1
+        started = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Слот мог быть выдан одновременно с отменой — возвращаем его
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        wait = time.monotonic() - started
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self):
+        self.active -= 1
+        while self._queue:
+            tag, _, future = heapq.heappop(self._queue)
+            if future.cancelled():
+                continue
+            self._grant(tag)
+            future.set_result(None)
+            break
+
+    def _grant(self, tag: float):
+        self.active += 1
+        self.granted += 1
+        self._vtime = max(self._vtime, tag)
+
+    def _prune(self):
+        # Метки, отставшие от виртуального времени, ничего не меняют
+        if len(self._finish) > 10000:
+            self._finish = {user_id: tag for user_id, tag in self._finish.items() if tag > self._vtime}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика очереди: занятые слоты, ожидающие, время ожидания"""
+        return {
+            'capacity': self.capacity,
+            'active': self.active,
+            'waiting': sum(1 for _, _, future in self._queue if not future.cancelled()),
+            'granted': self.granted,
+            'queued': self.queued,
+            'avg_wait': round(self.total_wait / self.queued, 3) if self.queued else 0.0,
+            'max_wait': round(self.max_wait, 3),
+        }
+
+
+# Глобальный экземпляр
+generation_scheduler = FairScheduler()
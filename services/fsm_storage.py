@@ -0,0 +1,166 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import DEFAULT_DESTINY, BaseStorage, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config.settings import settings
+from database.models import FSMRecord, get_db
+
+
+class _Entry:
+    """Состояние и данные чата в кэше"""
+
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self, state: Optional[str], data: Optional[Dict[str, Any]], expires_at: float):
+        self.state = state
+        # None вместо пустого словаря, чтобы пустые записи занимали меньше памяти
+        self.data = data
+        self.expires_at = expires_at
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище: ограниченный LRU-кэш в памяти поверх таблицы fsm_states
+
+    Состояние чата загружается из SQLite по первичному ключу при первом
+    обращении и остаётся в кэше, пока к нему обращаются чаще, чем раз в ttl
+    секунд; самые старые записи вытесняются при превышении max_entries.
+    Отсутствие строки тоже кэшируется (пустой записью), поэтому активные
+    чаты без состояния не ходят в базу на каждый апдейт, а память
+    ограничена max_entries (предполагается, что таблицу пишет один процесс
+    бота). Запись сквозная: set_state и set_data сразу сохраняются, а пустые
+    состояние и данные удаляют строку.
+    """
+
+    def __init__(self,
+                 max_entries: int = settings.FSM_CACHE_MAX_ENTRIES,
+                 ttl: float = settings.FSM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        """Компактный ключ: bot_id:chat_id:user_id[:thread_id][:business_connection_id][:destiny]"""
+        parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+        if key.thread_id or key.business_connection_id or key.destiny != DEFAULT_DESTINY:
+            parts.append(str(key.thread_id or ""))
+        if key.business_connection_id or key.destiny != DEFAULT_DESTINY:
+            parts.append(key.business_connection_id or "")
+        if key.destiny != DEFAULT_DESTINY:
+            parts.append(key.destiny)
+        return ":".join(parts)
+
+    async def _entry(self, key: str) -> _Entry:
+        """Запись из кэша или из базы (с продлением TTL)"""
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None and entry.expires_at > now:
+            self._cache.move_to_end(key)
+            entry.expires_at = now + self.ttl
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        async with get_db() as db:
+            row = (await db.execute(
+                select(FSMRecord.state, FSMRecord.data).where(FSMRecord.key == key)
+            )).first()
+        if row is None:
+            entry = _Entry(None, None, now + self.ttl)
+        else:
+            entry = _Entry(row.state, json.loads(row.data) if row.data else None, now + self.ttl)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: _Entry):
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        # Порядок LRU совпадает с порядком истечения TTL: устаревшие записи в начале
+        now = time.monotonic()
+        while self._cache:
+            oldest = next(iter(self._cache.values()))
+            if oldest.expires_at > now:
+                break
+            self._cache.popitem(last=False)
+            self.expired += 1
+
+    async def _save(self, key: str, entry: _Entry):
+        """Сохраняет запись в базу и кэш (пустая запись удаляет строку)"""
+        if entry.state is None and not entry.data:
+            async with get_db() as db:
+                await db.execute(delete(FSMRecord).where(FSMRecord.key == key))
+                await db.commit()
+            self.writes += 1
+            # Строки больше нет — запоминаем это, чтобы не искать её снова
+            self._remember(key, _Entry(None, None, time.monotonic() + self.ttl))
+            return
+
+        data = json.dumps(entry.data, ensure_ascii=False, separators=(",", ":")) if entry.data else None
+        updated_at = datetime.utcnow()
+        async with get_db() as db:
+            await db.execute(
+                sqlite_insert(FSMRecord)
+                .values(key=key, state=entry.state, data=data, updated_at=updated_at)
+                .on_conflict_do_update(
+                    index_elements=[FSMRecord.key],
+                    set_={"state": entry.state, "data": data, "updated_at": updated_at},
+                )
+            )
+            await db.commit()
+        self.writes += 1
+        entry.expires_at = time.monotonic() + self.ttl
+        self._remember(key, entry)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key(key)
+        entry = await self._entry(storage_key)
+        new_state = state.state if isinstance(state, State) else state
+        if new_state == entry.state:
+            return
+        await self._save(storage_key, _Entry(new_state, entry.data, 0))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self._key(key)
+        entry = await self._entry(storage_key)
+        new_data = dict(data) or None
+        if new_data == entry.data:
+            return
+        await self._save(storage_key, _Entry(entry.state, new_data, 0))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = (await self._entry(self._key(key))).data
+        return dict(data) if data else {}
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша FSM: записи в памяти, попадания, загрузки, записи в базу"""
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
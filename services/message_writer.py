@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Deque, List, Optional
+from loguru import logger
+
+from config.settings import settings
+
+
+class PendingMessage:
+    """Сообщение, ожидающее записи в базу данных"""
+    
+    __slots__ = ("seq", "telegram_user_id", "text", "is_bot", "compliment_type", "created_at", "type_chosen")
+    
+    def __init__(self,
+                 seq: int,
+                 telegram_user_id: int,
+                 text: str,
+                 is_bot: bool,
+                 compliment_type: Optional[str],
+                 created_at: datetime,
+                 type_chosen: bool = False):
+        self.seq = seq
+        self.telegram_user_id = telegram_user_id
+        self.text = text
+        self.is_bot = is_bot
+        self.compliment_type = compliment_type
+        self.created_at = created_at
+        self.type_chosen = type_chosen
+    
+    def to_json(self) -> str:
+        return json.dumps({
+            "seq": self.seq,
+            "telegram_user_id": self.telegram_user_id,
+            "text": self.text,
+            "is_bot": self.is_bot,
+            "compliment_type": self.compliment_type,
+            "created_at": self.created_at.isoformat(),
+            "type_chosen": self.type_chosen,
+        }, ensure_ascii=False)
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> "PendingMessage":
+        return cls(
+            data["seq"], data["telegram_user_id"], data["text"], data["is_bot"],
+            data["compliment_type"], datetime.fromisoformat(data["created_at"]),
+            data.get("type_chosen", False)
+        )
+
+
+FlushCallback = Callable[[List[PendingMessage]], Awaitable[None]]
+
+
+class MessageWriter:
+    """
+    Очередь отложенной записи сообщений (write-behind)
+    
+    Обработчики кладут сообщения в очередь, единственный фоновый писатель
+    сбрасывает их пачками по размеру (MESSAGE_BATCH_SIZE) или по времени
+    (MESSAGE_FLUSH_INTERVAL). Переполненная очередь притормаживает
+    обработчики. При включённом журнале каждое сообщение сначала
+    дописывается в локальный файл и после падения восстанавливается из него.
+    Пачка, которую не удалось записать, остаётся в журнале до рестарта.
+    
+    Запись в журнал сбрасывается в ОС сразу (переживает падение процесса),
+    а fsync выполняется один раз на пачку перед записью в базу: при
+    отключении питания могут потеряться сообщения, пришедшие за последний
+    MESSAGE_FLUSH_INTERVAL.
+    """
+    
+    def __init__(self,
+                 flush_callback: FlushCallback,
+                 max_size: int = settings.MESSAGE_QUEUE_MAX_SIZE,
+                 batch_size: int = settings.MESSAGE_BATCH_SIZE,
+                 flush_interval: float = settings.MESSAGE_FLUSH_INTERVAL,
+                 journal_path: Optional[str] = settings.MESSAGE_JOURNAL_PATH or None):
+        self.flush_callback = flush_callback
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal_path = Path(journal_path) if journal_path else None
+        
+        self._queue: Optional[asyncio.Queue] = None
+        # Все ещё не записанные сообщения (в очереди и в текущей пачке), по порядку
+        self._unflushed: Deque[PendingMessage] = deque()
+        self._journal = None
+        self._task: Optional[asyncio.Task] = None
+        self._seq = 0
+        # Пачки, не записанные после всех попыток (счётчик): после первой такой
+        # пачки журнал не обнуляется до рестарта, когда её допишет восстановление
+        self.failed_batches = 0
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.failed_messages = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    @property
+    def depth(self) -> int:
+        """Сколько сообщений ещё не записано"""
+        return len(self._unflushed)
+    
+    async def start(self):
+        """Восстанавливает сообщения из журнала и запускает фоновый писатель"""
+        if self.running:
+            return
+        
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        if self.journal_path is not None:
+            await self._recover_journal()
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Очередь записи сообщений запущена | пачка: {self.batch_size} | "
+            f"интервал: {self.flush_interval}s | журнал: {self.journal_path or 'выключен'}"
+        )
+    
+    async def stop(self):
+        """Дожидается записи всех сообщений из очереди и останавливает писатель"""
+        if not self.running:
+            return
+        
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        logger.info(f"Очередь записи сообщений остановлена, записано: {self.flushed_messages}")
+    
+    async def enqueue(self,
+                      telegram_user_id: int,
+                      text: str,
+                      is_bot: bool,
+                      compliment_type: Optional[str] = None,
+                      type_chosen: bool = False) -> PendingMessage:
+        """
+        Ставит сообщение в очередь на запись
+        
+        Если очередь заполнена, ждёт освобождения места (backpressure).
+        """
+        self._seq += 1
+        item = PendingMessage(
+            self._seq, telegram_user_id, text, is_bot, compliment_type, datetime.utcnow(), type_chosen
+        )
+        
+        if self._journal is not None:
+            self._journal.write(item.to_json() + "\n")
+            self._journal.flush()
+        
+        if self._queue.full():
+            logger.warning(f"Очередь записи заполнена ({self.max_size}), обработчик ждёт")
+        self._unflushed.append(item)
+        await self._queue.put(item)
+        return item
+    
+    async def drain(self):
+        """Ждёт, пока все поставленные в очередь сообщения будут записаны"""
+        if self.running:
+            await self._queue.join()
+    
+    def pending_for(self, telegram_user_id: int) -> List[PendingMessage]:
+        """Ещё не записанные сообщения пользователя"""
+        return [item for item in self._unflushed if item.telegram_user_id == telegram_user_id]
+    
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._flush(batch)
+            for _ in batch:
+                self._queue.task_done()
+    
+    async def _flush(self, batch: List[PendingMessage]):
+        await self._sync_journal()
+        written = False
+        for attempt in range(1, 4):
+            try:
+                await self.flush_callback(batch)
+                written = True
+                break
+            except Exception as e:
+                logger.error(f"Ошибка записи пачки сообщений (попытка {attempt}): {e}")
+                await asyncio.sleep(attempt)
+        
+        for _ in batch:
+            self._unflushed.popleft()
+        self.flushes += 1
+        if written:
+            self.flushed_messages += len(batch)
+            self._checkpoint_journal(batch[0].seq, batch[-1].seq)
+        else:
+            self.failed_batches += 1
+            self.failed_messages += len(batch)
+            where = "остаётся в журнале" if self._journal is not None else "отброшена (журнал выключен)"
+            logger.error(f"Пачка из {len(batch)} сообщений не записана и {where}")
+    
+    def _checkpoint_journal(self, first_seq: int, last_seq: int):
+        """
+        Отмечает в журнале записанную пачку
+        
+        Пачка — непрерывный диапазон seq (очередь FIFO), поэтому отметка
+        хранит диапазон: не записанные пачки между записанными так и
+        останутся в журнале. Журнал обнуляется, только когда записано всё.
+        """
+        if self._journal is None:
+            return
+        if not self._unflushed and not self.failed_batches:
+            self._journal.truncate(0)
+            self._journal.seek(0)
+        else:
+            self._journal.write(json.dumps({"flushed": last_seq, "from": first_seq}) + "\n")
+        self._journal.flush()
+    
+    async def _sync_journal(self):
+        """fsync журнала: дописанные с прошлой пачки сообщения переживают отключение питания"""
+        if self._journal is None:
+            return
+        try:
+            await asyncio.to_thread(os.fsync, self._journal.fileno())
+        except OSError as e:
+            logger.warning(f"Не удалось выполнить fsync журнала сообщений: {e}")
+    
+    async def _recover_journal(self):
+        """
+        Записывает сообщения, оставшиеся в журнале после аварийной остановки
+        
+        Если записать их не удалось, журнал откладывается в сторону
+        (<journal>.failed-<время>) для ручного разбора, а бот запускается
+        с пустым журналом.
+        """
+        try:
+            lines = self.journal_path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return
+        
+        try:
+            flushed = []
+            entries = []
+            for line in lines:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue  # недописанная строка в момент падения
+                if "flushed" in data:
+                    flushed.append((data["from"], data["flushed"]))
+                else:
+                    entries.append(data)
+            
+            pending = [
+                PendingMessage.from_dict(data) for data in entries
+                if not any(first <= data["seq"] <= last for first, last in flushed)
+            ]
+            if pending:
+                logger.warning(f"Восстанавливаю из журнала {len(pending)} незаписанных сообщений")
+                await self.flush_callback(pending)
+        except Exception as e:
+            quarantine = self.journal_path.with_name(
+                f"{self.journal_path.name}.failed-{datetime.utcnow():%Y%m%d%H%M%S}"
+            )
+            logger.error(f"Не удалось восстановить сообщения из журнала: {e}; журнал перенесён в {quarantine}")
+            try:
+                self.journal_path.replace(quarantine)
+            except OSError as move_error:
+                logger.error(f"Не удалось перенести журнал {self.journal_path}: {move_error}")
+            return
+        self.journal_path.write_text("", encoding="utf-8")
@@ -0,0 +1,287 @@
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from aiohttp import web
+from loguru import logger
+
+from config.settings import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Labels) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик"""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами корзин"""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: счётчики корзин (+Inf последней), сумма
+        self._values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Замеряет длительность блока"""
+        if not self.registry.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class _Collector(_Metric):
+    """Метрика, значения которой читаются при каждом запросе /metrics"""
+
+    def __init__(self, registry, name, documentation, kind: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(registry, name, documentation)
+        self.kind = kind
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        try:
+            return [f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+                    for labels, value in self.collect()]
+        except Exception as e:
+            logger.debug(f"Не удалось собрать метрику {self.name}: {e}")
+            return []
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик в текстовом формате Prometheus
+
+    Пока метрики выключены, inc/observe/time сразу возвращаются, а
+    middleware, слушатели SQLAlchemy и замер задержки event loop не
+    подключаются, так что накладные расходы почти нулевые.
+    """
+
+    def __init__(self, enabled: bool = settings.METRICS_ENABLED, prefix: str = "olya"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, f"{self.prefix}_{name}", documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, f"{self.prefix}_{name}", documentation, labelnames, buckets=buckets))
+
+    def collector(self, name: str, documentation: str, collect: Callable[[], Iterable[Sample]],
+                  kind: str = "gauge"):
+        """Регистрирует метрику, которая вычисляется при чтении"""
+        self._metrics.pop(f"{self.prefix}_{name}", None)
+        self._register(_Collector(self, f"{self.prefix}_{name}", documentation, kind, collect))
+
+    def register_stats(self, name: str, get_stats: Callable[[], Dict[str, Any]],
+                       counters: Sequence[str] = ()):
+        """
+        Публикует числовые поля get_stats() как метрики
+
+        Args:
+            name: префикс метрик компонента
+            get_stats: метод get_stats() компонента
+            counters: поля, которые только растут (публикуются как *_total)
+        """
+        def field(key: str) -> Callable[[], Iterable[Sample]]:
+            def collect():
+                value = get_stats().get(key)
+                return [({}, value)] if isinstance(value, (int, float)) and not isinstance(value, bool) else []
+            return collect
+
+        for key, value in get_stats().items():
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+            if key in counters:
+                self.collector(f"{name}_{key}_total", f"{name}: {key}", field(key), kind="counter")
+            else:
+                self.collector(f"{name}_{key}", f"{name}: {key}", field(key))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            samples = metric.render()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр и метрики горячих путей
+metrics = MetricsRegistry()
+
+handler_latency = metrics.histogram(
+    "handler_seconds", "Время обработки апдейта обработчиком", ("router", "event", "status")
+)
+provider_latency = metrics.histogram(
+    "provider_seconds", "Время ответа AI провайдера", ("provider", "model", "status")
+)
+provider_errors = metrics.counter(
+    "provider_errors_total", "Ошибки AI провайдеров", ("provider", "model")
+)
+provider_tokens = metrics.counter(
+    "provider_tokens_total", "Токены, израсходованные AI провайдерами", ("provider", "model", "kind")
+)
+db_query_latency = metrics.histogram(
+    "db_query_seconds", "Время выполнения SQL запроса", ("engine", "statement"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "Опоздание пробуждения таймеров event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+
+def instrument_engine(engine, name: str):
+    """Замеряет время SQL запросов на движке (AsyncEngine или Engine)"""
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # Соединение выполняет один запрос за раз, поэтому хватает одного времени
+    # старта: если запрос упал (after_cursor_execute не вызван), следующий
+    # before_cursor_execute его просто перезапишет
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("query_started", None)
+        if started is None:
+            return
+        statement_type = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+        db_query_latency.observe(time.perf_counter() - started, engine=name, statement=statement_type)
+
+
+class MetricsServer:
+    """Локальный HTTP сервер с эндпоинтом /metrics и замером задержки event loop"""
+
+    def __init__(self, registry: MetricsRegistry = metrics,
+                 lag_interval: float = settings.METRICS_LOOP_LAG_INTERVAL):
+        self.registry = registry
+        self.lag_interval = lag_interval
+        self._runner: Optional[web.AppRunner] = None
+        self._lag_task: Optional[asyncio.Task] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def _measure_lag(self):
+        while True:
+            expected = time.perf_counter() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            loop_lag.observe(max(0.0, time.perf_counter() - expected))
+
+    async def start(self, host: str = settings.METRICS_HOST, port: int = settings.METRICS_PORT):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._lag_task = asyncio.create_task(self._measure_lag())
+        logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
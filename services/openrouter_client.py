@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Optional
+import httpx
+from openai import AsyncOpenAI
+from loguru import logger
+
+from config.settings import settings
+
+
+class OpenRouterClient:
+    """Общий асинхронный клиент OpenRouter с пулом keep-alive соединений"""
+    
+    def __init__(self):
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.max_concurrency = settings.OPENROUTER_MAX_CONCURRENCY
+        self.timeout = settings.OPENROUTER_TIMEOUT
+    
+    def _create_client(self) -> AsyncOpenAI:
+        """Создает AsyncOpenAI поверх ограниченного пула httpx"""
+        timeout = httpx.Timeout(self.timeout, connect=settings.OPENROUTER_CONNECT_TIMEOUT)
+        http_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=settings.OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENROUTER_MAX_KEEPALIVE,
+                keepalive_expiry=settings.OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+        )
+        logger.info(
+            f"OpenRouter клиент создан | соединений: {settings.OPENROUTER_MAX_CONNECTIONS} | "
+            f"параллельных запросов: {self.max_concurrency} | таймаут: {self.timeout}s"
+        )
+        return AsyncOpenAI(
+            base_url=settings.OPENROUTER_BASE_URL,
+            api_key=settings.OPENROUTER_API_KEY,
+            default_headers={
+                "HTTP-Referer": "https://github.com/your-username/olya-bot",
+                "X-Title": "Olya Compliments Bot",
+            },
+            timeout=timeout,
+            max_retries=settings.OPENROUTER_MAX_RETRIES,
+            http_client=http_client,
+        )
+    
+    @property
+    def client(self) -> AsyncOpenAI:
+        """Клиент создается при первом обращении, уже внутри event loop"""
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+    
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+    
+    async def chat_completion(self, **kwargs) -> Any:
+        """
+        Выполняет запрос chat completions с ограничением параллельности
+        
+        Args:
+            **kwargs: параметры chat.completions.create
+            
+        Returns:
+            Ответ OpenRouter
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        async with self.semaphore:
+            return await self.client.chat.completions.create(**kwargs)
+    
+    async def stream_chat_completion(self, **kwargs) -> AsyncIterator[str]:
+        """
+        Потоковый запрос chat completions
+        
+        Args:
+            **kwargs: параметры chat.completions.create
+            
+        Yields:
+            Фрагменты текста ответа по мере генерации
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        async with self.semaphore:
+            stream = await self.client.chat.completions.create(stream=True, **kwargs)
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Прерванный поток закрываем сразу, чтобы соединение вернулось в пул
+                await stream.response.aclose()
+    
+    async def list_models(self) -> List[str]:
+        """Возвращает идентификаторы доступных моделей"""
+        async with self.semaphore:
+            models = await self.client.models.list()
+        return [model.id for model in models.data]
+    
+    async def get_models(self) -> List[str]:
+        """
+        Возвращает каталог моделей, используя кэш на диске
+        
+        Кэш живёт OPENROUTER_MODELS_CACHE_TTL секунд и привязан к base URL,
+        так что рестарт бота не требует повторного запроса каталога.
+        """
+        cached = await asyncio.to_thread(self._read_models_cache)
+        if cached is not None:
+            logger.debug(f"Каталог моделей OpenRouter загружен из кэша ({len(cached)} моделей)")
+            return cached
+        
+        models = await self.list_models()
+        await asyncio.to_thread(self._write_models_cache, models)
+        return models
+    
+    def _read_models_cache(self) -> Optional[List[str]]:
+        path = Path(settings.OPENROUTER_MODELS_CACHE)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        
+        if (data.get("base_url") != settings.OPENROUTER_BASE_URL or
+                time.time() - data.get("fetched_at", 0) > settings.OPENROUTER_MODELS_CACHE_TTL):
+            return None
+        return data.get("models")
+    
+    def _write_models_cache(self, models: List[str]):
+        path = Path(settings.OPENROUTER_MODELS_CACHE)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps({
+                "base_url": settings.OPENROUTER_BASE_URL,
+                "fetched_at": time.time(),
+                "models": models,
+            }), encoding="utf-8")
+            tmp_path.replace(path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш моделей OpenRouter: {e}")
+    
+    async def close(self):
+        """Закрывает пул соединений"""
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+            logger.info("OpenRouter клиент закрыт")
+
+
+# Глобальный экземпляр
+openrouter_client = OpenRouterClient()
@@ -1,9 +1,38 @@
-import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import asyncio
+from typing import List, Dict, Optional
 from loguru import logger
 
 from config.settings import settings
+from services.context_manager import HistoryMessage
+from services.openrouter_client import openrouter_client
+from services.prompt_builder import PromptBuilder
+
+SYSTEM_PROMPT = """Ты - бот, который делает искренние, персонализированные комплименты девушке по имени Оля.
+
+Твоя задача:
+1. Создавать уникальные комплименты, учитывая контекст разговора
+2. Быть искренним, теплым и дружелюбным
+3. Делать комплименты конкретными, избегая общих фраз
+4. Использовать имя "Оля" в каждом комплименте
+5. Делать комплименты не слишком длинными (1-3 предложения)
+
+Примеры хороших комплиментов:
+- "Оля, сегодня твоя улыбка особенно лучезарна! Заметил, как она поднимает настроение всем вокруг."
+- "Мне очень нравится, как ты поддерживаешь друзей, Оля. Твоя эмпатия - редкое качество!"
+- "Оля, твои успехи в работе впечатляют! Видно, как много усилий ты вкладываешь."
+
+Примеры ПЛОХИХ комплиментов (не делай так):
+- "Ты красивая." (слишком общее)
+- "У тебя хороший характер." (не конкретно)
+- Комплимент без упоминания имени Оля."""
+
+# Специфика типа комплимента
+TYPE_PROMPTS = {
+    "appearance": "\n\nСейчас сделай комплимент о внешности Оли. Обрати внимание на детали, но будь тактичным.",
+    "character": "\n\nСейчас сделай комплимент о характере Оли. Отметь её внутренние качества.",
+    "achievements": "\n\nСейчас сделай комплимент о достижениях Оли. Подчеркни её успехи и усилия.",
+}
+
 
 class OpenRouterGenerator:
     """Генератор комплиментов с использованием OpenRouter API"""
@@ -11,41 +40,36 @@ class OpenRouterGenerator:
     def __init__(self):
         self.client = None
         self.use_openrouter = bool(settings.OPENROUTER_API_KEY)
+        self.available_models: Optional[List[str]] = None
+        self._models_lock = asyncio.Lock()
+        # Максимум 8 реплик истории в пределах бюджета токенов
+        self.prompt_builder = PromptBuilder("openrouter_generator", SYSTEM_PROMPT, TYPE_PROMPTS, max_turns=8)
         
         if self.use_openrouter:
-            try:
-                # OpenRouter совместим с OpenAI SDK, но требует особых заголовков
-                self.client = OpenAI(
-                    base_url=settings.OPENROUTER_BASE_URL,
-                    api_key=settings.OPENROUTER_API_KEY,
-                    default_headers={
-                        "HTTP-Referer": "https://github.com/your-repo",  # Ваш сайт/репозиторий
-                        "X-Title": "Olya Compliments Bot",  # Название вашего приложения
-                    }
-                )
-                logger.info("OpenRouter клиент инициализирован")
-                
-                # Проверяем доступность модели
-                self.available_models = self._get_available_models()
-                
-            except Exception as e:
-                logger.error(f"Ошибка инициализации OpenRouter: {e}")
-                self.use_openrouter = False
+            # Общий асинхронный клиент с пулом соединений
+            self.client = openrouter_client
+            logger.info("OpenRouter клиент инициализирован")
     
-    def _get_available_models(self) -> List[str]:
-        """Получает список доступных моделей"""
-        try:
-            models = self.client.models.list()
-            return [model.id for model in models.data]
-        except Exception as e:
-            logger.warning(f"Не удалось получить список моделей: {e}")
-            # Возвращаем популярные модели по умолчанию
-            return [
-                "openai/gpt-3.5-turbo",
-                "openai/gpt-4",
-                "anthropic/claude-3-haiku",
-                "meta-llama/llama-3-70b-instruct"
-            ]
+    async def _get_available_models(self) -> List[str]:
+        """Получает список доступных моделей (один раз за время жизни процесса)"""
+        if self.available_models is not None:
+            return self.available_models
+        
+        async with self._models_lock:
+            if self.available_models is None:
+                try:
+                    self.available_models = await self.client.get_models()
+                except Exception as e:
+                    logger.warning(f"Не удалось получить список моделей: {e}")
+                    # Возвращаем популярные модели по умолчанию
+                    self.available_models = [
+                        "openai/gpt-3.5-turbo",
+                        "openai/gpt-4",
+                        "anthropic/claude-3-haiku",
+                        "meta-llama/llama-3-70b-instruct"
+                    ]
+        
+        return self.available_models
     
     def _select_best_model(self) -> str:
         """Выбирает лучшую доступную модель"""
@@ -58,7 +82,7 @@ class OpenRouterGenerator:
         ]
         
         for model in preferred_models:
-            if model in self.available_models:
+            if model in (self.available_models or []):
                 return model
         
         # Если ничего не найдено, возвращаем первую доступную
@@ -66,7 +90,7 @@ class OpenRouterGenerator:
     
     async def generate_compliment(self,
                                  message_text: str,
-                                 history: List[Dict[str, Any]],
+                                 history: List[HistoryMessage],
                                  compliment_type: Optional[str] = None) -> str:
         """Генерирует комплимент через OpenRouter"""
         if not self.use_openrouter or not self.client:
@@ -74,13 +98,14 @@ class OpenRouterGenerator:
         
         try:
             # Выбираем модель
+            await self._get_available_models()
             model = self._select_best_model()
             
             # Строим промпт
             messages = self._build_messages(message_text, history, compliment_type)
             
             # Делаем запрос
-            response = self.client.chat.completions.create(
+            response = await self.client.chat_completion(
                 model=model,
                 messages=messages,
                 temperature=0.7,
@@ -106,55 +131,10 @@ class OpenRouterGenerator:
     
     def _build_messages(self,
                        message_text: str,
-                       history: List[Dict[str, Any]],
+                       history: List[HistoryMessage],
                        compliment_type: Optional[str] = None) -> List[Dict[str, str]]:
-        """Строит список сообщений для запроса"""
-        
-        # Системный промпт
-        system_prompt = self._create_system_prompt(compliment_type)
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Добавляем историю
-        for msg in history[-min(8, len(history)):]:  # Максимум 8 сообщений истории
-            role = "assistant" if msg["is_bot"] else "user"
-            messages.append({"role": role, "content": msg["text"]})
-        
-        # Добавляем текущее сообщение
-        messages.append({"role": "user", "content": message_text})
-        
-        return messages
-    
-    def _create_system_prompt(self, compliment_type: Optional[str] = None) -> str:
-        """Создает системный промпт"""
-        
-        prompt = """Ты - бот, который делает искренние, персонализированные комплименты девушке по имени Оля.
-
-Твоя задача:
-1. Создавать уникальные комплименты, учитывая контекст разговора
-2. Быть искренним, теплым и дружелюбным
-3. Делать комплименты конкретными, избегая общих фраз
-4. Использовать имя "Оля" в каждом комплименте
-5. Делать комплименты не слишком длинными (1-3 предложения)
-
-Примеры хороших комплиментов:
-- "Оля, сегодня твоя улыбка особенно лучезарна! Заметил, как она поднимает настроение всем вокруг."
-- "Мне очень нравится, как ты поддерживаешь друзей, Оля. Твоя эмпатия - редкое качество!"
-- "Оля, твои успехи в работе впечатляют! Видно, как много усилий ты вкладываешь."
-
-Примеры ПЛОХИХ комплиментов (не делай так):
-- "Ты красивая." (слишком общее)
-- "У тебя хороший характер." (не конкретно)
-- Комплимент без упоминания имени Оля."""
-
-        # Добавляем специфику типа комплимента
-        if compliment_type == "appearance":
-            prompt += "\n\nСейчас сделай комплимент о внешности Оли. Обрати внимание на детали, но будь тактичным."
-        elif compliment_type == "character":
-            prompt += "\n\nСейчас сделай комплимент о характере Оли. Отметь её внутренние качества."
-        elif compliment_type == "achievements":
-            prompt += "\n\nСейчас сделай комплимент о достижениях Оли. Подчеркни её успехи и усилия."
-        
-        return prompt
+        """Строит список сообщений для запроса в пределах бюджета токенов"""
+        return self.prompt_builder.build(message_text, history, compliment_type).messages
     
     def _post_process_compliment(self, compliment: str) -> str:
         """Пост-обработка сгенерированного комплимента"""
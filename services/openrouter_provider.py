@@ -1,9 +1,30 @@
-import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import asyncio
+from typing import AsyncIterator, List, Dict, Any, Optional
 from loguru import logger
 
 from config.settings import settings
+from services.context_manager import HistoryMessage
+from services.metrics import provider_tokens
+from services.openrouter_client import openrouter_client
+from services.prompt_builder import PromptBuilder
+from utils.logger import debug_sampled
+
+SYSTEM_PROMPT = """Ты делаешь искренние, персонализированные комплименты девушке по имени Оля.
+
+Правила:
+1. Всегда обращайся к "Оля" или "Олечка"
+2. Будь конкретным, избегай общих фраз
+3. Учитывай контекст разговора
+4. Будь теплым и дружелюбным
+5. 1-3 предложения, не больше
+
+Пример хорошего комплимента: "Оля, сегодня твоя улыбка особенно лучезарна! Заметил, как она поднимает настроение всем вокруг.\""""
+
+TYPE_PROMPTS = {
+    "appearance": "\nСделай комплимент о внешности Оли.",
+    "character": "\nСделай комплимент о характере Оли.",
+    "achievements": "\nСделай комплимент о достижениях Оли.",
+}
 
 
 class OpenRouterProvider:
@@ -13,6 +34,10 @@ class OpenRouterProvider:
         self.client = None
         self.available = False
         self.model = settings.OPENROUTER_MODEL
+        self._models_checked = False
+        self._models_lock = asyncio.Lock()
+        # Последние 5 реплик истории в пределах бюджета токенов
+        self.prompt_builder = PromptBuilder("openrouter", SYSTEM_PROMPT, TYPE_PROMPTS, max_turns=5)
         
         if settings.OPENROUTER_API_KEY:
             self._initialize_client()
@@ -20,36 +45,45 @@ class OpenRouterProvider:
             logger.warning("OpenRouter API ключ не указан")
     
     def _initialize_client(self):
-        """Инициализирует клиент OpenRouter"""
-        try:
-            self.client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=settings.OPENROUTER_API_KEY,
-                default_headers={
-                    "HTTP-Referer": "https://github.com/your-username/olya-bot",
-                    "X-Title": "Olya Compliments Bot",
-                },
-            )
-            
-            # Тестовый запрос для проверки подключения
-            models = self.client.models.list()
-            logger.info(f"✅ OpenRouter подключен. Доступно моделей: {len(models.data)}")
-            
-            # Проверяем доступность выбранной модели
-            available_models = [m.id for m in models.data]
-            if self.model not in available_models:
-                logger.warning(f"Модель {self.model} недоступна. Доступные: {available_models[:3]}...")
-                # Выбираем доступную модель
-                for preferred in ["openai/gpt-3.5-turbo", "anthropic/claude-3-haiku", "google/gemini-pro"]:
-                    if preferred in available_models:
-                        self.model = preferred
-                        break
+        """Подключает общий асинхронный клиент OpenRouter"""
+        self.client = openrouter_client
+        self.available = True
+    
+    async def _ensure_model(self):
+        """Проверяет доступность выбранной модели при первом запросе"""
+        if self._models_checked:
+            return
+        
+        async with self._models_lock:
+            if self._models_checked:
+                return
             
-            self.available = True
+            try:
+                available_models = await self.client.get_models()
+                logger.info(f"✅ OpenRouter подключен. Доступно моделей: {len(available_models)}")
+                
+                if self.model not in available_models:
+                    logger.warning(f"Модель {self.model} недоступна. Доступные: {available_models[:3]}...")
+                    # Выбираем доступную модель
+                    for preferred in ["openai/gpt-3.5-turbo", "anthropic/claude-3-haiku", "google/gemini-pro"]:
+                        if preferred in available_models:
+                            self.model = preferred
+                            break
+            except Exception as e:
+                logger.warning(f"Не удалось получить список моделей OpenRouter: {e}")
             
-        except Exception as e:
-            logger.error(f"❌ Ошибка инициализации OpenRouter: {e}")
-            self.available = False
+            self._models_checked = True
+    
+    async def warm_up(self):
+        """Фоновый прогрев: проверяет модель до первого сообщения пользователя"""
+        if self.available and self.client:
+            await self._ensure_model()
+    
+    async def health_check(self):
+        """Лёгкая проверка доступности API (без генерации)"""
+        if not self.available or not self.client:
+            raise RuntimeError("OpenRouter провайдер не доступен")
+        await self.client.list_models()
     
     def is_available(self) -> bool:
         """Проверяет доступность провайдера"""
@@ -57,7 +91,7 @@ class OpenRouterProvider:
     
     async def generate_compliment(self,
                                  message_text: str,
-                                 history: List[Dict[str, Any]],
+                                 history: List[HistoryMessage],
                                  compliment_type: Optional[str] = None) -> str:
         """
         Генерирует комплимент через OpenRouter
@@ -77,9 +111,10 @@ class OpenRouterProvider:
             # Формируем промпт
             messages = self._build_messages(message_text, history, compliment_type)
             
+            await self._ensure_model()
+            
             # Делаем запрос
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
+            response = await self.client.chat_completion(
                 model=self.model,
                 messages=messages,
                 temperature=0.7,
@@ -96,48 +131,61 @@ class OpenRouterProvider:
             if hasattr(response, 'usage'):
                 self._log_usage(response.usage)
             
-            logger.debug(f"OpenRouter сгенерировал: {compliment[:50]}...")
+            debug_sampled("OpenRouter сгенерировал: {:.50}...", compliment)
             return compliment
             
         except Exception as e:
             logger.error(f"Ошибка OpenRouter: {e}")
             raise
     
-    def _build_messages(self,
-                       message_text: str,
-                       history: List[Dict[str, Any]],
-                       compliment_type: Optional[str] = None) -> List[Dict[str, str]]:
-        """Строит список сообщений для промпта"""
-        
-        system_prompt = """Ты делаешь искренние, персонализированные комплименты девушке по имени Оля.
-        
-        Правила:
-        1. Всегда обращайся к "Оля" или "Олечка"
-        2. Будь конкретным, избегай общих фраз
-        3. Учитывай контекст разговора
-        4. Будь теплым и дружелюбным
-        5. 1-3 предложения, не больше
-        
-        Пример хорошего комплимента: "Оля, сегодня твоя улыбка особенно лучезарна! Заметил, как она поднимает настроение всем вокруг.""""
+    async def stream_compliment(self,
+                                message_text: str,
+                                history: List[HistoryMessage],
+                                compliment_type: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Генерирует комплимент через OpenRouter в потоковом режиме
         
-        if compliment_type == "appearance":
-            system_prompt += "\nСделай комплимент о внешности Оли."
-        elif compliment_type == "character":
-            system_prompt += "\nСделай комплимент о характере Оли."
-        elif compliment_type == "achievements":
-            system_prompt += "\nСделай комплимент о достижениях Оли."
+        Args:
+            message_text: текущее сообщение пользователя
+            history: история диалога
+            compliment_type: тип комплимента
+            
+        Yields:
+            Накопленный текст по мере генерации; последним — окончательный
+            комплимент после пост-обработки
+        """
+        if not self.available or not self.client:
+            raise RuntimeError("OpenRouter провайдер не доступен")
         
-        messages = [{"role": "system", "content": system_prompt}]
+        messages = self._build_messages(message_text, history, compliment_type)
+        await self._ensure_model()
         
-        # Добавляем историю (последние 5 сообщений)
-        for msg in history[-5:]:
-            role = "assistant" if msg["is_bot"] else "user"
-            messages.append({"role": role, "content": msg["text"]})
+        text = ""
+        async for delta in self.client.stream_chat_completion(
+            model=self.model,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=150,
+            top_p=0.9
+        ):
+            text += delta
+            partial = text.lstrip().lstrip('"\'')
+            if partial:
+                yield partial
         
-        # Добавляем текущее сообщение
-        messages.append({"role": "user", "content": message_text})
+        compliment = self._post_process_compliment(text.strip())
+        if not compliment:
+            raise ValueError("OpenRouter вернул пустой ответ")
         
-        return messages
+        debug_sampled("OpenRouter сгенерировал (поток): {:.50}...", compliment)
+        yield compliment
+    
+    def _build_messages(self,
+                       message_text: str,
+                       history: List[HistoryMessage],
+                       compliment_type: Optional[str] = None) -> List[Dict[str, str]]:
+        """Строит список сообщений для промпта в пределах бюджета токенов"""
+        return self.prompt_builder.build(message_text, history, compliment_type).messages
     
     def _post_process_compliment(self, compliment: str) -> str:
         """Пост-обработка сгенерированного текста"""
@@ -155,11 +203,13 @@ class OpenRouterProvider:
         return compliment
     
     def _log_usage(self, usage):
-        """Логирует использование токенов"""
+        """Логирует использование токенов и считает их в метриках"""
         if usage:
+            provider_tokens.inc(usage.prompt_tokens or 0, provider="openrouter", model=self.model, kind="prompt")
+            provider_tokens.inc(usage.completion_tokens or 0, provider="openrouter", model=self.model, kind="completion")
             logger.info(
-                f"OpenRouter использование | "
-                f"Токены: {usage.total_tokens} (вход: {usage.prompt_tokens}, выход: {usage.completion_tokens})"
+                "OpenRouter использование | Токены: {} (вход: {}, выход: {})",
+                usage.total_tokens, usage.prompt_tokens, usage.completion_tokens
             )
     
     def get_info(self) -> Dict[str, Any]:
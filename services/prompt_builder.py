@@ -0,0 +1,222 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional
+from loguru import logger
+
+from config.settings import settings
+from services.context_manager import HistoryMessage
+from services.metrics import metrics
+from utils.logger import debug_sampled
+
+# Точный подсчёт токенов, если установлен tiktoken (необязательная зависимость)
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    _encoding = None
+    TIKTOKEN_AVAILABLE = False
+    logger.debug("tiktoken не установлен, токены оцениваются по длине текста")
+
+# Служебные токены на каждое сообщение чата (роль и разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s")
+
+prompt_tokens = metrics.histogram(
+    "prompt_tokens", "Оценка токенов промпта после сжатия", ("builder",),
+    buckets=(100, 200, 400, 600, 800, 1000, 1500, 2000, 4000)
+)
+prompt_tokens_saved = metrics.counter(
+    "prompt_tokens_saved_total", "Токены, сэкономленные сжатием промпта", ("builder",)
+)
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    """
+    Считает токены текста
+
+    Без tiktoken — оценка для BPE-словарей OpenAI: около 4 символов латиницы
+    и 2.5 символа кириллицы на токен (с небольшим запасом). Реплики истории
+    уходят в промпт много раз подряд, поэтому результат кэшируется.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Кириллица занимает в UTF-8 два байта, латиница — один
+    non_ascii = len(text.encode("utf-8")) - len(text)
+    return int((len(text) - non_ascii) / 4 + non_ascii / 2.5) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст до max_tokens по границе слова, добавляя многоточие"""
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    if _encoding is not None:
+        cut = _encoding.decode(_encoding.encode(text)[:max_tokens - 1])
+    else:
+        cut = text[:max(1, len(text) * (max_tokens - 1) // tokens)]
+    # Не рвём слово посередине, если есть где остановиться
+    if " " in cut[len(cut) // 2:]:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip(" ,.;:") + "…"
+
+
+class Prompt(NamedTuple):
+    """Собранный промпт и его оценка в токенах"""
+    messages: List[Dict[str, str]]
+    tokens: int
+    tokens_saved: int
+
+
+class PromptBuilder:
+    """
+    Собирает сообщения для chat completions в пределах бюджета токенов
+
+    Системный промпт рендерится один раз на тип комплимента. Текущее
+    сообщение и реплики истории обрезаются до своих лимитов; из последних
+    max_turns реплик добавляются самые новые, пока хватает бюджета, а не
+    поместившиеся сжимаются в короткую сводку из начала сообщений
+    пользователя.
+    """
+
+    def __init__(self,
+                 name: str,
+                 base_prompt: str,
+                 type_prompts: Dict[str, str],
+                 max_turns: int,
+                 budget: int = settings.PROMPT_TOKEN_BUDGET,
+                 max_message_tokens: int = settings.PROMPT_MAX_MESSAGE_TOKENS,
+                 max_turn_tokens: int = settings.PROMPT_MAX_TURN_TOKENS,
+                 summary_tokens: int = settings.PROMPT_SUMMARY_TOKENS):
+        self.name = name
+        self.base_prompt = base_prompt
+        self.type_prompts = type_prompts
+        self.max_turns = max_turns
+        self.budget = budget
+        self.max_message_tokens = max_message_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.summary_tokens = summary_tokens
+        self._system_prompts: Dict[Optional[str], Dict[str, object]] = {}
+
+        # Метрики
+        self.requests = 0
+        self.tokens_total = 0
+        self.tokens_saved = 0
+        self.truncated_messages = 0
+        self.summarized_turns = 0
+
+    def system_prompt(self, compliment_type: Optional[str] = None) -> Dict[str, object]:
+        """Системное сообщение для типа комплимента (с закэшированным числом токенов)"""
+        cached = self._system_prompts.get(compliment_type)
+        if cached is None:
+            content = self.base_prompt + self.type_prompts.get(compliment_type, "")
+            cached = self._system_prompts[compliment_type] = {
+                "message": {"role": "system", "content": content},
+                "tokens": count_tokens(content) + MESSAGE_OVERHEAD_TOKENS,
+            }
+        return cached
+
+    def build(self,
+              message_text: str,
+              history: List[HistoryMessage],
+              compliment_type: Optional[str] = None) -> Prompt:
+        """
+        Собирает промпт
+
+        Args:
+            message_text: текущее сообщение пользователя
+            history: история диалога (от старых к новым)
+            compliment_type: тип комплимента
+
+        Returns:
+            Сообщения для API, оценка токенов и сколько токенов сэкономлено
+            по сравнению с прежней сборкой (последние max_turns реплик
+            и текущее сообщение целиком)
+        """
+        system = self.system_prompt(compliment_type)
+        naive = self._naive_tokens(message_text, history, system["tokens"])
+        current_text = truncate_to_tokens(message_text, self.max_message_tokens)
+        if current_text is not message_text:
+            self.truncated_messages += 1
+        current_tokens = count_tokens(current_text) + MESSAGE_OVERHEAD_TOKENS
+
+        # Ещё не сохранённое текущее сообщение уже стоит в конце истории
+        if history and not history[-1].is_bot and history[-1].text == message_text:
+            history = history[:-1]
+        recent = history[-self.max_turns:] if self.max_turns > 0 else []
+        turns = [truncate_to_tokens(msg.text, self.max_turn_tokens) for msg in recent]
+        turn_tokens = [count_tokens(text) + MESSAGE_OVERHEAD_TOKENS for text in turns]
+
+        # Если история целиком не помещается, оставляем место под сводку
+        available = self.budget - system["tokens"] - current_tokens
+        if sum(turn_tokens) > available:
+            available -= self.summary_tokens
+
+        # Последние реплики — пока хватает бюджета, остальные уходят в сводку
+        kept: List[Dict[str, str]] = []
+        kept_tokens = 0
+        dropped: List[HistoryMessage] = []
+        for index in range(len(recent) - 1, -1, -1):
+            if kept_tokens + turn_tokens[index] > available:
+                dropped = recent[:index + 1]
+                break
+            msg = recent[index]
+            if turns[index] is not msg.text:
+                self.truncated_messages += 1
+            kept.append({"role": "assistant" if msg.is_bot else "user", "content": turns[index]})
+            kept_tokens += turn_tokens[index]
+        kept.reverse()
+
+        messages = [system["message"]]
+        tokens = system["tokens"] + kept_tokens + current_tokens
+        summary = self._summarize(dropped, min(self.summary_tokens, self.budget - tokens))
+        if summary:
+            messages.append({"role": "system", "content": summary})
+            tokens += count_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+            self.summarized_turns += len(dropped)
+        messages.extend(kept)
+        messages.append({"role": "user", "content": current_text})
+
+        saved = max(0, naive - tokens)
+        self.requests += 1
+        self.tokens_total += tokens
+        self.tokens_saved += saved
+        prompt_tokens.observe(tokens, builder=self.name)
+        prompt_tokens_saved.inc(saved, builder=self.name)
+        debug_sampled("Промпт {}: ~{} токенов, сэкономлено {}", self.name, tokens, saved)
+        return Prompt(messages, tokens, saved)
+
+    def _summarize(self, turns: List[HistoryMessage], max_tokens: int) -> str:
+        """Короткая сводка старых реплик: начало каждого сообщения пользователя"""
+        if max_tokens <= MESSAGE_OVERHEAD_TOKENS:
+            return ""
+        fragments = []
+        for msg in turns:
+            if msg.is_bot or not msg.text.strip():
+                continue
+            first_sentence = _SENTENCE_END.split(msg.text.strip(), 1)[0]
+            fragments.append(f"«{truncate_to_tokens(first_sentence, 20)}»")
+        if not fragments:
+            return ""
+        summary = "Ранее пользователь писал: " + "; ".join(fragments)
+        return truncate_to_tokens(summary, max_tokens - MESSAGE_OVERHEAD_TOKENS)
+
+    def _naive_tokens(self, message_text: str, history: List[HistoryMessage], system_tokens: int) -> int:
+        """Токены промпта, собранного как раньше: последние max_turns реплик и сообщение целиком"""
+        recent = history[-self.max_turns:] if self.max_turns > 0 else []
+        return (system_tokens
+                + sum(count_tokens(msg.text) + MESSAGE_OVERHEAD_TOKENS for msg in recent)
+                + count_tokens(message_text) + MESSAGE_OVERHEAD_TOKENS)
+
+    def get_stats(self) -> Dict[str, object]:
+        """Статистика сжатия промптов"""
+        return {
+            'requests': self.requests,
+            'avg_tokens': round(self.tokens_total / self.requests, 1) if self.requests else 0.0,
+            'tokens_saved': self.tokens_saved,
+            'truncated_messages': self.truncated_messages,
+            'summarized_turns': self.summarized_turns,
+        }
@@ -0,0 +1,257 @@
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from config.settings import settings
+from services.context_manager import HistoryMessage
+from utils.logger import debug_sampled
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+CacheKey = Tuple[str, str, Tuple[str, ...]]
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к виду для сравнения: регистр, ё, пунктуация, эмодзи, пробелы"""
+    text = text.lower().replace("ё", "е")
+    text = _NON_WORD.sub(" ", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CacheEntry:
+    """Закэшированные варианты комплимента для одного запроса"""
+    
+    __slots__ = ("variants", "grams", "latency", "created_at", "size")
+    
+    def __init__(self, grams: FrozenSet[str], latency: float):
+        self.variants: List[str] = []
+        self.grams = grams
+        self.latency = latency
+        self.created_at = time.monotonic()
+        self.size = 0
+
+
+class ResponseCache:
+    """
+    Кэш сгенерированных комплиментов
+    
+    Ключ — нормализованные (текст сообщения, тип комплимента, последние
+    реплики пользователя). Записи вытесняются по TTL и по LRU. Похожие
+    формулировки находятся по сходству триграмм среди записей с тем же
+    типом и контекстом: кандидатов даёт инвертированный индекс
+    триграмма → тексты, так что промах не сравнивается со всем кэшем.
+    Для каждого ключа хранится
+    несколько вариантов, чтобы не отдавать пользователю один и тот же
+    комплимент два раза подряд.
+    """
+    
+    def __init__(self,
+                 max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl: float = settings.RESPONSE_CACHE_TTL,
+                 max_variants: int = settings.RESPONSE_CACHE_MAX_VARIANTS,
+                 history_turns: int = settings.RESPONSE_CACHE_HISTORY_TURNS,
+                 similarity: float = settings.RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_variants = max_variants
+        self.history_turns = history_turns
+        self.similarity = similarity
+        
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._last_served: "OrderedDict[int, str]" = OrderedDict()
+        # (тип, контекст) -> триграмма -> нормализованные тексты записей
+        self._grams_index: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Set[str]]] = {}
+        self.bytes_used = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+    
+    def make_key(self,
+                 message_text: str,
+                 history: List[HistoryMessage],
+                 compliment_type: Optional[str]) -> CacheKey:
+        """Строит ключ из сообщения, типа и предыдущих реплик пользователя"""
+        # Последний элемент истории — обычно само текущее сообщение
+        previous = history[:-1] if history and history[-1].text == message_text else history
+        context = tuple(
+            normalize_text(msg.text) for msg in previous if not msg.is_bot
+        )[-self.history_turns:] if self.history_turns else ()
+        return normalize_text(message_text), compliment_type or "", context
+    
+    def get(self,
+            user_id: Optional[int],
+            message_text: str,
+            history: List[HistoryMessage],
+            compliment_type: Optional[str] = None,
+            avoid: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """
+        Возвращает закэшированный комплимент или None
+        
+        Вариант, который этот пользователь получил последним, не выдаётся,
+        как и варианты, для которых avoid возвращает True (почти повторы).
+        """
+        key = self.make_key(message_text, history, compliment_type)
+        entry, similar = self._lookup(key)
+        
+        if entry is not None:
+            last = self._last_served.get(user_id)
+            for variant in entry.variants:
+                if variant != last and (avoid is None or not avoid(variant)):
+                    self.hits += 1
+                    self.similar_hits += similar
+                    self.latency_saved += entry.latency
+                    self._remember(user_id, variant)
+                    debug_sampled(
+                        "Кэш ответов: {} попадание | hit rate {:.0%}",
+                        'похожее' if similar else 'точное', self.hit_rate
+                    )
+                    return variant
+        
+        self.misses += 1
+        return None
+    
+    def put(self,
+            user_id: Optional[int],
+            message_text: str,
+            history: List[HistoryMessage],
+            compliment_type: Optional[str],
+            compliment: str,
+            latency: float):
+        """Добавляет сгенерированный комплимент как вариант ответа на запрос"""
+        self._remember(user_id, compliment)
+        key = self.make_key(message_text, history, compliment_type)
+        entry = self._entries.get(key)
+        
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._drop(key)
+            entry = CacheEntry(grams=trigrams(key[0]), latency=latency)
+            entry.size = self._sizeof_key(key)
+            self._entries[key] = entry
+            self._index(key, entry)
+            self.bytes_used += entry.size
+        elif compliment in entry.variants:
+            return
+        
+        if len(entry.variants) >= self.max_variants:
+            removed = entry.variants.pop(0)
+            entry.size -= len(removed.encode("utf-8"))
+            self.bytes_used -= len(removed.encode("utf-8"))
+        
+        entry.variants.append(compliment)
+        entry.size += len(compliment.encode("utf-8"))
+        self.bytes_used += len(compliment.encode("utf-8"))
+        entry.latency = max(entry.latency, latency)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+    
+    def _lookup(self, key: CacheKey) -> Tuple[Optional[CacheEntry], bool]:
+        """Ищет точное совпадение, затем — самую похожую формулировку"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._expired(entry):
+                self._drop(key)
+            else:
+                self._entries.move_to_end(key)
+                return entry, False
+        
+        if not self.similarity or not key[0]:
+            return None, False
+        
+        index = self._grams_index.get(key[1:])
+        if index is None:
+            return None, False
+        
+        # Сходство >= similarity требует не меньше ceil(similarity * |grams|) общих
+        # триграмм, значит похожий текст содержит хотя бы одну из любых
+        # |grams| - ceil(similarity * |grams|) + 1 триграмм запроса: берём самые редкие
+        grams = trigrams(key[0])
+        postings = sorted((index.get(gram, ()) for gram in grams), key=len)
+        prefix = len(grams) - math.ceil(self.similarity * len(grams)) + 1
+        candidates = set().union(*postings[:prefix])
+        
+        best_key, best_score = None, self.similarity
+        for text in candidates:
+            other_key = (text, *key[1:])
+            other = self._entries[other_key]
+            shared = len(grams & other.grams)
+            score = shared / (len(grams) + len(other.grams) - shared)
+            if score >= best_score and not self._expired(other):
+                best_key, best_score = other_key, score
+        
+        if best_key is None:
+            return None, False
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key], True
+    
+    def _expired(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+    
+    def _drop(self, key: CacheKey):
+        entry = self._entries.pop(key)
+        self.bytes_used -= entry.size
+        self._unindex(key, entry)
+    
+    def _index(self, key: CacheKey, entry: CacheEntry):
+        if not key[0]:
+            return
+        index = self._grams_index.setdefault(key[1:], {})
+        for gram in entry.grams:
+            index.setdefault(gram, set()).add(key[0])
+    
+    def _unindex(self, key: CacheKey, entry: CacheEntry):
+        index = self._grams_index.get(key[1:])
+        if index is None:
+            return
+        for gram in entry.grams:
+            texts = index.get(gram)
+            if texts is not None:
+                texts.discard(key[0])
+                if not texts:
+                    del index[gram]
+        if not index:
+            del self._grams_index[key[1:]]
+    
+    def _remember(self, user_id: Optional[int], compliment: str):
+        if user_id is None:
+            return
+        self._last_served[user_id] = compliment
+        self._last_served.move_to_end(user_id)
+        while len(self._last_served) > self.max_entries:
+            self._last_served.popitem(last=False)
+    
+    @staticmethod
+    def _sizeof_key(key: CacheKey) -> int:
+        return sum(len(part.encode("utf-8")) for part in (key[0], key[1], *key[2]))
+    
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша: попадания, занятая память, сэкономленное время"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes_used,
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate, 3),
+            'latency_saved': round(self.latency_saved, 2),
+        }
+
+
+# Глобальный экземпляр
+response_cache = ResponseCache()
@@ -0,0 +1,303 @@
+"""
+Фоновая очистка старых сообщений
+
+Перевод существующей базы в auto_vacuum=INCREMENTAL (однократный VACUUM,
+лучше при остановленном боте):
+    python -m services.retention --convert-vacuum
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from sqlalchemy import delete, func, select, tuple_
+from loguru import logger
+
+from config.settings import settings
+from database.models import Message, close_db, engine, get_db
+from services.context_manager import context_manager
+
+
+class RetentionScheduler:
+    """
+    Фоновая очистка таблицы messages
+
+    Удаляет сообщения старше retention_days и сверх лимита на пользователя
+    небольшими пачками с паузами между ними: строки для пачки выбираются
+    на читателе по курсору (created_at, id), а писатель держит блокировку
+    только на время DELETE по списку id. После очистки SQLite возвращает
+    освободившиеся страницы через incremental_vacuum.
+    """
+
+    def __init__(self,
+                 retention_days: int = settings.RETENTION_DAYS,
+                 max_messages_per_user: int = settings.RETENTION_MAX_MESSAGES_PER_USER,
+                 interval: float = settings.RETENTION_INTERVAL,
+                 batch_size: int = settings.RETENTION_BATCH_SIZE,
+                 batch_pause: float = settings.RETENTION_BATCH_PAUSE,
+                 vacuum_pages: int = settings.RETENTION_VACUUM_PAGES):
+        self.retention_days = retention_days
+        self.max_messages_per_user = max_messages_per_user
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.vacuum_pages = vacuum_pages
+
+        self._task: Optional[asyncio.Task] = None
+        self._vacuum_converted = False
+
+        # Метрики
+        self.runs = 0
+        self.batches = 0
+        self.deleted_expired = 0
+        self.deleted_over_cap = 0
+        self.vacuumed_pages = 0
+        self.lock_seconds = 0.0
+        self.max_lock_seconds = 0.0
+        self.last_run_seconds = 0.0
+        self.last_run_at: Optional[datetime] = None
+
+    def start(self) -> asyncio.Task:
+        """Запускает периодическую очистку"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка при очистке старых сообщений: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        """
+        Выполняет один проход очистки
+
+        Returns:
+            Количество удалённых сообщений
+        """
+        started = time.perf_counter()
+
+        expired = await self.purge_expired()
+        over_cap = await self.enforce_user_caps()
+        if expired or over_cap:
+            # В кэше истории могли остаться удалённые сообщения
+            context_manager.invalidate()
+        vacuumed = await self.incremental_vacuum()
+
+        self.runs += 1
+        self.last_run_seconds = time.perf_counter() - started
+        self.last_run_at = datetime.utcnow()
+        logger.info(
+            f"Очистка сообщений: старых {expired}, сверх лимита {over_cap}, "
+            f"освобождено страниц {vacuumed} | {self.last_run_seconds:.2f}s, "
+            f"блокировка записи {self.lock_seconds:.3f}s всего"
+        )
+        return expired + over_cap
+
+    async def purge_expired(self) -> int:
+        """Удаляет сообщения старше retention_days"""
+        if self.retention_days <= 0:
+            return 0
+
+        cutoff_date = datetime.utcnow() - timedelta(days=self.retention_days)
+        deleted = await self._delete_batches(Message.created_at < cutoff_date)
+        self.deleted_expired += deleted
+        return deleted
+
+    async def enforce_user_caps(self) -> int:
+        """Оставляет каждому пользователю не больше max_messages_per_user сообщений"""
+        if self.max_messages_per_user <= 0:
+            return 0
+
+        async with get_db() as db:
+            result = await db.execute(
+                select(Message.user_id)
+                .group_by(Message.user_id)
+                .having(func.count(Message.id) > self.max_messages_per_user)
+            )
+            user_ids = result.scalars().all()
+
+        deleted = 0
+        for user_id in user_ids:
+            # Самое новое сообщение, которое уже не помещается в лимит
+            async with get_db() as db:
+                result = await db.execute(
+                    select(Message.created_at, Message.id)
+                    .where(Message.user_id == user_id)
+                    .order_by(Message.created_at.desc(), Message.id.desc())
+                    .offset(self.max_messages_per_user)
+                    .limit(1)
+                )
+                boundary = result.first()
+            if boundary is None:
+                continue
+
+            deleted += await self._delete_batches(
+                Message.user_id == user_id,
+                tuple_(Message.created_at, Message.id) <= tuple_(*boundary)
+            )
+
+        self.deleted_over_cap += deleted
+        return deleted
+
+    async def _delete_batches(self, *conditions) -> int:
+        """
+        Удаляет подходящие сообщения пачками по batch_size
+
+        Args:
+            conditions: условия отбора сообщений
+
+        Returns:
+            Количество удалённых сообщений
+        """
+        deleted = 0
+        cursor = None
+
+        while True:
+            query = select(Message.created_at, Message.id).where(*conditions)
+            if cursor is not None:
+                query = query.where(tuple_(Message.created_at, Message.id) > tuple_(*cursor))
+
+            async with get_db() as db:
+                result = await db.execute(
+                    query.order_by(Message.created_at, Message.id).limit(self.batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+
+                locked_at = time.perf_counter()
+                await db.execute(delete(Message).where(Message.id.in_([row.id for row in rows])))
+                await db.commit()
+                self._record_lock(time.perf_counter() - locked_at)
+
+            deleted += len(rows)
+            self.batches += 1
+            cursor = tuple(rows[-1])
+            if len(rows) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+
+        return deleted
+
+    async def incremental_vacuum(self) -> int:
+        """
+        Возвращает свободные страницы SQLite файловой системе
+
+        Returns:
+            Количество освобождённых страниц
+        """
+        if self.vacuum_pages <= 0 or engine.dialect.name != "sqlite":
+            return 0
+
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+
+            if mode != 2:  # INCREMENTAL
+                # Не на первом проходе: он начинается сразу при старте бота
+                if settings.RETENTION_VACUUM_CONVERT and self.runs and not self._vacuum_converted:
+                    await self._convert_to_incremental(conn)
+                return 0
+
+            free_before = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if not free_before:
+                return 0
+
+            locked_at = time.perf_counter()
+            # execute() делает один шаг PRAGMA и освобождает одну страницу,
+            # executescript() выполняет её до конца
+            raw_connection = await conn.get_raw_connection()
+            await raw_connection.driver_connection.executescript(
+                f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});"
+            )
+            self._record_lock(time.perf_counter() - locked_at)
+            free_after = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+
+        vacuumed = free_before - free_after
+        self.vacuumed_pages += vacuumed
+        return vacuumed
+
+    async def convert_to_incremental(self) -> bool:
+        """
+        Переводит существующую базу в auto_vacuum=INCREMENTAL
+
+        Returns:
+            True, если база была переведена (False — уже в нужном режиме или не SQLite)
+        """
+        if engine.dialect.name != "sqlite":
+            return False
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() == 2:
+                return False
+            await self._convert_to_incremental(conn)
+        return True
+
+    async def _convert_to_incremental(self, conn):
+        # Режим auto_vacuum существующей базы меняется только полным VACUUM
+        logger.info("Перевожу базу в auto_vacuum=INCREMENTAL (однократный VACUUM)")
+        locked_at = time.perf_counter()
+        await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.exec_driver_sql("VACUUM")
+        self._record_lock(time.perf_counter() - locked_at)
+        self._vacuum_converted = True
+
+    def _record_lock(self, seconds: float):
+        self.lock_seconds += seconds
+        self.max_lock_seconds = max(self.max_lock_seconds, seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика очистки: удалённые строки и время под блокировкой записи"""
+        return {
+            'runs': self.runs,
+            'batches': self.batches,
+            'deleted_expired': self.deleted_expired,
+            'deleted_over_cap': self.deleted_over_cap,
+            'vacuumed_pages': self.vacuumed_pages,
+            'lock_seconds': round(self.lock_seconds, 3),
+            'max_lock_ms': round(self.max_lock_seconds * 1000, 2),
+            'last_run_seconds': round(self.last_run_seconds, 3),
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+# Глобальный экземпляр
+retention_scheduler = RetentionScheduler()
+
+
+async def _convert_command():
+    try:
+        converted = await retention_scheduler.convert_to_incremental()
+    finally:
+        await close_db()
+    if converted:
+        logger.info(f"База переведена в auto_vacuum=INCREMENTAL за {retention_scheduler.lock_seconds:.1f}s")
+    else:
+        logger.info("База уже в auto_vacuum=INCREMENTAL (или не SQLite), VACUUM не нужен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание таблицы сообщений")
+    parser.add_argument("--convert-vacuum", action="store_true",
+                        help="однократный VACUUM для перевода базы в auto_vacuum=INCREMENTAL")
+    args = parser.parse_args()
+    if not args.convert_vacuum:
+        parser.error("укажите действие, например --convert-vacuum")
+    asyncio.run(_convert_command())
+
+
+if __name__ == "__main__":
+    main()
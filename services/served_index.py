@@ -0,0 +1,159 @@
+import hashlib
+import re
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Callable, Deque, Dict, Optional
+from loguru import logger
+from sqlalchemy import select
+
+from config.settings import settings
+from database.models import Message, User, get_db
+
+# Биты байта, разнесённые по 8-битным «счётчикам»: бит j -> разряд 8 * j
+_BYTE_LANES = [sum(1 << (8 * j) for j in range(8) if byte >> j & 1) for byte in range(256)]
+# Больше признаков счётчик в 8 бит не вместит
+_MAX_FEATURES = 255
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _feature_lanes(feature: str) -> int:
+    """64-битный хэш признака, разнесённый по 64 счётчикам (по 8 бит на бит хэша)"""
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return sum(_BYTE_LANES[value >> (8 * i) & 0xFF] << (64 * i) for i in range(8))
+
+
+@lru_cache(maxsize=_MAX_FEATURES + 1)
+def _majority_table(features: int) -> bytes:
+    """Таблица для bytes.translate: счётчик -> b"1", если бит был у большинства признаков"""
+    return bytes(ord("1") if count * 2 > features else ord("0") for count in range(256))
+
+
+@lru_cache(maxsize=4096)
+def simhash(text: str) -> int:
+    """
+    64-битный SimHash текста по словам и парам соседних слов
+
+    Похожие тексты дают отпечатки, отличающиеся в немногих битах. Хэши
+    признаков кэшируются уже разнесёнными по счётчикам, поэтому сумма
+    по признакам — это сложение нескольких больших целых, а не цикл по
+    64 битам на каждый признак. Шаблоны и закэшированные ответы
+    проверяются многократно, поэтому кэшируется и сам отпечаток.
+    """
+    words = _WORD.findall(text.lower().replace("ё", "е"))
+    features = (words + [f"{a} {b}" for a, b in zip(words, words[1:])])[:_MAX_FEATURES]
+    if not features:
+        return 0
+    lanes = sum(map(_feature_lanes, features))
+    # Счётчик бита i — байт i; старший бит отпечатка — последний байт
+    return int(lanes.to_bytes(64, "little").translate(_majority_table(len(features)))[::-1], 2)
+
+
+class ServedIndex:
+    """
+    Недавно выданные пользователю комплименты для отсева почти повторов
+
+    Для каждого пользователя хранятся SimHash-отпечатки последних
+    history_size комплиментов (одно 64-битное число на комплимент),
+    пользователи вытесняются по LRU. Комплимент считается повтором, если расстояние
+    Хэмминга до одного из отпечатков не больше max_distance. При первом
+    обращении после рестарта отпечатки восстанавливаются из последних
+    комплиментов в messages (по частичному индексу
+    ix_messages_user_id_bot_created_at).
+    """
+
+    def __init__(self,
+                 history_size: int = settings.DEDUP_HISTORY_SIZE,
+                 max_users: int = settings.DEDUP_MAX_USERS,
+                 max_distance: int = settings.DEDUP_MAX_DISTANCE):
+        self.history_size = history_size
+        self.max_users = max_users
+        self.max_distance = max_distance
+        # telegram_id -> отпечатки от старых к новым; порядок ключей — LRU
+        self._users: "OrderedDict[int, Deque[int]]" = OrderedDict()
+        # Пользователи, чьи отпечатки уже загружены из базы
+        self._loaded: Dict[int, bool] = {}
+
+        # Метрики
+        self.checks = 0
+        self.repeats = 0
+        self.loads = 0
+
+    async def ensure_loaded(self, telegram_user_id: int):
+        """Загружает отпечатки последних комплиментов пользователя из базы (один раз)"""
+        if self._loaded.get(telegram_user_id):
+            return
+        try:
+            async with get_db() as db:
+                result = await db.execute(
+                    select(Message.text)
+                    .join(User, Message.user_id == User.id)
+                    .where(User.telegram_id == telegram_user_id, Message.is_bot == True)  # noqa: E712
+                    .order_by(Message.created_at.desc(), Message.id.desc())
+                    .limit(self.history_size)
+                )
+                texts = result.scalars().all()
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить выданные комплименты пользователя {telegram_user_id}: {e}")
+            return
+
+        # Пока шёл запрос, могли выдать новые комплименты — они новее загруженных
+        fingerprints = deque((simhash(text) for text in reversed(texts) if text), maxlen=self.history_size)
+        fingerprints.extend(self._users.get(telegram_user_id, ()))
+        self._store(telegram_user_id, fingerprints)
+        self._loaded[telegram_user_id] = True
+        self.loads += 1
+
+    def seen_similar(self, telegram_user_id: Optional[int], text: str) -> bool:
+        """
+        Выдавался ли пользователю такой же или почти такой же комплимент
+
+        Проверяет только отпечатки в памяти (см. ensure_loaded).
+        """
+        if telegram_user_id is None:
+            return False
+        fingerprints = self._users.get(telegram_user_id)
+        if not fingerprints:
+            return False
+        self.checks += 1
+        fingerprint = simhash(text)
+        limit = self.max_distance
+        if any((fingerprint ^ other).bit_count() <= limit for other in fingerprints):
+            self.repeats += 1
+            logger.debug("Почти повтор для пользователя {}: {:.50}", telegram_user_id, text)
+            return True
+        return False
+
+    def avoid_for(self, telegram_user_id: Optional[int]) -> Optional[Callable[[str], bool]]:
+        """Проверка «уже было» для выбора альтернативы; None — отсев выключен"""
+        if not settings.DEDUP_ENABLED or telegram_user_id is None:
+            return None
+        return lambda text: self.seen_similar(telegram_user_id, text)
+
+    def remember(self, telegram_user_id: int, text: str):
+        """Запоминает выданный комплимент"""
+        fingerprints = self._users.get(telegram_user_id)
+        if fingerprints is None:
+            fingerprints = deque(maxlen=self.history_size)
+        fingerprints.append(simhash(text))
+        self._store(telegram_user_id, fingerprints)
+
+    def _store(self, telegram_user_id: int, fingerprints: Deque[int]):
+        self._users[telegram_user_id] = fingerprints
+        self._users.move_to_end(telegram_user_id)
+        while len(self._users) > self.max_users:
+            evicted, _ = self._users.popitem(last=False)
+            self._loaded.pop(evicted, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Статистика отсева повторов"""
+        return {
+            'users': len(self._users),
+            'checks': self.checks,
+            'repeats': self.repeats,
+            'loads': self.loads,
+        }
+
+
+# Глобальный экземпляр
+served_index = ServedIndex()
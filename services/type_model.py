@@ -0,0 +1,434 @@
+"""
+TF-IDF классификатор типа комплимента, обученный на истории сообщений
+
+Обучение (офлайн, по таблице messages):
+    python -m services.type_model --output data/type_model
+
+Модель — каталог с .npy-файлами, которые открываются через mmap и не
+копируются в память процесса. Признаки — хэши основ слов и пар соседних
+основ (hashing trick), поэтому словарь не хранится и не загружается.
+"""
+import argparse
+import asyncio
+import json
+import re
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+from sqlalchemy import or_, select
+
+from config.settings import settings
+from database.models import Message, close_db, get_db
+from utils.fallback_generator import fallback_generator
+from utils.type_classifier import type_classifier
+
+# NumPy нужен только для модели; без него работают правила по ключевым словам
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+MODEL_VERSION = 1
+# Длина основы слова: грубый стемминг для русских окончаний
+STEM_LENGTH = 6
+# Сообщения пользователя старше этого перед нажатием кнопки не считаются её причиной
+CHOICE_CONTEXT_AGE = timedelta(minutes=30)
+# Меньше пользователей — отложенная выборка по времени, а не по пользователям
+MIN_HOLDOUT_USERS = 10
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Основы слов и пары соседних основ"""
+    stems = [word[:STEM_LENGTH] for word in _WORD.findall(text.lower().replace("ё", "е")) if not word.isdigit()]
+    return stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+
+
+@lru_cache(maxsize=65536)
+def _bucket(token: str, n_features: int) -> int:
+    return zlib.crc32(token.encode("utf-8")) % n_features
+
+
+def window_documents(windows: Sequence[Sequence[str]]) -> List[List[Tuple[str, float]]]:
+    """Окна сообщений (от старых к новым) в документы с весами по давности, как в TypeClassifier"""
+    window_size, decay = type_classifier.window, type_classifier.decay
+    return [
+        [(text, decay ** age) for age, text in enumerate(reversed(window[-window_size:]))]
+        for window in windows
+    ]
+
+
+def vectorize(documents: Sequence[Sequence[Tuple[str, float]]],
+              n_features: int,
+              idf: Optional["np.ndarray"] = None) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Строит разреженную матрицу TF-IDF в формате CSR
+
+    Args:
+        documents: документы; документ — список (текст, вес) (несколько
+            сообщений окна контекста с весами по давности)
+        n_features: число хэш-признаков
+        idf: веса IDF признаков; None — только TF
+
+    Returns:
+        (data, indices, indptr): строки нормированы по L2
+    """
+    indices: List[int] = []
+    weights: List[float] = []
+    lengths = np.zeros(len(documents), dtype=np.int64)
+    for row, document in enumerate(documents):
+        start = len(indices)
+        for text, weight in document:
+            for token in tokenize(text):
+                indices.append(_bucket(token, n_features))
+                weights.append(weight)
+        lengths[row] = len(indices) - start
+
+    indptr = np.zeros(len(documents) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices_array = np.asarray(indices, dtype=np.int64)
+    data = np.asarray(weights, dtype=np.float32)
+    if not len(data):
+        return data, indices_array, indptr
+
+    # Одинаковые признаки в строке складываются: сортируем по (строка, признак)
+    rows = np.repeat(np.arange(len(documents)), lengths)
+    order = np.lexsort((indices_array, rows))
+    rows, indices_array, data = rows[order], indices_array[order], data[order]
+    first = np.ones(len(data), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (indices_array[1:] != indices_array[:-1])
+    starts = np.flatnonzero(first)
+    data = np.add.reduceat(data, starts)
+    rows, indices_array = rows[starts], indices_array[starts]
+
+    # Сублинейный TF, IDF и нормировка строк
+    data = np.log1p(data)
+    if idf is not None:
+        data *= idf[indices_array]
+    norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=len(documents)))
+    data /= np.maximum(norms[rows], 1e-12)
+
+    indptr = np.zeros(len(documents) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(documents)), out=indptr[1:])
+    return data.astype(np.float32), indices_array, indptr
+
+
+def _matmul(data: "np.ndarray", indices: "np.ndarray", indptr: "np.ndarray", weights: "np.ndarray") -> "np.ndarray":
+    """Произведение CSR-матрицы на плотную матрицу весов (n_features x n_types)"""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    products = data[:, None] * weights[indices]
+    # bincount по столбцу быстрее np.add.at в разы
+    return np.stack([
+        np.bincount(rows, weights=products[:, k], minlength=len(indptr) - 1) for k in range(weights.shape[1])
+    ], axis=1).astype(np.float32)
+
+
+def _softmax(logits: "np.ndarray") -> "np.ndarray":
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def train(windows: Sequence[Sequence[str]],
+          labels: Sequence[str],
+          types: Sequence[str],
+          n_features: int = 2 ** 18,
+          epochs: int = 300,
+          learning_rate: float = 8.0,
+          l2: float = 1e-4) -> Dict[str, object]:
+    """
+    Обучает мультиномиальную логистическую регрессию на TF-IDF
+
+    Полный градиентный спуск на разреженной матрице: все операции —
+    векторные NumPy, без циклов по примерам. Пример — окно сообщений
+    пользователя, взвешенное так же, как при классификации.
+
+    Returns:
+        Массивы модели: idf, coef (n_features x n_types), intercept
+    """
+    label_index = {compliment_type: i for i, compliment_type in enumerate(types)}
+    y = np.zeros((len(labels), len(types)), dtype=np.float32)
+    y[np.arange(len(labels)), [label_index[label] for label in labels]] = 1
+
+    documents = window_documents(windows)
+    data, indices, indptr = vectorize(documents, n_features)
+    # Документная частота признака: в CSR признак встречается в строке один раз
+    document_frequency = np.bincount(indices, minlength=n_features)
+    idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+    data, indices, indptr = vectorize(documents, n_features, idf)
+
+    rows = np.repeat(np.arange(len(documents)), np.diff(indptr))
+    coef = np.zeros((n_features, len(types)), dtype=np.float32)
+    intercept = np.zeros(len(types), dtype=np.float32)
+    for _ in range(epochs):
+        probabilities = _softmax(_matmul(data, indices, indptr, coef) + intercept)
+        error = (probabilities - y) / len(documents)
+        weighted = data[:, None] * error[rows]
+        gradient = np.stack([
+            np.bincount(indices, weights=weighted[:, k], minlength=n_features) for k in range(len(types))
+        ], axis=1)
+        coef -= learning_rate * (gradient.astype(np.float32) + l2 * coef)
+        intercept -= learning_rate * error.sum(axis=0)
+
+    return {"idf": idf, "coef": coef, "intercept": intercept}
+
+
+def save_model(path: str, arrays: Dict[str, object], types: Sequence[str], n_features: int, samples: int):
+    """Сохраняет модель: .npy-файлы для mmap и meta.json"""
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", array)
+    meta = {
+        "version": MODEL_VERSION,
+        "types": list(types),
+        "n_features": n_features,
+        "stem_length": STEM_LENGTH,
+        "samples": samples,
+    }
+    (directory / "meta.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class TypeModel:
+    """
+    Выбор типа комплимента обученной моделью с откатом на ключевые слова
+
+    Модель загружается лениво при первом обращении. Если NumPy не
+    установлен, файла модели нет или модель не уверена (вероятность ниже
+    min_confidence), тип определяют правила TypeClassifier.
+    """
+
+    def __init__(self,
+                 path: str = settings.TYPE_MODEL_PATH,
+                 min_confidence: float = settings.TYPE_MODEL_MIN_CONFIDENCE):
+        self.path = path
+        self.min_confidence = min_confidence
+        self._loaded = False
+        self._model: Optional[Dict[str, object]] = None
+
+        # Метрики
+        self.predictions = 0
+        self.fallbacks = 0
+
+    @property
+    def available(self) -> bool:
+        """Загружена ли модель (загружает при первом обращении)"""
+        if not self._loaded:
+            self._load()
+        return self._model is not None
+
+    def _load(self):
+        self._loaded = True
+        directory = Path(self.path)
+        if not NUMPY_AVAILABLE:
+            logger.info("numpy не установлен, тип комплимента определяют ключевые слова")
+            return
+        if not (directory / "meta.json").exists():
+            logger.info("Модель типов комплиментов не найдена, используются ключевые слова")
+            return
+        try:
+            meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+            if meta["version"] != MODEL_VERSION or meta["stem_length"] != STEM_LENGTH:
+                logger.warning("Модель типов комплиментов устарела ({}), нужно переобучить", self.path)
+                return
+            self._model = {
+                "types": tuple(meta["types"]),
+                "n_features": meta["n_features"],
+                # Веса не читаются в память целиком: страницы подгружает ОС
+                **{name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in ("idf", "coef", "intercept")},
+            }
+            logger.info("Загружена модель типов комплиментов: {} примеров, типы {}", meta["samples"], meta["types"])
+        except Exception as e:
+            logger.error(f"Не удалось загрузить модель типов комплиментов: {e}")
+
+    def predict_proba(self, documents: Sequence[Sequence[Tuple[str, float]]]) -> "np.ndarray":
+        """
+        Вероятности типов для пачки документов одной векторной операцией
+
+        Args:
+            documents: документы; документ — список (текст, вес)
+
+        Returns:
+            Матрица len(documents) x число типов; строки без известных
+            признаков — нули
+        """
+        model = self._model
+        data, indices, indptr = vectorize(documents, model["n_features"], model["idf"])
+        probabilities = _softmax(_matmul(data, indices, indptr, model["coef"]) + model["intercept"])
+        probabilities[np.diff(indptr) == 0] = 0
+        return probabilities
+
+    def classify_batch(self, windows: Sequence[Sequence[str]]) -> List[Optional[str]]:
+        """
+        Выбирает тип для пачки окон контекста
+
+        Args:
+            windows: окна — сообщения пользователя от старых к новым
+
+        Returns:
+            Тип для каждого окна или None, если тип не определён
+        """
+        if not self.available:
+            self.fallbacks += len(windows)
+            return [type_classifier.classify(window) for window in windows]
+
+        # Окно — один документ, сообщения взвешены по давности, как в TypeClassifier
+        probabilities = self.predict_proba(window_documents(windows))
+        best = probabilities.argmax(axis=1)
+        types = self._model["types"]
+
+        result = []
+        for window, index, confidence in zip(windows, best, probabilities[np.arange(len(windows)), best]):
+            if confidence >= self.min_confidence:
+                self.predictions += 1
+                result.append(types[index])
+            else:
+                self.fallbacks += 1
+                result.append(type_classifier.classify(window))
+        return result
+
+    def classify(self, texts: Sequence[str]) -> Optional[str]:
+        """Выбирает тип по окну сообщений пользователя (от старых к новым)"""
+        return self.classify_batch([texts])[0]
+
+    def get_stats(self) -> Dict[str, object]:
+        """Статистика классификатора"""
+        return {
+            'model_loaded': self._model is not None,
+            'predictions': self.predictions,
+            'fallbacks': self.fallbacks,
+        }
+
+
+# Глобальный экземпляр
+type_model = TypeModel()
+
+
+async def load_training_data() -> Tuple[List[List[str]], List[str], List[int], List[datetime]]:
+    """
+    Собирает примеры из таблицы messages
+
+    Пример — сообщения пользователя, после которых он выбрал тип кнопкой
+    (бот сохранил комплимент с type_chosen), с меткой выбранного типа.
+    Классифицируются именно сообщения пользователя, поэтому и учиться
+    нужно на них, а не на текстах комплиментов: те берутся из пула и
+    шаблонов и повторяются. В окно попадают сообщения после предыдущего
+    выбора и не старше CHOICE_CONTEXT_AGE; нажатие без сообщений перед
+    ним примера не даёт. Команды, шаблоны fallback и повторы одинаковых
+    примеров отбрасываются.
+
+    Returns:
+        (окна сообщений от старых к новым, типы, users.id автора, время выбора)
+    """
+    templates = {text for texts in fallback_generator.compliments.values() for text in texts}
+    window_size = type_classifier.window
+    windows: List[List[str]] = []
+    labels: List[str] = []
+    users: List[int] = []
+    chosen_at: List[datetime] = []
+    seen = set()
+
+    current_user = None
+    recent: List[Tuple[datetime, str]] = []
+    async with get_db() as db:
+        result = await db.stream(
+            select(Message.user_id, Message.text, Message.is_bot, Message.compliment_type, Message.created_at)
+            .where(or_(Message.is_bot == False, Message.type_chosen == True))  # noqa: E712
+            .order_by(Message.user_id, Message.created_at, Message.id)
+        )
+        async for row in result:
+            if row.user_id != current_user:
+                current_user, recent = row.user_id, []
+            if not row.is_bot:
+                text = (row.text or "").strip()
+                # Команды и пересланные комплименты не описывают желание пользователя
+                if text and not text.startswith("/") and text not in templates:
+                    recent = (recent + [(row.created_at, text)])[-window_size:]
+                continue
+
+            window = [text for created_at, text in recent if row.created_at - created_at <= CHOICE_CONTEXT_AGE]
+            recent = []
+            key = (tuple(window), row.compliment_type)
+            if not window or row.compliment_type not in type_classifier.types or key in seen:
+                continue
+            seen.add(key)
+            windows.append(window)
+            labels.append(row.compliment_type)
+            users.append(row.user_id)
+            chosen_at.append(row.created_at)
+    return windows, labels, users, chosen_at
+
+
+def holdout_split(users: Sequence[int], chosen_at: Sequence[datetime]) -> Tuple[List[int], List[int]]:
+    """
+    Делит примеры на обучающие и отложенные
+
+    Если пользователей хотя бы MIN_HOLDOUT_USERS, откладывается каждый
+    десятый пользователь целиком: примеры одного пользователя похожи и
+    завысили бы точность. Иначе (бот одного-двух пользователей)
+    откладываются последние 20% примеров по времени выбора.
+
+    Returns:
+        (индексы обучающих, индексы отложенных)
+    """
+    if len(set(users)) >= MIN_HOLDOUT_USERS:
+        holdout = [i for i, user_id in enumerate(users) if user_id % 10 == 9]
+        if holdout and len(holdout) < len(users):
+            return [i for i, user_id in enumerate(users) if user_id % 10 != 9], holdout
+
+    order = sorted(range(len(users)), key=lambda i: chosen_at[i])
+    cut = len(order) - len(order) // 5
+    return sorted(order[:cut]), sorted(order[cut:])
+
+
+async def _train_command(args):
+    try:
+        windows, labels, users, chosen_at = await load_training_data()
+    finally:
+        await close_db()
+
+    types = [t for t in type_classifier.types if t in set(labels)]
+    if len(types) < 2:
+        logger.error("Недостаточно размеченных сообщений: {} примеров, типы {}", len(windows), types)
+        return
+    logger.info("Примеров для обучения: {} ({})", len(windows),
+                ", ".join(f"{t}: {labels.count(t)}" for t in types))
+
+    train_idx, holdout = holdout_split(users, chosen_at)
+    if not holdout:
+        logger.warning("Слишком мало примеров для отложенной выборки, точность не оценивается")
+    else:
+        arrays = train([windows[i] for i in train_idx], [labels[i] for i in train_idx], types,
+                       n_features=args.features, epochs=args.epochs)
+        model = TypeModel(path="", min_confidence=0)
+        model._loaded = True
+        model._model = {"types": tuple(types), "n_features": args.features, **arrays}
+        predicted = model.classify_batch([windows[i] for i in holdout])
+        keywords = [type_classifier.classify(windows[i]) for i in holdout]
+        accuracy = sum(p == labels[i] for p, i in zip(predicted, holdout)) / len(holdout)
+        baseline = sum(k == labels[i] for k, i in zip(keywords, holdout)) / len(holdout)
+        logger.info("Точность на отложенных {} примерах: {:.1%} (ключевые слова: {:.1%})",
+                    len(holdout), accuracy, baseline)
+
+    arrays = train(windows, labels, types, n_features=args.features, epochs=args.epochs)
+    save_model(args.output, arrays, types, args.features, len(windows))
+    logger.info("Модель сохранена в {}", args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обучение классификатора типа комплимента по истории сообщений")
+    parser.add_argument("--output", default=settings.TYPE_MODEL_PATH, help="каталог модели")
+    parser.add_argument("--features", type=int, default=2 ** 18, help="число хэш-признаков")
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+    if not NUMPY_AVAILABLE:
+        parser.error("для обучения нужен numpy (pip install numpy)")
+    asyncio.run(_train_command(args))
+
+
+if __name__ == "__main__":
+    main()
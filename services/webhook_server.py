@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from loguru import logger
+
+from config.settings import settings
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def get_webhook_secret(token: str = settings.TELEGRAM_BOT_TOKEN) -> str:
+    """Секрет вебхука из настроек или производный от токена бота"""
+    if settings.WEBHOOK_SECRET:
+        return settings.WEBHOOK_SECRET
+    # Telegram допускает только A-Z, a-z, 0-9, _ и -
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class WebhookServer:
+    """
+    Приём апдейтов через вебхук на aiohttp
+
+    Обработчик запроса только проверяет секрет, разбирает Update и кладёт
+    его в ограниченную очередь, поэтому Telegram сразу получает ответ 200.
+    Апдейты обрабатывают workers задач; при переполненной очереди сервер
+    отвечает 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self,
+                 bot: Bot,
+                 dp: Dispatcher,
+                 path: str = settings.WEBHOOK_PATH,
+                 secret: Optional[str] = None,
+                 workers: int = settings.WEBHOOK_WORKERS,
+                 queue_size: int = settings.WEBHOOK_QUEUE_SIZE):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        self.secret = secret if secret is not None else get_webhook_secret(bot.token)
+        self.workers = workers
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+        self._stopped = asyncio.Event()
+        self.started_at = time.monotonic()
+
+        # Метрики
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy = 0
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Принимает апдейт от Telegram"""
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            data = await request.json()
+            update = Update.model_validate(data, context={"bot": self.bot})
+        except Exception as e:
+            self.rejected += 1
+            logger.warning(f"Некорректный апдейт в вебхуке: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.busy += 1
+            logger.warning(f"Очередь вебхука переполнена ({self.queue.qsize()}), апдейт {update.update_id} отклонён")
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        """Проверка живости без подробностей: сервер слушает публичный адрес"""
+        # Статистика вебхука публикуется сервером метрик (METRICS_ENABLED)
+        if self._stopped.is_set() or self.queue.full():
+            return web.Response(status=503)
+        return web.Response(text="ok")
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка при обработке апдейта {update.update_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def start(self, host: str = settings.WEBHOOK_HOST, port: int = settings.WEBHOOK_PORT):
+        """Запускает обработчики, HTTP сервер и регистрирует вебхук в Telegram"""
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Вебхук слушает {host}:{port}{self.path} | обработчиков: {self.workers}")
+
+        if settings.WEBHOOK_URL:
+            url = settings.WEBHOOK_URL.rstrip("/") + self.path
+            await self.bot.set_webhook(
+                url,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=min(100, max(1, self.workers)),
+            )
+            logger.info(f"Вебхук зарегистрирован: {url}")
+        else:
+            logger.warning("WEBHOOK_URL не задан, вебхук в Telegram не зарегистрирован")
+
+    def request_stop(self):
+        self._stopped.set()
+
+    async def wait_closed(self):
+        await self._stopped.wait()
+
+    async def stop(self, timeout: float = 10.0):
+        """Перестаёт принимать апдейты и дорабатывает очередь"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано апдейтов при остановке вебхука: {self.queue.qsize()}")
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика вебхука: очередь и обработанные апдейты"""
+        return {
+            'queue': self.queue.qsize(),
+            'workers': self.workers,
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'busy': self.busy,
+            'uptime': round(time.monotonic() - self.started_at, 1),
+        }
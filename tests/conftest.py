@@ -0,0 +1,50 @@
+"""
+Общие настройки тестов
+
+Движки базы создаются при импорте database.models, поэтому временная
+база SQLite подставляется через окружение до импорта модулей бота.
+
+Запуск:
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP_DIR = Path(tempfile.mkdtemp(prefix="olya_bot_tests_"))
+DB_PATH = _TMP_DIR / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["MESSAGE_JOURNAL_PATH"] = ""
+os.environ["METRICS_ENABLED"] = "false"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def run_db():
+    """
+    Запускает корутину на пустой базе
+
+    База пересоздаётся для каждого теста, после теста соединения
+    закрываются: у каждого asyncio.run свой цикл событий.
+    """
+    from database.models import close_db, init_db
+
+    def run(scenario):
+        async def wrapper():
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+            await init_db()
+            try:
+                return await scenario()
+            finally:
+                await close_db()
+
+        return asyncio.run(wrapper())
+
+    return run
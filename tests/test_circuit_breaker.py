@@ -0,0 +1,70 @@
+from services.circuit_breaker import CircuitBreaker
+
+
+def make_breaker(**overrides):
+    options = dict(window_size=10, window_seconds=60, error_threshold=0.5, min_requests=4, cooldown=60)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+def test_stays_closed_below_min_requests():
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_trips_on_error_rate_and_blocks_during_cooldown():
+    breaker = make_breaker()
+    breaker.record_success(0.1)
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.health_score == 0.0
+
+
+def test_half_open_allows_single_probe():
+    breaker = make_breaker(cooldown=0)
+    breaker.trip()
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Второй запрос ждёт итога пробного
+    assert not breaker.allow_request()
+
+
+def test_probe_success_closes_and_forgets_old_errors():
+    breaker = make_breaker(cooldown=0)
+    for _ in range(4):
+        breaker.record_failure(0.1)
+    assert breaker.allow_request()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.error_rate == 0.0
+
+
+def test_probe_failure_reopens():
+    breaker = make_breaker(cooldown=0)
+    breaker.trip()
+    assert breaker.allow_request()
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_release_frees_probe_slot_without_result():
+    breaker = make_breaker(cooldown=0)
+    breaker.trip()
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_half_open_after_background_check():
+    breaker = make_breaker()
+    breaker.trip()
+    assert not breaker.ready_for_probe()
+    breaker.half_open()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
@@ -0,0 +1,111 @@
+"""Keyset-пагинация /history по (created_at, id), в том числе при одинаковом created_at"""
+from datetime import datetime, timedelta
+
+from database.models import Message, User, get_db
+from services.context_manager import ContextManager, HistoryCursor
+
+TELEGRAM_ID = 42
+PAGE_SIZE = 4
+
+
+async def seed(count=11, same_time=3):
+    """Комплименты группами по same_time с одинаковым created_at, вперемешку с сообщениями пользователя"""
+    start = datetime(2026, 1, 1, 12, 0, 0, 123456)
+    async with get_db() as db:
+        user = User(telegram_id=TELEGRAM_ID)
+        other = User(telegram_id=TELEGRAM_ID + 1)
+        db.add_all([user, other])
+        await db.flush()
+        for i in range(count):
+            created_at = start + timedelta(seconds=i // same_time)
+            db.add(Message(user_id=user.id, text=f"вопрос {i}", is_bot=False, created_at=created_at))
+            db.add(Message(user_id=user.id, text=f"комплимент {i}", is_bot=True, created_at=created_at))
+            db.add(Message(user_id=other.id, text=f"чужой {i}", is_bot=True, created_at=created_at))
+        await db.commit()
+
+
+def texts(page):
+    return [msg.text for msg in page.compliments]
+
+
+def roundtrip(cursor):
+    """Курсор проходит через callback data так же, как в handlers/commands.py"""
+    return HistoryCursor.from_timestamp_us(cursor.timestamp_us, cursor.id)
+
+
+async def walk_older(manager):
+    pages = []
+    async with get_db() as db:
+        page = await manager.get_compliments_page(TELEGRAM_ID, db, limit=PAGE_SIZE)
+        pages.append(page)
+        while page.older is not None:
+            page = await manager.get_compliments_page(TELEGRAM_ID, db, limit=PAGE_SIZE,
+                                                      older_than=roundtrip(page.older))
+            pages.append(page)
+    return pages
+
+
+def test_older_pages_cover_everything_once(run_db):
+    async def scenario():
+        await seed()
+        return await walk_older(ContextManager())
+
+    pages = run_db(scenario)
+    seen = [text for page in pages for text in texts(page)]
+    assert seen == [f"комплимент {i}" for i in range(10, -1, -1)]
+    assert [len(page.compliments) for page in pages] == [4, 4, 3]
+    assert pages[0].newer is None
+    assert all(page.newer is not None for page in pages[1:])
+
+
+def test_newer_pages_walk_back_to_first(run_db):
+    async def scenario():
+        await seed()
+        manager = ContextManager()
+        older_pages = await walk_older(manager)
+        newer_pages = [older_pages[-1]]
+        async with get_db() as db:
+            page = older_pages[-1]
+            while page.newer is not None:
+                page = await manager.get_compliments_page(TELEGRAM_ID, db, limit=PAGE_SIZE,
+                                                          newer_than=roundtrip(page.newer))
+                newer_pages.append(page)
+        return older_pages, newer_pages
+
+    older_pages, newer_pages = run_db(scenario)
+    # Назад возвращаются ровно те же страницы в обратном порядке
+    assert [texts(page) for page in newer_pages] == [texts(page) for page in reversed(older_pages)]
+    assert newer_pages[-1].newer is None
+    assert newer_pages[-1].older is not None
+
+
+def test_cursor_inside_group_of_equal_timestamps(run_db):
+    async def scenario():
+        await seed(count=6, same_time=6)
+        manager = ContextManager()
+        async with get_db() as db:
+            first = await manager.get_compliments_page(TELEGRAM_ID, db, limit=2)
+            second = await manager.get_compliments_page(TELEGRAM_ID, db, limit=2,
+                                                        older_than=roundtrip(first.older))
+            back = await manager.get_compliments_page(TELEGRAM_ID, db, limit=2,
+                                                      newer_than=roundtrip(second.newer))
+        return first, second, back
+
+    first, second, back = run_db(scenario)
+    assert texts(first) == ["комплимент 5", "комплимент 4"]
+    assert texts(second) == ["комплимент 3", "комплимент 2"]
+    assert texts(back) == texts(first)
+
+
+def test_empty_history(run_db):
+    async def scenario():
+        async with get_db() as db:
+            return await ContextManager().get_compliments_page(TELEGRAM_ID, db, limit=PAGE_SIZE)
+
+    page = run_db(scenario)
+    assert page.compliments == [] and page.older is None and page.newer is None
+
+
+def test_cursor_timestamp_roundtrip_is_exact():
+    cursor = HistoryCursor(datetime(2026, 3, 1, 23, 59, 59, 999999), 7)
+    assert roundtrip(cursor) == cursor
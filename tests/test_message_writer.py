@@ -0,0 +1,132 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from services import message_writer
+from services.message_writer import MessageWriter, PendingMessage
+
+
+@pytest.fixture(autouse=True)
+def no_retry_pause(monkeypatch):
+    """Повторы записи пачки без пауз в 1 и 2 секунды"""
+    sleep = asyncio.sleep
+    monkeypatch.setattr(message_writer.asyncio, "sleep", lambda delay: sleep(0))
+
+
+class Database:
+    """Вместо записи в базу запоминает seq; пачки с seq из fail_seqs не записываются"""
+
+    def __init__(self, fail_seqs=()):
+        self.fail_seqs = set(fail_seqs)
+        self.written = []
+
+    async def flush(self, batch):
+        if self.fail_seqs & {item.seq for item in batch}:
+            raise RuntimeError("база недоступна")
+        self.written.extend(item.seq for item in batch)
+
+
+def journal_entry(seq):
+    return PendingMessage(seq, 1, f"сообщение {seq}", False, None, datetime(2026, 1, 1), False).to_json()
+
+
+def test_clean_run_writes_everything_and_empties_journal(tmp_path):
+    journal = tmp_path / "journal.log"
+    database = Database()
+
+    async def scenario():
+        writer = MessageWriter(database.flush, batch_size=2, flush_interval=0.01, journal_path=str(journal))
+        await writer.start()
+        for i in range(5):
+            await writer.enqueue(1, f"сообщение {i}", False)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert database.written == [1, 2, 3, 4, 5]
+    assert writer.depth == 0 and writer.failed_batches == 0
+    assert journal.read_text(encoding="utf-8") == ""
+
+
+def test_recovers_unflushed_messages_after_crash(tmp_path):
+    journal = tmp_path / "journal.log"
+    lines = [journal_entry(seq) for seq in range(1, 6)]
+    lines.insert(2, json.dumps({"flushed": 2, "from": 1}))
+    # Строка, недописанная в момент падения
+    lines.append(journal_entry(6)[:20])
+    journal.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    database = Database()
+
+    async def scenario():
+        writer = MessageWriter(database.flush, journal_path=str(journal))
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    assert database.written == [3, 4, 5]
+    assert journal.read_text(encoding="utf-8") == ""
+
+
+def test_failed_batch_stays_in_journal_until_restart(tmp_path):
+    journal = tmp_path / "journal.log"
+    database = Database(fail_seqs={1})
+
+    async def scenario():
+        writer = MessageWriter(database.flush, batch_size=2, flush_interval=0.01, journal_path=str(journal))
+        await writer.start()
+        for i in range(4):
+            await writer.enqueue(1, f"сообщение {i}", False)
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert database.written == [3, 4]
+    assert writer.failed_batches == 1 and writer.failed_messages == 2
+
+    # После рестарта база снова доступна: дописывается только не записанная пачка
+    restarted = Database()
+
+    async def restart():
+        writer = MessageWriter(restarted.flush, journal_path=str(journal))
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(restart())
+    assert restarted.written == [1, 2]
+    assert journal.read_text(encoding="utf-8") == ""
+
+
+def test_unrecoverable_journal_is_quarantined(tmp_path):
+    journal = tmp_path / "journal.log"
+    journal.write_text(journal_entry(1) + "\n", encoding="utf-8")
+    database = Database(fail_seqs={1})
+
+    async def scenario():
+        writer = MessageWriter(database.flush, journal_path=str(journal))
+        await writer.start()
+        await writer.stop()
+
+    asyncio.run(scenario())
+    quarantined = list(tmp_path.glob("journal.log.failed-*"))
+    assert len(quarantined) == 1
+    assert quarantined[0].read_text(encoding="utf-8").startswith(journal_entry(1))
+    # Бот запускается с пустым журналом
+    assert journal.read_text(encoding="utf-8") == ""
+
+
+def test_pending_messages_are_visible_before_flush():
+    database = Database()
+
+    async def scenario():
+        writer = MessageWriter(database.flush, batch_size=10, flush_interval=60)
+        await writer.start()
+        await writer.enqueue(1, "первое", False)
+        await writer.enqueue(2, "чужое", False)
+        pending = [item.text for item in writer.pending_for(1)]
+        await writer.stop()
+        return pending
+
+    assert asyncio.run(scenario()) == ["первое"]
+    assert database.written == [1, 2]
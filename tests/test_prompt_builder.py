@@ -0,0 +1,74 @@
+from services.context_manager import HistoryMessage
+from services.prompt_builder import MESSAGE_OVERHEAD_TOKENS, PromptBuilder, count_tokens, truncate_to_tokens
+
+
+def make_builder(**overrides):
+    options = dict(max_turns=10, budget=300, max_message_tokens=60, max_turn_tokens=40, summary_tokens=50)
+    options.update(overrides)
+    return PromptBuilder("test", "Ты делаешь комплименты.", {"appearance": " Про внешность."}, **options)
+
+
+def history(count):
+    messages = []
+    for i in range(count):
+        messages.append(HistoryMessage(f"Сообщение пользователя номер {i}. Подробности " + "слово " * 15,
+                                       False, None, None))
+        messages.append(HistoryMessage(f"Ответ бота номер {i} " + "комплимент " * 10, True, "character", None))
+    return messages
+
+
+def measured(prompt):
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in prompt.messages)
+
+
+def test_truncate_to_tokens():
+    text = "очень длинное сообщение " * 50
+    cut = truncate_to_tokens(text, 10)
+    assert cut.endswith("…")
+    assert count_tokens(cut) <= 10
+    assert truncate_to_tokens("коротко", 10) == "коротко"
+    assert truncate_to_tokens("что угодно", 0) == ""
+
+
+def test_short_history_is_kept_whole():
+    builder = make_builder()
+    turns = history(1)
+    prompt = builder.build("Привет", turns, "appearance")
+    assert [m["role"] for m in prompt.messages] == ["system", "user", "assistant", "user"]
+    assert prompt.messages[0]["content"].endswith("Про внешность.")
+    assert prompt.messages[-1]["content"] == "Привет"
+    assert prompt.tokens == measured(prompt)
+
+
+def test_long_history_fits_budget_with_summary():
+    builder = make_builder()
+    prompt = builder.build("Как я тебе?", history(10), None)
+    assert prompt.tokens <= builder.budget
+    assert prompt.tokens == measured(prompt)
+    summary = prompt.messages[1]
+    assert summary["role"] == "system"
+    assert summary["content"].startswith("Ранее пользователь писал: «Сообщение пользователя номер")
+    # Остаются самые новые реплики
+    assert prompt.messages[-2]["content"].startswith("Ответ бота номер 9")
+    assert prompt.tokens_saved > 0
+    assert builder.summarized_turns > 0
+
+
+def test_current_message_in_history_is_not_duplicated():
+    builder = make_builder()
+    turns = history(1) + [HistoryMessage("Привет", False, None, None)]
+    prompt = builder.build("Привет", turns, None)
+    assert [m["content"] for m in prompt.messages].count("Привет") == 1
+
+
+def test_long_current_message_is_truncated():
+    builder = make_builder(max_message_tokens=20)
+    prompt = builder.build("очень длинное сообщение " * 40, [], None)
+    assert count_tokens(prompt.messages[-1]["content"]) <= 20
+    assert builder.truncated_messages == 1
+
+
+def test_system_prompt_is_rendered_once_per_type():
+    builder = make_builder()
+    assert builder.system_prompt("appearance") is builder.system_prompt("appearance")
+    assert builder.system_prompt(None)["message"]["content"] == "Ты делаешь комплименты."
@@ -0,0 +1,87 @@
+import time
+
+from services.context_manager import HistoryMessage
+from services.response_cache import ResponseCache, normalize_text
+
+
+def make_cache(**overrides):
+    options = dict(max_entries=100, ttl=3600, max_variants=3, history_turns=2, similarity=0.6)
+    options.update(overrides)
+    return ResponseCache(**options)
+
+
+def user(text):
+    return HistoryMessage(text, False, None, None)
+
+
+def test_normalize_text():
+    assert normalize_text("  Ёлка, ПРИВЕТ!!! 🎄 ") == "елка привет"
+
+
+def test_exact_hit_after_put():
+    cache = make_cache()
+    cache.put(1, "Привет!", [], "appearance", "Ты прекрасна", 1.5)
+    assert cache.get(2, "привет", [], "appearance") == "Ты прекрасна"
+    assert cache.hits == 1 and cache.similar_hits == 0
+    assert cache.latency_saved == 1.5
+
+
+def test_type_and_context_are_part_of_key():
+    cache = make_cache()
+    cache.put(1, "привет", [user("я сдала экзамен")], "appearance", "A", 1.0)
+    assert cache.get(2, "привет", [user("я сдала экзамен")], "character") is None
+    assert cache.get(2, "привет", [user("у меня новое платье")], "appearance") is None
+    assert cache.get(2, "привет", [user("я сдала экзамен")], "appearance") == "A"
+
+
+def test_similar_wording_hits_only_with_same_type():
+    cache = make_cache()
+    cache.put(1, "как я тебе сегодня", [], "appearance", "A", 1.0)
+    assert cache.get(2, "как я тебе сегодня?!", [], "appearance") == "A"
+    # Последний выданный вариант не повторяется тому же пользователю, поэтому другие пользователи
+    assert cache.get(3, "как я тебе сегодня утром", [], "appearance") == "A"
+    assert cache.similar_hits == 1
+    assert cache.get(4, "как я тебе сегодня утром", [], "character") is None
+    assert cache.get(4, "что приготовить на ужин", [], "appearance") is None
+
+
+def test_user_does_not_get_the_same_variant_twice():
+    cache = make_cache()
+    cache.put(None, "привет", [], None, "A", 1.0)
+    cache.put(None, "привет", [], None, "B", 1.0)
+    first = cache.get(7, "привет", [], None)
+    second = cache.get(7, "привет", [], None)
+    assert {first, second} == {"A", "B"}
+
+
+def test_avoid_skips_variants():
+    cache = make_cache()
+    cache.put(None, "привет", [], None, "A", 1.0)
+    assert cache.get(7, "привет", [], None, avoid=lambda text: text == "A") is None
+
+
+def test_variants_are_capped():
+    cache = make_cache(max_variants=2)
+    for variant in ("A", "B", "C"):
+        cache.put(None, "привет", [], None, variant, 1.0)
+    assert cache._entries[("привет", "", ())].variants == ["B", "C"]
+
+
+def test_lru_eviction_keeps_trigram_index_in_sync():
+    cache = make_cache(max_entries=3)
+    for i in range(10):
+        cache.put(None, f"сообщение номер {i}", [], "appearance", f"K{i}", 1.0)
+    indexed = {(text, *suffix) for suffix, grams in cache._grams_index.items()
+               for texts in grams.values() for text in texts}
+    assert indexed == set(cache._entries)
+    assert len(cache._entries) == 3
+
+
+def test_expired_entries_are_not_served():
+    cache = make_cache(ttl=10)
+    cache.put(None, "привет", [], None, "A", 1.0)
+    cache._entries[("привет", "", ())].created_at = time.monotonic() - 11
+    assert cache.get(1, "привет", [], None) is None
+    assert cache.get(1, "привет!", [], None) is None
+    assert not cache._grams_index
+    assert cache.bytes_used == 0
@@ -0,0 +1,63 @@
+from services.served_index import ServedIndex, simhash
+from utils.fallback_generator import fallback_generator
+
+TEMPLATE = fallback_generator.compliments["character"][0]
+
+
+def distance(a, b):
+    return (simhash(a) ^ simhash(b)).bit_count()
+
+
+def test_simhash_ignores_case_punctuation_and_yo():
+    assert simhash("Ёлка, ПРИВЕТ!") == simhash("елка привет")
+    assert simhash("") == 0
+    assert simhash("🙂 !!!") == 0
+
+
+def test_simhash_small_edit_is_close_and_other_text_is_far():
+    words = TEMPLATE.split()
+    words.insert(2, "очень")
+    edited = " ".join(words)
+    limit = ServedIndex().max_distance
+    assert distance(TEMPLATE, edited) <= limit
+    assert distance(TEMPLATE, "Что приготовить на ужин в субботу вечером") > limit
+
+
+def test_seen_similar_per_user():
+    index = ServedIndex(history_size=3, max_users=10)
+    assert not index.seen_similar(1, TEMPLATE)
+    index.remember(1, TEMPLATE)
+    assert index.seen_similar(1, TEMPLATE.replace("Оля, ", ""))
+    assert not index.seen_similar(2, TEMPLATE)
+    assert not index.seen_similar(None, TEMPLATE)
+    assert index.repeats == 1
+
+
+def test_history_size_forgets_oldest():
+    index = ServedIndex(history_size=2, max_users=10)
+    texts = [fallback_generator.compliments[kind][0] for kind in ("appearance", "achievements", "general")]
+    for text in texts:
+        index.remember(1, text)
+    assert not index.seen_similar(1, texts[0])
+    assert index.seen_similar(1, texts[2])
+
+
+def test_users_evicted_in_lru_order():
+    index = ServedIndex(history_size=2, max_users=2)
+    for user_id in (1, 2, 1, 3):
+        index.remember(user_id, TEMPLATE)
+        index._loaded[user_id] = True
+    assert list(index._users) == [1, 3]
+    # Вытесненного пользователя при следующем обращении загрузят из базы заново
+    assert 2 not in index._loaded
+
+
+def test_fallback_avoids_served_templates():
+    index = ServedIndex(history_size=50, max_users=10)
+    templates = fallback_generator.compliments["character"]
+    served = []
+    for _ in range(len(templates)):
+        text = fallback_generator.generate_compliment("character", avoid=index.avoid_for(1))
+        served.append(text)
+        index.remember(1, text)
+    assert len(set(served)) == len(templates)
@@ -0,0 +1,123 @@
+import asyncio
+
+from aiogram.types import User
+
+from middlewares.scheduling import SchedulingMiddleware
+from middlewares.throttling import ThrottlingMiddleware, TokenBucket
+from services.fair_scheduler import FairScheduler
+
+
+def test_token_bucket_burst_then_refill():
+    bucket = TokenBucket(rate=2, capacity=3)
+    start = bucket.updated
+    assert [bucket.try_acquire(start) for _ in range(4)] == [True, True, True, False]
+    # Через полсекунды при 2 токенах в секунду появляется один токен
+    assert bucket.try_acquire(start + 0.5)
+    assert not bucket.try_acquire(start + 0.5)
+
+
+def test_token_bucket_refund_is_capped():
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.refund()
+    assert bucket.tokens == 2
+
+
+def call(middleware, handler, user_id):
+    user = User(id=user_id, is_bot=False, first_name="Оля")
+    return asyncio.run(middleware(handler, None, {"event_from_user": user}))
+
+
+def test_throttled_requests_get_fallback_flag():
+    middleware = ThrottlingMiddleware(user_rate=0.001, user_burst=2, global_rate=100, global_burst=100,
+                                      action="fallback")
+
+    async def handler(event, data):
+        return data.get("throttled", False)
+
+    assert [call(middleware, handler, 1) for _ in range(3)] == [False, False, True]
+    # Лимит у каждого пользователя свой
+    assert call(middleware, handler, 2) is False
+    assert middleware.throttled_user == 1
+
+
+def test_global_limit_refunds_user_token():
+    middleware = ThrottlingMiddleware(user_rate=0.001, user_burst=5, global_rate=0.001, global_burst=1,
+                                      action="drop")
+
+    async def handler(event, data):
+        return True
+
+    assert call(middleware, handler, 1) is True
+    assert call(middleware, handler, 2) is None
+    assert middleware.throttled_global == 1
+    # Токен пользователя 2 возвращён: его не наказывают за общий лимит
+    assert middleware._users[2].tokens == 5
+
+
+def test_buckets_evicted_in_lru_order_with_warnings():
+    middleware = ThrottlingMiddleware(max_users=2)
+    middleware._warned = {1, 2}
+    middleware._user_bucket(1)
+    middleware._user_bucket(2)
+    middleware._user_bucket(1)
+    middleware._user_bucket(3)
+    assert list(middleware._users) == [1, 3]
+    assert middleware._warned == {1}
+
+
+def test_scheduling_skips_throttled_requests():
+    scheduler = FairScheduler(capacity=1)
+    middleware = SchedulingMiddleware(scheduler)
+    user = User(id=1, is_bot=False, first_name="Оля")
+
+    async def handler(event, data):
+        return scheduler.active
+
+    async def scenario():
+        granted = await middleware(handler, None, {"event_from_user": user})
+        throttled = await middleware(handler, None, {"event_from_user": user, "throttled": True})
+        return granted, throttled
+
+    assert asyncio.run(scenario()) == (1, 0)
+    assert scheduler.granted == 1
+
+
+def test_fair_scheduler_serves_light_user_before_heavy_backlog():
+    scheduler = FairScheduler(capacity=1)
+    order = []
+
+    async def job(user_id, label):
+        async with scheduler.slot(user_id):
+            order.append(label)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await scheduler.acquire(0)  # слот занят, дальше все ждут в очереди
+        tasks = [asyncio.create_task(job(1, f"heavy{i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job(2, "light")))
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    # Первая генерация тяжёлого пользователя и генерация лёгкого имеют одинаковую
+    # метку, остальные тяжёлые — позже
+    assert order.index("light") <= 1
+    assert scheduler.active == 0
+    assert scheduler.queued == 4
+
+
+def test_fair_scheduler_returns_slot_of_cancelled_waiter():
+    scheduler = FairScheduler(capacity=1)
+
+    async def scenario():
+        await scheduler.acquire(1)
+        waiter = asyncio.create_task(scheduler.acquire(2))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        return scheduler.active, scheduler.get_stats()["waiting"]
+
+    assert asyncio.run(scenario()) == (0, 0)
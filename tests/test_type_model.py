@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.models import Message, User, get_db
+from services.type_model import (
+    MIN_HOLDOUT_USERS, NUMPY_AVAILABLE, TypeModel, holdout_split, load_training_data, train
+)
+from utils.fallback_generator import fallback_generator
+from utils.type_classifier import type_classifier
+
+requires_numpy = pytest.mark.skipif(not NUMPY_AVAILABLE, reason="модели нужен numpy")
+
+TYPES = ["appearance", "character", "achievements"]
+EXAMPLES = {
+    "appearance": ["у меня новая прическа", "купила красивое платье", "сделала макияж"],
+    "character": ["помогла подруге с переездом", "поддержала маму", "выслушала друга"],
+    "achievements": ["сдала экзамен на отлично", "закончила проект", "получила повышение"],
+}
+
+
+def trained_model(min_confidence=0.0):
+    windows = [[text] for texts in EXAMPLES.values() for text in texts]
+    labels = [label for label, texts in EXAMPLES.items() for _ in texts]
+    arrays = train(windows, labels, TYPES, n_features=2 ** 12, epochs=200)
+    model = TypeModel(path="", min_confidence=min_confidence)
+    model._loaded = True
+    model._model = {"types": tuple(TYPES), "n_features": 2 ** 12, **arrays}
+    return model
+
+
+def test_missing_model_falls_back_to_keywords(tmp_path):
+    model = TypeModel(path=str(tmp_path / "нет модели"))
+    window = ["сегодня сдала экзамен"]
+    assert model.classify(window) == type_classifier.classify(window)
+    assert not model.available
+    assert model.fallbacks == 1 and model.predictions == 0
+
+
+@requires_numpy
+def test_trained_model_predicts_training_examples():
+    model = trained_model()
+    windows = [[texts[0]] for texts in EXAMPLES.values()]
+    assert model.classify_batch(windows) == TYPES
+    assert model.predictions == 3
+
+
+@requires_numpy
+def test_low_confidence_falls_back_to_keywords():
+    model = trained_model(min_confidence=1.01)
+    window = ["как дела"]
+    assert model.classify(window) == type_classifier.classify(window)
+    assert model.fallbacks == 1
+
+
+def test_holdout_split_by_time_for_few_users():
+    started = datetime(2026, 1, 1)
+    chosen_at = [started + timedelta(minutes=i) for i in (3, 1, 4, 0, 2, 9, 8, 7, 6, 5)]
+    train_idx, holdout = holdout_split([1] * 10, chosen_at)
+    # Последние 20% по времени: минуты 8 и 9
+    assert holdout == [5, 6]
+    assert sorted(train_idx + holdout) == list(range(10))
+
+
+def test_holdout_split_by_user_for_many_users():
+    users = list(range(MIN_HOLDOUT_USERS * 2))
+    chosen_at = [datetime(2026, 1, 1)] * len(users)
+    train_idx, holdout = holdout_split(users, chosen_at)
+    assert holdout == [user_id for user_id in users if user_id % 10 == 9]
+    assert not set(train_idx) & set(holdout)
+
+
+def test_training_data_pairs_user_messages_with_button_choice(run_db):
+    template = fallback_generator.compliments["appearance"][0]
+    started = datetime(2026, 1, 1, 12)
+
+    async def scenario():
+        async with get_db() as db:
+            user = User(telegram_id=1)
+            db.add(user)
+            await db.flush()
+            rows = [
+                # Сообщения перед выбором кнопкой — пример
+                (0, "у меня новое платье", False, None),
+                (1, "/start", False, None),
+                (2, template, False, None),
+                (3, template, True, "appearance"),
+                # Повторное нажатие без новых сообщений примера не даёт
+                (4, template, True, "appearance"),
+                # Тот же текст и тот же выбор — дубликат
+                (10, "у меня новое платье", False, None),
+                (11, "ещё шаблон", True, "appearance"),
+                # Сообщение слишком давнее для этого выбора
+                (20, "сдала экзамен", False, None),
+                (200, "комплимент", True, "achievements"),
+                # Обычный ответ бота (тип определил классификатор) — не метка
+                (210, "поддержала подругу", False, None),
+                (211, "комплимент", True, "character"),
+            ]
+            for minute, text, is_bot, compliment_type in rows:
+                db.add(Message(user_id=user.id, text=text, is_bot=is_bot, compliment_type=compliment_type,
+                               type_chosen=True if is_bot and minute != 211 else None,
+                               created_at=started + timedelta(minutes=minute)))
+            await db.commit()
+        return await load_training_data()
+
+    windows, labels, users, chosen_at = run_db(scenario)
+    assert windows == [["у меня новое платье"]]
+    assert labels == ["appearance"]
+    assert chosen_at == [started + timedelta(minutes=3)]
+    assert len(users) == 1
@@ -1,7 +1,10 @@
 import random
-from typing import List, Optional
+from typing import Callable, List, Dict, Any, Optional
 from loguru import logger
 
+from utils.logger import debug_sampled
+from utils.type_classifier import type_classifier
+
 
 class FallbackComplimentGenerator:
     """Локальный генератор комплиментов"""
@@ -45,13 +48,16 @@ class FallbackComplimentGenerator:
     
     def generate_compliment(self,
                            compliment_type: Optional[str] = None,
-                           context: Optional[List[str]] = None) -> str:
+                           context: Optional[List[str]] = None,
+                           avoid: Optional[Callable[[str], bool]] = None) -> str:
         """
         Генерирует комплимент (синхронный метод)
         
         Args:
             compliment_type: тип комплимента
             context: контекстные сообщения
+            avoid: возвращает True для комплимента, который пользователь
+                уже получал (берётся другой шаблон, пока они не кончатся)
             
         Returns:
             Сгенерированный комплимент
@@ -60,17 +66,18 @@ class FallbackComplimentGenerator:
             # Определяем тип комплимента на основе контекста
             actual_type = compliment_type or self._detect_type_from_context(context)
             
-            # Выбираем случайный комплимент из нужной категории
-            if actual_type in self.compliments:
-                compliment = random.choice(self.compliments[actual_type])
-            else:
-                compliment = random.choice(self.compliments["general"])
+            # Шаблоны нужной категории в случайном порядке
+            templates = self.compliments.get(actual_type, self.compliments["general"])
+            candidates = random.sample(templates, len(templates)) if avoid else [random.choice(templates)]
             
-            # Можем немного модифицировать на основе контекста
-            if context and len(context) > 0:
-                compliment = self._personalize_from_context(compliment, context)
+            for compliment in candidates:
+                # Можем немного модифицировать на основе контекста
+                if context and len(context) > 0:
+                    compliment = self._personalize_from_context(compliment, context)
+                if avoid is None or not avoid(compliment):
+                    break
             
-            logger.debug(f"Fallback сгенерировал: {compliment[:50]}...")
+            debug_sampled("Fallback сгенерировал: {:.50}...", compliment)
             return compliment
             
         except Exception as e:
@@ -81,27 +88,7 @@ class FallbackComplimentGenerator:
         """Определяет тип комплимента из контекста"""
         if not context:
             return "general"
-        
-        # Анализируем последнее сообщение
-        last_message = context[-1].lower() if context else ""
-        
-        appearance_words = ["красив", "стиль", "внешн", "улыб", "глаз", "волос", "одежд"]
-        character_words = ["умн", "добр", "весел", "поддерж", "помощ", "забот"]
-        achievement_words = ["работа", "успех", "достиж", "проект", "цель", "результат"]
-        
-        for word in appearance_words:
-            if word in last_message:
-                return "appearance"
-        
-        for word in character_words:
-            if word in last_message:
-                return "character"
-        
-        for word in achievement_words:
-            if word in last_message:
-                return "achievements"
-        
-        return "general"
+        return type_classifier.classify(context) or "general"
     
     def _personalize_from_context(self, compliment: str, context: List[str]) -> str:
         """Персонализирует комплимент на основе контекста"""
@@ -1,25 +1,233 @@
+import bz2
+import gzip
+import logging
+import logging.handlers
+import lzma
+import os
+import queue
+import random
+import shutil
 import sys
+import tarfile
+import threading
+import zipfile
+from typing import Callable, Dict, List, Optional
 from loguru import logger
 from pathlib import Path
 
-# Создаем директорию для логов
-Path("logs").mkdir(exist_ok=True)
+from config.settings import settings
 
-# Конфигурация логгера
-logger.remove()
-logger.add(
-    sys.stderr,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-    level="INFO"
+CONSOLE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+    "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 )
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+# Пишется ли DEBUG хоть одним обработчиком (до setup_logging — как у loguru по умолчанию)
+_debug_enabled = True
+# Логгер, который подставляет в запись место вызова debug_sampled
+_caller_logger = logger.opt(depth=1)
+
+
+def _zip(source: str, dest: str):
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(source, Path(source).name)
+
+
+def _stream_compressor(open_compressed: Callable) -> Callable[[str, str], None]:
+    def compress(source: str, dest: str):
+        with open(source, "rb") as src, open_compressed(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+    return compress
+
+
+def _tar_compressor(mode: str) -> Callable[[str, str], None]:
+    def compress(source: str, dest: str):
+        with tarfile.open(dest, mode) as archive:
+            archive.add(source, Path(source).name)
+    return compress
+
+
+# Те же форматы, что принимает compression у loguru
+COMPRESSIONS: Dict[str, Callable[[str, str], None]] = {
+    "zip": _zip,
+    "gz": _stream_compressor(gzip.open),
+    "bz2": _stream_compressor(bz2.open),
+    "xz": _stream_compressor(lzma.open),
+    "lzma": _stream_compressor(lzma.open),
+    "tar": _tar_compressor("w"),
+    "tar.gz": _tar_compressor("w:gz"),
+    "tar.bz2": _tar_compressor("w:bz2"),
+    "tar.xz": _tar_compressor("w:xz"),
+}
+
+
+def _compressing_rotator(compress: Callable[[str, str], None]) -> Callable[[str, str], None]:
+    def rotator(source: str, dest: str):
+        """Сжимает файл лога, закрытый при ротации"""
+        compress(source, dest)
+        os.remove(source)
+    return rotator
+
+
+class DailyFileWriter:
+    """Файл лога с ротацией в полночь, хранением retention_days дней и сжатием (COMPRESSIONS)"""
+
+    def __init__(self, path: str, retention_days: int = 30, compression: str = "zip"):
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Неподдерживаемое сжатие логов {compression!r}, допустимо: {', '.join(COMPRESSIONS)} или пусто"
+            )
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._handler = logging.handlers.TimedRotatingFileHandler(
+            path, when="midnight", backupCount=retention_days, encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        if compression:
+            self._handler.namer = lambda name: f"{name}.{compression}"
+            self._handler.rotator = _compressing_rotator(COMPRESSIONS[compression])
+
+    def write(self, text: str):
+        self._handler.emit(logging.makeLogRecord({"msg": text.rstrip("\n")}))
+
+    def close(self):
+        self._handler.close()
+
+
+class BackgroundWriter:
+    """
+    Пишет строки логов в фоновом потоке
+
+    Sink только кладёт уже отформатированную строку в очередь (без
+    pickle, в отличие от enqueue=True у loguru), а запись в поток,
+    ротация и сжатие файлов выполняются потоком-писателем.
+    """
+
+    def __init__(self, max_batch: int = 1000):
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._closers = []
+
+    def sink(self, write: Callable[[str], None], close: Optional[Callable[[], None]] = None) -> Callable[[str], None]:
+        """Возвращает sink для logger.add(), который пишет через write в фоне"""
+        if close is not None:
+            self._closers.append(close)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+        def enqueue(message: str):
+            self._queue.put((write, message))
+
+        return enqueue
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # Всё, что накопилось, пишется одним вызовом на sink
+            batches: Dict[Callable[[str], None], List[str]] = {}
+            item = self._queue.get()
+            while item is not None:
+                write, message = item
+                batches.setdefault(write, []).append(message)
+                if len(batches[write]) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            stopping = item is None
+
+            for write, messages in batches.items():
+                try:
+                    write("".join(messages))
+                except Exception as e:
+                    sys.__stderr__.write(f"Ошибка записи лога: {e}\n")
+
+    def stop(self):
+        """Дописывает очередь и закрывает файлы"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        for close in self._closers:
+            close()
+        self._closers.clear()
+
+
+# Глобальный экземпляр
+background_writer = BackgroundWriter()
+
+
+def setup_logging():
+    """
+    Настраивает обработчики логов
+
+    С LOG_ENQUEUE запись в stderr и файл, ротация и сжатие выполняются в
+    фоновом потоке, а не в event loop. LOG_JSON переключает вывод на
+    JSON-записи (одна запись на строку). Пустой LOG_FILE отключает файл.
+    Неизвестное LOG_COMPRESSION — ValueError в обоих режимах.
+    """
+    global _debug_enabled
+
+    logger.remove()
+    background_writer.stop()
+
+    console = sys.stderr
+    logger.add(
+        background_writer.sink(console.write) if settings.LOG_ENQUEUE else console,
+        format=CONSOLE_FORMAT,
+        level=settings.LOG_LEVEL,
+        colorize=console.isatty() and not settings.LOG_JSON,
+        serialize=settings.LOG_JSON,
+    )
+    levels = [logger.level(settings.LOG_LEVEL).no]
+
+    if settings.LOG_FILE:
+        if settings.LOG_ENQUEUE:
+            writer = DailyFileWriter(settings.LOG_FILE, compression=settings.LOG_COMPRESSION)
+            file_sink = background_writer.sink(writer.write, writer.close)
+            options = {}
+        else:
+            file_sink = settings.LOG_FILE
+            options = {"rotation": "00:00", "retention": "30 days", "compression": settings.LOG_COMPRESSION or None}
+        logger.add(
+            file_sink,
+            format=FILE_FORMAT,
+            level=settings.LOG_FILE_LEVEL,
+            serialize=settings.LOG_JSON,
+            **options,
+        )
+        levels.append(logger.level(settings.LOG_FILE_LEVEL).no)
+
+    _debug_enabled = min(levels) <= logger.level("DEBUG").no
+
+
+def stop_logging():
+    """Дописывает логи из очереди фонового потока; дальше логи идут в stderr синхронно"""
+    logger.remove()
+    background_writer.stop()
+    logger.add(sys.stderr, format=CONSOLE_FORMAT, level=settings.LOG_LEVEL)
+
+
+def debug_sampled(message: str, *args, **kwargs):
+    """
+    DEBUG-сообщение, которое пишется для доли LOG_DEBUG_SAMPLE_RATE вызовов
+
+    Для логов на каждое сообщение пользователя: при выключенном DEBUG
+    сообщение не форматируется вовсе.
+
+    Args:
+        message: шаблон в формате str.format
+        *args, **kwargs: аргументы шаблона
+    """
+    if not _debug_enabled:
+        return
+    rate = settings.LOG_DEBUG_SAMPLE_RATE
+    if rate < 1 and random.random() >= rate:
+        return
+    _caller_logger.debug(message, *args, **kwargs)
 
-logger.add(
-    "logs/bot_{time:YYYY-MM-DD}.log",
-    rotation="00:00",
-    retention="30 days",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-    level="DEBUG",
-    compression="zip"
-)
 
-__all__ = ["logger"]
+__all__ = ["logger", "setup_logging", "stop_logging", "debug_sampled"]
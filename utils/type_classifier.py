@@ -0,0 +1,120 @@
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Sequence, Tuple
+
+from config.settings import settings
+
+# Основы слов для каждого типа комплимента (после lower() и ё → е).
+# Основа совпадает только с начала слова: «работ» найдёт «работа», но не «заработала».
+# Порядок типов задаёт приоритет при равных баллах.
+KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "appearance": (
+        "красив", "стиль", "стильн", "внешн", "улыб", "глаз", "волос", "одежд",
+        "плать", "приче", "макияж", "образ", "выгляд", "фигур", "наряд", "маникюр",
+        "фотк", "фото", "селфи", "туфл", "сереж", "помад",
+    ),
+    "character": (
+        "умн", "добр", "весел", "поддерж", "помощ", "помог", "забот", "терпен", "терпел",
+        "честн", "смешн", "юмор", "мудр", "нежн", "щедр", "смел", "отзывчив",
+        "характер", "душевн", "искрен",
+    ),
+    "achievements": (
+        "работ", "успех", "успеш", "достиж", "достигл", "проект", "цель", "цели",
+        "результат", "экзамен", "сдал", "побед", "выиграл", "преми", "повышени",
+        "диплом", "защитил", "сертификат", "карьер", "зачет", "олимпиад", "награ",
+    ),
+}
+
+
+def _trie_pattern(words) -> str:
+    """
+    Регулярное выражение-префиксное дерево для набора слов
+
+    В отличие от простой альтернативы, на каждой позиции текста сравнивается
+    один символ с первыми буквами всех слов сразу, а не каждое слово по очереди.
+    """
+    tree: Dict[str, dict] = {}
+    for word in words:
+        node = tree
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def render(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Слово закончилось, но есть более длинные: жадно пробуем длинное
+        return f"(?:{body})?" if "" in node else body
+
+    return render(tree)
+
+
+class TypeClassifier:
+    """
+    Определяет тип комплимента по сообщениям пользователя
+
+    Все основы собраны в одно регулярное выражение (префиксное дерево),
+    поэтому каждое сообщение просматривается за один проход, а найденная
+    основа по словарю даёт тип. Баллы типов суммируются по всему окну
+    контекста с весом decay ** возраст (последнее сообщение — вес 1).
+    Совпадения в одном сообщении кэшируются: реплики истории
+    классифицируются много раз подряд.
+    """
+
+    def __init__(self,
+                 keywords: Dict[str, Tuple[str, ...]] = KEYWORDS,
+                 window: int = settings.TYPE_CLASSIFIER_WINDOW,
+                 decay: float = settings.TYPE_CLASSIFIER_DECAY):
+        self.types = tuple(keywords)
+        self.window = window
+        self.decay = decay
+        self._stem_types = {
+            stem: i for i, compliment_type in enumerate(self.types) for stem in keywords[compliment_type]
+        }
+        self._pattern = re.compile(r"\b" + _trie_pattern(self._stem_types))
+        self.count_matches = lru_cache(maxsize=4096)(self._count_matches)
+
+    def _count_matches(self, text: str) -> Tuple[int, ...]:
+        """Число совпадений каждого типа в тексте (в порядке self.types)"""
+        counts = [0] * len(self.types)
+        for stem in self._pattern.findall(text.lower().replace("ё", "е")):
+            counts[self._stem_types[stem]] += 1
+        return tuple(counts)
+
+    def scores(self, texts: Sequence[str]) -> Dict[str, float]:
+        """
+        Баллы типов по последним window сообщениям
+
+        Args:
+            texts: сообщения пользователя от старых к новым
+
+        Returns:
+            Словарь тип -> взвешенное число совпадений
+        """
+        totals = [0.0] * len(self.types)
+        weight = 1.0
+        for text in reversed(texts[-self.window:]):
+            for i, count in enumerate(self.count_matches(text)):
+                totals[i] += count * weight
+            weight *= self.decay
+        return dict(zip(self.types, totals))
+
+    def classify(self, texts: Sequence[str]) -> Optional[str]:
+        """
+        Выбирает тип комплимента
+
+        Args:
+            texts: сообщения пользователя от старых к новым
+
+        Returns:
+            Тип с наибольшим баллом или None, если ключевых слов нет
+        """
+        scores = self.scores(texts)
+        best = max(self.types, key=scores.__getitem__)
+        return best if scores[best] > 0 else None
+
+
+# Глобальный экземпляр
+type_classifier = TypeClassifier()